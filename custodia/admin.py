@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Policial, Caso, Custodia, Arquivo
+from .models import Policial, Caso, Custodia, Arquivo, CacheHashArquivo, TarefaCustodia
 
 
 @admin.register(Policial)
@@ -23,9 +23,9 @@ class CasoAdmin(admin.ModelAdmin):
 class ArquivoInline(admin.TabularInline):
     model = Arquivo
     extra = 0
-    readonly_fields = ('nome_arquivo', 'caminho_relativo', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo', 'tipo_mime', 'novo_ou_alterado')
+    readonly_fields = ('nome_arquivo', 'caminho_relativo', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo', 'tipo_mime', 'novo_ou_alterado', 'hash_do_cache', 'removido')
     can_delete = False
-    fields = ('nome_arquivo', 'caminho_relativo', 'novo_ou_alterado', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo')
+    fields = ('nome_arquivo', 'caminho_relativo', 'novo_ou_alterado', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo', 'hash_do_cache', 'removido')
 
 
 @admin.register(Custodia)
@@ -39,10 +39,10 @@ class CustodiaAdmin(admin.ModelAdmin):
         'hash_pasta_short',
         'total_arquivos',
         'tamanho_total_formatado',
-        'pdf_gerado',
+        'estado_pdf',
         'data_criacao',
     )
-    list_filter = ('pdf_gerado', 'ativo', 'data_criacao', 'policial', 'caso')
+    list_filter = ('estado_pdf', 'ativo', 'data_criacao', 'policial', 'caso')
     search_fields = ('numero_documento', 'hash_pasta', 'policial__nome_completo', 'caso__numero_procedimento')
     readonly_fields = (
         'numero_documento',
@@ -52,7 +52,17 @@ class CustodiaAdmin(admin.ModelAdmin):
         'data_criacao',
         'tamanho_total',
         'total_arquivos',
+        'duracao_hash_segundos',
+        'bytes_hash_lidos',
+        'vazao_hash_mb_s',
+        'estado_pdf',
+        'tentativas_pdf',
+        'mensagem_pdf',
+        'proxima_tentativa_pdf',
+        'ultimo_sinal_pdf',
         'caminho_pdf',
+        'inventario_delta',
+        'estatisticas',
     )
     fieldsets = (
         ('Informações Básicas', {
@@ -71,10 +81,13 @@ class CustodiaAdmin(admin.ModelAdmin):
             'fields': ('policial', 'caso')
         }),
         ('Informações da Pasta', {
-            'fields': ('caminho_pasta', 'tamanho_total', 'total_arquivos')
+            'fields': ('caminho_pasta', 'tamanho_total', 'total_arquivos', 'inventario_delta', 'estatisticas')
+        }),
+        ('Desempenho do Cálculo de Hashes', {
+            'fields': ('duracao_hash_segundos', 'bytes_hash_lidos', 'vazao_hash_mb_s')
         }),
         ('PDF', {
-            'fields': ('pdf_gerado', 'caminho_pdf')
+            'fields': ('estado_pdf', 'tentativas_pdf', 'mensagem_pdf', 'proxima_tentativa_pdf', 'ultimo_sinal_pdf', 'caminho_pdf')
         }),
         ('Outros', {
             'fields': ('observacoes',)
@@ -97,9 +110,25 @@ class ArquivoAdmin(admin.ModelAdmin):
     list_display = ('nome_arquivo', 'custodia', 'tamanho_formatado', 'hash_arquivo', 'data_modificacao')
     list_filter = ('data_modificacao', 'custodia')
     search_fields = ('nome_arquivo', 'caminho_completo', 'hash_arquivo', 'custodia__numero_documento')
-    readonly_fields = ('custodia', 'nome_arquivo', 'caminho_completo', 'caminho_relativo', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo', 'tipo_mime')
+    readonly_fields = ('custodia', 'nome_arquivo', 'caminho_completo', 'caminho_relativo', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo', 'hashes_adicionais', 'tamanho_chunk', 'hash_raiz_chunks', 'hashes_chunks', 'tipo_mime')
     ordering = ('custodia', 'caminho_relativo')
     
     def tamanho_formatado(self, obj):
         return obj.tamanho_formatado()
     tamanho_formatado.short_description = "Tamanho"
+
+
+@admin.register(CacheHashArquivo)
+class CacheHashArquivoAdmin(admin.ModelAdmin):
+    list_display = ('caminho_completo', 'hash_arquivo', 'ultimo_uso', 'data_cadastro')
+    search_fields = ('caminho_completo', 'hash_arquivo')
+    readonly_fields = ('chave', 'caminho_completo', 'hash_arquivo', 'hashes_adicionais', 'arvore_chunks', 'ultimo_uso', 'data_cadastro')
+    ordering = ('-ultimo_uso',)
+
+
+@admin.register(TarefaCustodia)
+class TarefaCustodiaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'estado', 'custodia', 'tentativas', 'worker', 'data_criacao', 'data_conclusao')
+    list_filter = ('tipo', 'estado', 'data_criacao')
+    readonly_fields = ('tipo', 'dados', 'custodia', 'tentativas', 'worker', 'progresso', 'resultado', 'data_criacao', 'data_inicio', 'data_conclusao', 'ultimo_sinal')
+    ordering = ('-data_criacao',)
@@ -0,0 +1,155 @@
+"""
+Auditoria da cadeia de hashes gravada no banco (sem acesso às pastas).
+
+Para cada custódia, recalcula a partir do inventário gravado:
+- hash_conteudo_novos: agregado 'caminho:hash' dos arquivos novos ou alterados
+  nesta versão (na v1, todos);
+- hash_pasta: igual ao agregado na v1; nas seguintes,
+  calcular_hash_cadeia(hash_pasta da anterior, hash_conteudo_novos);
+- registros herdados sem alteração (novo_ou_alterado=False): o hash_arquivo
+  deve ser o mesmo do inventário da versão anterior.
+
+Uma linha de Arquivo, um hash de pasta ou um agregado adulterado aparece como
+divergência. O agregado é calculado em streaming (AgregadorHash) com as
+linhas já ordenadas pelo banco, então a memória não depende do tamanho do
+inventário.
+"""
+import multiprocessing
+from typing import Dict, Iterator, List, Optional
+
+import django
+from django.db import connection
+from django.db.models import CharField, Value
+from django.db.models.functions import Collate, Concat
+
+from .models import Arquivo, Custodia
+from .utils import AgregadorHash, calcular_hash_cadeia, em_lotes, mapear_em_ordem
+
+# Divergências de arquivos herdados listadas por custódia no relatório
+MAX_ARQUIVOS_DIVERGENTES_RELATORIO = 100
+
+# Collation com a ordem de code points do Python (sorted() de
+# combinar_hashes_entradas_rel_hash); no SQLite a padrão (BINARY) já é essa
+COLLATION_BINARIA = {
+    'postgresql': 'C',
+    'mysql': 'utf8mb4_bin',
+}
+
+
+def ordem_entradas():
+    """Expressão de ORDER BY equivalente a sorted() das entradas 'caminho:hash'"""
+    entrada = Concat('caminho_relativo', Value(':'), 'hash_arquivo', output_field=CharField())
+    collation = COLLATION_BINARIA.get(connection.vendor)
+    return Collate(entrada, collation) if collation else entrada
+
+
+def _iterar_entradas_novas(custodia_id: int, tamanho_lote: int) -> Iterator:
+    return (
+        Arquivo.objects.filter(custodia_id=custodia_id, novo_ou_alterado=True, removido=False)
+        .order_by(ordem_entradas())
+        .values_list('caminho_relativo', 'hash_arquivo')
+        .iterator(chunk_size=tamanho_lote)
+    )
+
+
+def _herdados_divergentes(custodia: Custodia, tamanho_lote: int) -> Iterator[Dict]:
+    """Registros desta versão marcados como inalterados cujo hash difere do da versão anterior"""
+    herdados = (
+        Arquivo.objects.filter(custodia_id=custodia.pk, novo_ou_alterado=False, removido=False)
+        .order_by('pk')
+        .values_list('caminho_relativo', 'hash_arquivo')
+        .iterator(chunk_size=tamanho_lote)
+    )
+    for lote in em_lotes(herdados, tamanho_lote):
+        anteriores = dict(
+            custodia.custodia_anterior.inventario()
+            .filter(caminho_relativo__in=[rel for rel, _ in lote])
+            .values_list('caminho_relativo', 'hash_arquivo')
+        )
+        for rel, hash_arquivo in lote:
+            if anteriores.get(rel) != hash_arquivo:
+                yield {
+                    'caminho_relativo': rel,
+                    'hash_gravado': hash_arquivo,
+                    'hash_versao_anterior': anteriores.get(rel),
+                }
+
+
+def auditar_custodia(custodia_id: int, tamanho_lote: int = 2000) -> Dict:
+    """
+    Audita uma custódia; retorna o registro do relatório (serializável em JSON).
+    Nível de módulo para rodar em pool de processos.
+    """
+    custodia = Custodia.objects.select_related('custodia_anterior').get(pk=custodia_id)
+    problemas: List[str] = []
+
+    agregador = AgregadorHash()
+    for rel, hash_arquivo in _iterar_entradas_novas(custodia_id, tamanho_lote):
+        agregador.adicionar(rel, hash_arquivo)
+    agregado = agregador.hexdigest()
+    if agregado != custodia.hash_conteudo_novos:
+        problemas.append('hash_conteudo_novos não confere com o agregado dos arquivos novos ou alterados.')
+
+    anterior = custodia.custodia_anterior
+    if anterior is None:
+        hash_pasta_esperado = agregado
+        if custodia.hash_cadeia_anterior:
+            problemas.append('Versão sem anterior com hash_cadeia_anterior preenchido.')
+    else:
+        hash_pasta_esperado = calcular_hash_cadeia(anterior.hash_pasta, custodia.hash_conteudo_novos)
+        if custodia.hash_cadeia_anterior != anterior.hash_pasta:
+            problemas.append('hash_cadeia_anterior difere do hash_pasta da versão anterior.')
+    if custodia.hash_pasta != hash_pasta_esperado:
+        problemas.append('hash_pasta não confere com o recalculado.')
+
+    herdados_divergentes = []
+    total_herdados_divergentes = 0
+    if anterior is not None:
+        for divergencia in _herdados_divergentes(custodia, tamanho_lote):
+            total_herdados_divergentes += 1
+            if len(herdados_divergentes) < MAX_ARQUIVOS_DIVERGENTES_RELATORIO:
+                herdados_divergentes.append(divergencia)
+        if total_herdados_divergentes:
+            problemas.append(
+                f'{total_herdados_divergentes} arquivo(s) herdado(s) com hash diferente do da versão anterior.'
+            )
+
+    return {
+        'custodia_id': custodia.pk,
+        'caso_id': custodia.caso_id,
+        'numero_documento': custodia.numero_documento,
+        'versao': custodia.versao,
+        'integra': not problemas,
+        'problemas': problemas,
+        'arquivos_novos_agregados': agregador.total,
+        'hash_conteudo_novos_recalculado': agregado,
+        'hash_pasta_recalculado': hash_pasta_esperado,
+        'herdados_divergentes': herdados_divergentes,
+    }
+
+
+def auditar_custodias(
+    apos_id: Optional[int] = None,
+    max_workers: int = 1,
+    tamanho_lote: int = 2000,
+) -> Iterator[Dict]:
+    """
+    Audita todas as custódias em ordem de id (a partir de apos_id, exclusive),
+    com os IDs lidos por cursor no servidor (iterator) e o trabalho num pool de
+    max_workers processos. Os resultados saem na ordem dos IDs, então o id do
+    último resultado serve de ponto de retomada.
+    """
+    ids = Custodia.objects.order_by('pk')
+    if apos_id is not None:
+        ids = ids.filter(pk__gt=apos_id)
+    return mapear_em_ordem(
+        auditar_custodia,
+        ids.values_list('pk', flat=True).iterator(chunk_size=tamanho_lote),
+        tamanho_lote,
+        max_workers=max_workers,
+        usar_processos=max_workers > 1,
+        # Workers em 'spawn' não herdam a conexão do pai; django.setup (e não uma
+        # função deste módulo, que importa os models) roda antes de qualquer tarefa
+        contexto_processos=multiprocessing.get_context('spawn'),
+        inicializador=django.setup,
+    )
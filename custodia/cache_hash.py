@@ -0,0 +1,124 @@
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CacheHashArquivo
+from .utils import ALGORITMO_CANONICO, em_lotes
+
+# Limite de parâmetros por consulta (SQLite aceita no máximo 999 em versões antigas)
+TAMANHO_LOTE_CONSULTA = 900
+
+
+class CacheHashBanco:
+    """
+    Cache de hashes gravado no banco (tabela CacheHashArquivo), usado por
+    calcular_hash_pasta para não reler arquivos que não mudaram entre versões.
+
+    Expurgo: entradas sem uso há mais de `dias_validade` dias são removidas e,
+    acima de `max_entradas`, as menos usadas recentemente são descartadas.
+    """
+
+    def __init__(self, max_entradas: Optional[int] = None, dias_validade: Optional[int] = None):
+        self.max_entradas = (
+            max_entradas if max_entradas is not None
+            else getattr(settings, 'CUSTODIA_HASH_CACHE_MAX_ENTRADAS', 1_000_000)
+        )
+        self.dias_validade = (
+            dias_validade if dias_validade is not None
+            else getattr(settings, 'CUSTODIA_HASH_CACHE_DIAS', 180)
+        )
+
+    def obter(self, chaves: Iterable[str]) -> Dict[str, Tuple[Dict[str, str], Optional[dict]]]:
+        """
+        Retorna {chave: ({algoritmo: hex}, árvore de chunks ou None)} para as
+        chaves presentes e marca o uso.
+        """
+        chaves = list(chaves)
+        encontrados = {}
+        for lote in em_lotes(chaves, TAMANHO_LOTE_CONSULTA):
+            consulta = CacheHashArquivo.objects.filter(chave__in=lote).values_list(
+                'chave', 'hash_arquivo', 'hashes_adicionais', 'arvore_chunks'
+            )
+            for chave, hash_arquivo, adicionais, arvore in consulta:
+                digests = dict(adicionais or {})
+                digests[ALGORITMO_CANONICO] = hash_arquivo
+                encontrados[chave] = (digests, arvore)
+        agora = timezone.now()
+        for lote in em_lotes(list(encontrados), TAMANHO_LOTE_CONSULTA):
+            CacheHashArquivo.objects.filter(chave__in=lote).update(ultimo_uso=agora)
+        return encontrados
+
+    def _mesclar_existentes(
+        self, entradas: Dict[str, Tuple[str, Dict[str, str], Optional[dict]]]
+    ) -> Dict[str, Tuple[str, Dict[str, str], Optional[dict]]]:
+        """
+        Une as entradas novas às já gravadas com o mesmo SHA-256: os digests
+        adicionais se somam e a árvore de chunks gravada fica quando a nova é
+        None. Um SHA-256 diferente substitui a entrada inteira.
+        """
+        mescladas = dict(entradas)
+        for lote in em_lotes(list(entradas), TAMANHO_LOTE_CONSULTA):
+            existentes = CacheHashArquivo.objects.filter(chave__in=lote).values_list(
+                'chave', 'hash_arquivo', 'hashes_adicionais', 'arvore_chunks'
+            )
+            for chave, hash_arquivo, adicionais, arvore in existentes:
+                caminho, digests, arvore_nova = entradas[chave]
+                if digests[ALGORITMO_CANONICO] != hash_arquivo:
+                    continue
+                mescladas[chave] = (
+                    caminho,
+                    {**(adicionais or {}), **digests},
+                    arvore_nova if arvore_nova is not None else arvore,
+                )
+        return mescladas
+
+    def registrar(self, entradas: Dict[str, Tuple[str, Dict[str, str], Optional[dict]]]) -> None:
+        """
+        Grava {chave: (caminho_completo, {algoritmo: hex}, árvore de chunks ou
+        None)}, mesclando com o que já estiver gravado para a mesma chave (ver
+        _mesclar_existentes); o expurgo fica a cargo de expurgar().
+        """
+        if not entradas:
+            return
+        entradas = self._mesclar_existentes(entradas)
+        agora = timezone.now()
+        CacheHashArquivo.objects.bulk_create(
+            [
+                CacheHashArquivo(
+                    chave=chave,
+                    caminho_completo=caminho,
+                    hash_arquivo=digests[ALGORITMO_CANONICO],
+                    hashes_adicionais={
+                        nome: valor for nome, valor in digests.items() if nome != ALGORITMO_CANONICO
+                    },
+                    arvore_chunks=arvore,
+                    ultimo_uso=agora,
+                )
+                for chave, (caminho, digests, arvore) in entradas.items()
+            ],
+            batch_size=TAMANHO_LOTE_CONSULTA,
+            update_conflicts=True,
+            unique_fields=['chave'],
+            update_fields=[
+                'caminho_completo', 'hash_arquivo', 'hashes_adicionais', 'arvore_chunks', 'ultimo_uso',
+            ],
+        )
+
+    def expurgar(self) -> int:
+        """Remove entradas vencidas e o excedente menos usado. Retorna quantas removeu."""
+        removidos = 0
+        if self.dias_validade:
+            limite = timezone.now() - timedelta(days=self.dias_validade)
+            removidos += CacheHashArquivo.objects.filter(ultimo_uso__lt=limite).delete()[0]
+        if self.max_entradas:
+            excedente = CacheHashArquivo.objects.count() - self.max_entradas
+            if excedente > 0:
+                ids = list(
+                    CacheHashArquivo.objects.order_by('ultimo_uso', 'id')
+                    .values_list('id', flat=True)[:excedente]
+                )
+                for lote in em_lotes(ids, TAMANHO_LOTE_CONSULTA):
+                    removidos += CacheHashArquivo.objects.filter(id__in=lote).delete()[0]
+        return removidos
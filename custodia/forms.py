@@ -1,7 +1,313 @@
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from .models import Policial, Caso, Custodia
+from django.utils import timezone
+from .models import Arquivo, Caso, Custodia, IndiceHash, Policial
+from .utils import em_lotes
+
+# Campos que, iguais aos da versão anterior, permitem herdar o registro do
+# arquivo no inventário delta em vez de gravá-lo de novo
+CAMPOS_ASSINATURA_ARQUIVO = (
+    'hash_arquivo',
+    'nome_arquivo',
+    'caminho_completo',
+    'tamanho_bytes',
+    'data_modificacao',
+    'tipo_mime',
+    'hashes_adicionais',
+    'tamanho_chunk',
+    'hash_raiz_chunks',
+    'hash_do_cache',
+)
+
+
+def _assinatura_arquivo(arquivo) -> tuple:
+    assinatura = []
+    for campo in CAMPOS_ASSINATURA_ARQUIVO:
+        valor = getattr(arquivo, campo)
+        if campo == 'data_modificacao' and valor is not None and settings.USE_TZ and timezone.is_naive(valor):
+            valor = timezone.make_aware(valor)
+        assinatura.append(valor)
+    return tuple(assinatura)
+
+
+def arquivos_do_manifesto(custodia, infos, novos_paths=None, resumo=None):
+    """
+    Gera (sem gravar) os Arquivo de uma custódia a partir dos registros do
+    manifesto. novos_paths: caminhos que entraram no delta desta versão (None
+    marca todos como novos). resumo: ResumoInventario que acumula cada registro
+    e decide se é novo ou alterado (substitui novos_paths).
+    """
+    for info_arquivo in infos:
+        rel = info_arquivo['caminho_relativo']
+        if resumo is not None:
+            novo = resumo.adicionar(info_arquivo)
+        else:
+            novo = True if novos_paths is None else (rel in novos_paths)
+        arvore = info_arquivo.get('arvore_chunks') or {}
+        yield Arquivo(
+            custodia=custodia,
+            nome_arquivo=info_arquivo['nome_arquivo'],
+            caminho_completo=info_arquivo['caminho_completo'],
+            caminho_relativo=rel,
+            tamanho_bytes=info_arquivo['tamanho_bytes'],
+            data_modificacao=info_arquivo['data_modificacao'],
+            hash_arquivo=info_arquivo.get('hash', ''),
+            hashes_adicionais=info_arquivo.get('hashes_adicionais', {}),
+            tipo_mime=info_arquivo['tipo_mime'],
+            novo_ou_alterado=novo,
+            hash_do_cache=info_arquivo.get('hash_do_cache', False),
+            tamanho_chunk=arvore.get('tamanho_chunk'),
+            hashes_chunks=arvore.get('hashes', []),
+            hash_raiz_chunks=arvore.get('raiz', ''),
+        )
+
+
+def _arquivos_delta(custodia, arquivos, anteriores):
+    """
+    Filtra os Arquivo para o inventário delta: só passam os que não existiam
+    ou mudaram algum campo da assinatura; ao final gera os registros de remoção
+    dos caminhos de `anteriores` que não apareceram.
+    """
+    vistos = set()
+    for arquivo in arquivos:
+        vistos.add(arquivo.caminho_relativo)
+        if anteriores.get(arquivo.caminho_relativo) != _assinatura_arquivo(arquivo):
+            yield arquivo
+    for rel in sorted(set(anteriores) - vistos):
+        yield Arquivo(
+            custodia=custodia,
+            nome_arquivo=Path(rel).name,
+            caminho_completo='',
+            caminho_relativo=rel,
+            novo_ou_alterado=False,
+            removido=True,
+        )
+
+
+def persistir_inventario(custodia, infos, novos_paths=None, tamanho_lote=None, anteriores=None, resumo=None) -> int:
+    """
+    Grava o inventário da custódia com INSERTs em lote (bulk_create), de
+    tamanho_lote linhas por vez (padrão: CUSTODIA_ARQUIVO_LOTE). infos pode ser
+    qualquer iterável, inclusive o manifesto em streaming. Retorna o total gravado.
+
+    resumo: ResumoInventario atualizado na mesma passada (agregados, totais e
+    estatísticas da versão), sem reler infos.
+
+    anteriores: {caminho_relativo: assinatura} do inventário da versão anterior
+    (ver CAMPOS_ASSINATURA_ARQUIVO). Se informado, grava em delta: arquivos
+    idênticos aos da versão anterior são herdados, e os ausentes recebem um
+    registro de remoção.
+    """
+    tamanho_lote = tamanho_lote or getattr(settings, 'CUSTODIA_ARQUIVO_LOTE', 1000)
+    arquivos = arquivos_do_manifesto(custodia, infos, novos_paths, resumo)
+    if anteriores is not None:
+        arquivos = _arquivos_delta(custodia, arquivos, anteriores)
+    total = 0
+    for lote in em_lotes(arquivos, tamanho_lote):
+        Arquivo.objects.bulk_create(lote, batch_size=tamanho_lote)
+        total += len(lote)
+    return total
+
+
+# Retorno de publicar_versao quando outra versão do caso foi publicada antes
+VERSAO_ANTERIOR_MUDOU = object()
+
+
+def publicar_versao(custodia, tarefa=None):
+    """
+    Publica uma custódia preparada (publicada=False) numa transação curta:
+    ela passa a ser a versão atual do caso e a anterior é desativada.
+
+    O caso é travado (select_for_update; no SQLite a transação já começa com o
+    lock de escrita) e a versão anterior da preparação precisa ainda ser a
+    atual do caso.
+
+    Em delta, as entradas de IndiceHash dos registros herdados que a versão
+    regravou são encerradas na mesma transação (IndiceHashQuerySet.encerrar_substituidas;
+    proporcional aos arquivos novos, alterados ou removidos).
+
+    Retorna None se publicou; VERSAO_ANTERIOR_MUDOU se outra versão do caso
+    entrou antes (nada é alterado); ou o id da custódia já vinculada à tarefa.
+    """
+    from .models import TarefaCustodia
+
+    with transaction.atomic():
+        Caso.objects.select_for_update().filter(pk=custodia.caso_id).values_list('pk').first()
+        if tarefa is not None:
+            ja_gerada = (
+                TarefaCustodia.objects.select_for_update()
+                .filter(pk=tarefa.pk)
+                .values_list('custodia_id', flat=True)
+                .first()
+            )
+            if ja_gerada:
+                return ja_gerada
+        atuais = set(
+            Custodia.objects.filter(caso_id=custodia.caso_id, ativo=True)
+            .values_list('pk', flat=True)
+        )
+        if custodia.custodia_anterior_id is None:
+            anterior_mudou = bool(atuais)
+        else:
+            anterior_mudou = custodia.custodia_anterior_id not in atuais
+        if anterior_mudou:
+            return VERSAO_ANTERIOR_MUDOU
+        if atuais:
+            Custodia.objects.filter(pk__in=atuais).update(ativo=False)
+        IndiceHash.objects.encerrar_substituidas(custodia)
+        Custodia.todas.filter(pk=custodia.pk).update(publicada=True, ativo=True)
+        if tarefa is not None:
+            TarefaCustodia.objects.filter(pk=tarefa.pk).update(custodia=custodia)
+    return None
+
+
+def descartar_preparo(custodia_id: int) -> None:
+    """Apaga uma custódia em preparo e o inventário já gravado para ela"""
+    IndiceHash.objects.filter(custodia_id=custodia_id).delete()
+    Arquivo.objects.filter(custodia_id=custodia_id).delete()
+    Custodia.todas.filter(pk=custodia_id, publicada=False).delete()
+
+
+def descartar_preparos_abandonados() -> int:
+    """
+    Apaga preparos de versões nunca publicados (ex.: worker encerrado entre a
+    gravação do inventário e a publicação), mais antigos que
+    CUSTODIA_PREPARO_ABANDONADO_SEGUNDOS. Retorna quantos foram apagados.
+    """
+    limite = timezone.now() - timedelta(
+        seconds=getattr(settings, 'CUSTODIA_PREPARO_ABANDONADO_SEGUNDOS', 86400)
+    )
+    ids = list(
+        Custodia.todas.filter(publicada=False, data_criacao__lt=limite).values_list('pk', flat=True)
+    )
+    for custodia_id in ids:
+        descartar_preparo(custodia_id)
+    return len(ids)
+
+
+def registros_do_inventario(custodia):
+    """
+    Registros no formato do manifesto (gerar_manifesto_pasta) a partir do
+    inventário gravado da custódia, em ordem canônica e em streaming: refaz o
+    preparo de uma versão sobre outra anterior sem reler a pasta.
+    """
+    from .auditoria import ordem_entradas
+
+    for arquivo in custodia.inventario().order_by(ordem_entradas()).iterator(chunk_size=2000):
+        yield {
+            'nome_arquivo': arquivo.nome_arquivo,
+            'caminho_completo': arquivo.caminho_completo,
+            'caminho_relativo': arquivo.caminho_relativo,
+            'tamanho_bytes': arquivo.tamanho_bytes,
+            'data_modificacao': arquivo.data_modificacao,
+            'hash': arquivo.hash_arquivo,
+            'hashes_adicionais': arquivo.hashes_adicionais,
+            'tipo_mime': arquivo.tipo_mime,
+            'hash_do_cache': arquivo.hash_do_cache,
+            'arvore_chunks': {
+                'tamanho_chunk': arquivo.tamanho_chunk,
+                'hashes': arquivo.hashes_chunks,
+                'raiz': arquivo.hash_raiz_chunks,
+            } if arquivo.tamanho_chunk else None,
+        }
+
+
+def preparar_versao(caso, ultima, infos, progresso, **campos):
+    """
+    Grava uma versão em preparo (publicada=False) do caso sobre `ultima` (None na
+    primeira versão) numa única passada pelos registros do manifesto `infos`, em
+    ordem canônica: o inventário (completo ou delta) vai para o banco em lotes
+    enquanto um ResumoInventario acumula agregados, totais e estatísticas; os
+    hashes da versão são gravados ao final da passada.
+
+    progresso: ProgressoHash do cálculo (a telemetria é lida ao fim da passada).
+    campos: demais campos da Custodia (policial, caminho_pasta, observacoes).
+    Sem arquivos novos nem alterados em relação a `ultima`, descarta o preparo e
+    lança ValidationError.
+    """
+    from .utils import ResumoInventario, calcular_hash_cadeia
+
+    anteriores = None
+    mapa_prev = None
+    inventario_delta = False
+    if ultima:
+        # Inventário em delta, exceto a cada N versões (inventário completo
+        # limita o tamanho da cadeia a materializar)
+        inventario_delta = getattr(settings, 'CUSTODIA_INVENTARIO_DELTA', True) and (
+            len(ultima.ids_cadeia_inventario())
+            < getattr(settings, 'CUSTODIA_INVENTARIO_COMPLETO_A_CADA', 20)
+        )
+        anteriores = {
+            registro[0]: registro[1:]
+            for registro in ultima.inventario()
+            .values_list('caminho_relativo', *CAMPOS_ASSINATURA_ARQUIVO)
+            .iterator(chunk_size=2000)
+        }
+        mapa_prev = {rel: assinatura[0] for rel, assinatura in anteriores.items()}
+
+    # Gerar número do documento (microsegundos evitam colisão em reenvios no mesmo segundo)
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    caso_limpo = ''.join(c for c in caso.numero_procedimento if c.isalnum() or c in ['-', '_'])
+
+    # Custodia em preparo (fora de Custodia.objects até ser publicada); hashes e
+    # totais só existem ao fim da passada pelo manifesto
+    custodia = Custodia.todas.create(
+        numero_documento=f"CUST-{caso_limpo}-{timestamp}",
+        hash_pasta='',
+        hash_cadeia_anterior='',
+        hash_conteudo_novos='',
+        caso=caso,
+        versao=ultima.versao + 1 if ultima else 1,
+        custodia_anterior=ultima,
+        ativo=False,
+        publicada=False,
+        inventario_delta=inventario_delta,
+        **campos,
+    )
+    resumo = ResumoInventario(mapa_prev)
+    try:
+        # Registros de Arquivo (marca o que entrou no delta do hash desta versão),
+        # em lotes e sem lock do caso
+        persistir_inventario(
+            custodia, infos,
+            anteriores=anteriores if inventario_delta else None,
+            resumo=resumo,
+        )
+        if ultima:
+            if not resumo.novos_ou_alterados:
+                raise ValidationError(
+                    'Não há arquivos novos nem alterados em relação à versão anterior '
+                    'deste procedimento. Inclua documentos ou altere arquivos existentes '
+                    'antes de gerar uma nova versão.'
+                )
+            custodia.hash_cadeia_anterior = ultima.hash_pasta
+            custodia.hash_conteudo_novos = resumo.agregado_novos.hexdigest()
+            custodia.hash_pasta = calcular_hash_cadeia(ultima.hash_pasta, custodia.hash_conteudo_novos)
+        else:
+            custodia.hash_conteudo_novos = resumo.agregado_todos.hexdigest()
+            custodia.hash_pasta = custodia.hash_conteudo_novos
+        telemetria = progresso.instantaneo()
+        custodia.tamanho_total = resumo.tamanho_total
+        custodia.total_arquivos = resumo.total_arquivos
+        custodia.estatisticas = resumo.estatisticas()
+        custodia.duracao_hash_segundos = telemetria['duracao_segundos']
+        custodia.bytes_hash_lidos = telemetria['bytes_lidos']
+        custodia.vazao_hash_mb_s = telemetria['mb_por_segundo']
+        custodia.save(update_fields=[
+            'hash_pasta', 'hash_cadeia_anterior', 'hash_conteudo_novos', 'tamanho_total',
+            'total_arquivos', 'estatisticas', 'duracao_hash_segundos', 'bytes_hash_lidos',
+            'vazao_hash_mb_s',
+        ])
+        IndiceHash.objects.bulk_create(IndiceHash.entradas_custodia(custodia))
+    except BaseException:
+        descartar_preparo(custodia.pk)
+        raise
+    return custodia
 
 
 class CustodiaForm(forms.Form):
@@ -90,6 +396,35 @@ class CustodiaForm(forms.Form):
         help_text="Digite o caminho completo da pasta contendo os documentos/arquivos (inclui todas as subpastas)"
     )
     
+    MODO_HASH_RECALCULAR = 'recalcular'
+    MODO_HASH_CONFIAR_CACHE = 'confiar_cache'
+
+    modo_hash = forms.ChoiceField(
+        label="Cálculo dos hashes",
+        choices=[
+            (MODO_HASH_RECALCULAR, 'Recalcular o hash de todos os arquivos'),
+            (MODO_HASH_CONFIAR_CACHE, 'Reaproveitar o hash de arquivos não modificados (cache)'),
+        ],
+        initial=MODO_HASH_RECALCULAR,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        required=False,
+        help_text=(
+            "No modo cache, arquivos com mesmo dispositivo, inode, tamanho e data de modificação "
+            "já registrados não são relidos. O relatório indica quais hashes vieram do cache."
+        ),
+    )
+    
+    hashes_adicionais = forms.MultipleChoiceField(
+        label="Hashes adicionais",
+        choices=[('md5', 'MD5'), ('sha1', 'SHA-1'), ('sha512', 'SHA-512')],
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+        help_text=(
+            "Calculados na mesma leitura de cada arquivo e impressos no inventário do PDF. "
+            "A cadeia de custódia continua usando apenas o SHA-256."
+        ),
+    )
+    
     observacoes = forms.CharField(
         label="Observações",
         widget=forms.Textarea(attrs={
@@ -100,6 +435,10 @@ class CustodiaForm(forms.Form):
         required=False
     )
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['hashes_adicionais'].initial = getattr(settings, 'CUSTODIA_HASHES_ADICIONAIS', [])
+
     def clean_matricula(self):
         matricula = self.cleaned_data.get('matricula')
         if matricula:
@@ -127,11 +466,25 @@ class CustodiaForm(forms.Form):
                 raise ValidationError(mensagem)
         
         return caminho
+
+    def clean_modo_hash(self):
+        return self.cleaned_data.get('modo_hash') or self.MODO_HASH_RECALCULAR
     
-    def save(self):
-        """Salva os dados no banco de dados (nova versão automática por caso/procedimento)."""
-        from .models import Arquivo
-        from datetime import datetime
+    def save(self, tarefa=None, progresso=None):
+        """
+        Salva os dados no banco de dados (nova versão automática por caso/procedimento).
+
+        Os hashes e o inventário são gravados fora de qualquer lock, numa versão
+        em preparo; só a publicação (publicar_versao) trava o caso, por uma
+        transação curta. Se outra versão do caso foi publicada no meio, a
+        preparação é refeita sobre ela (até CUSTODIA_PUBLICACAO_TENTATIVAS).
+
+        tarefa: TarefaCustodia em execução; a custódia criada é vinculada a ela na
+        transação da publicação, e uma tarefa já vinculada não gera nova versão.
+        progresso: ProgressoHash que acompanha o cálculo dos hashes; a vazão final
+        fica registrada na custódia.
+        """
+        from .models import TarefaCustodia
 
         # Obter dados do formulário
         nome_policial = self.cleaned_data['nome_policial']
@@ -143,16 +496,21 @@ class CustodiaForm(forms.Form):
         data_coleta = self.cleaned_data['data_coleta']
         caminho_pasta = self.cleaned_data['caminho_pasta']
         observacoes = self.cleaned_data.get('observacoes', '')
+        confiar_cache = self.cleaned_data.get('modo_hash') == self.MODO_HASH_CONFIAR_CACHE
+        algoritmos_adicionais = self.cleaned_data.get('hashes_adicionais') or []
 
-        from .utils import (
-            calcular_hash_pasta,
-            combinar_hashes_lista_arquivos,
-            calcular_hash_cadeia,
-            particionar_novos_ou_alterados,
-        )
+        from .cache_hash import CacheHashBanco
+        from .utils import ProgressoHash, gerar_manifesto_pasta
+
+        if progresso is None:
+            progresso = ProgressoHash()
+
+        if tarefa is not None:
+            ja_gerada = TarefaCustodia.objects.filter(pk=tarefa.pk).values_list('custodia_id', flat=True).first()
+            if ja_gerada:
+                return Custodia.objects.get(pk=ja_gerada)
 
-        # Varredura completa da pasta (hashes por arquivo + lista)
-        _, lista_arquivos = calcular_hash_pasta(caminho_pasta)
+        descartar_preparos_abandonados()
 
         with transaction.atomic():
             # Criar ou obter Policial
@@ -187,81 +545,161 @@ class CustodiaForm(forms.Form):
                 caso.data_coleta = data_coleta
                 caso.save()
 
-            # Versão: desativa a atual do caso e encadeia a nova
+        # Varredura completa da pasta em streaming (hashes por arquivo, em paralelo),
+        # na ordem canônica: cada registro vai direto para o inventário da versão em
+        # preparo e os agregados saem na mesma passada (o manifesto não fica em memória)
+        manifesto = gerar_manifesto_pasta(
+            caminho_pasta,
+            max_workers=getattr(settings, 'CUSTODIA_HASH_WORKERS', 1),
+            usar_processos=getattr(settings, 'CUSTODIA_HASH_USAR_PROCESSOS', False),
+            backend_leitura=getattr(settings, 'CUSTODIA_HASH_BACKEND', None),
+            tamanho_bloco=getattr(settings, 'CUSTODIA_HASH_TAMANHO_BLOCO', None),
+            cache=CacheHashBanco(),
+            confiar_cache=confiar_cache,
+            progresso=progresso,
+            algoritmos_adicionais=algoritmos_adicionais,
+            tamanho_chunk=getattr(settings, 'CUSTODIA_HASH_TAMANHO_CHUNK', None),
+            chunk_minimo_bytes=getattr(settings, 'CUSTODIA_HASH_CHUNK_MINIMO_BYTES', 0),
+            workers_chunk=getattr(settings, 'CUSTODIA_HASH_WORKERS_CHUNK', 1),
+        )
+
+        # Duas fases: a versão é preparada (diff e inventário) sem lock e publicada
+        # numa transação curta que confere se a versão anterior ainda é a atual.
+        # Se outra versão do caso foi publicada no meio, prepara de novo sobre ela
+        # com os registros do preparo anterior (lidos do banco, sem reler a pasta).
+        tentativas = getattr(settings, 'CUSTODIA_PUBLICACAO_TENTATIVAS', 5)
+        registros = manifesto
+        preparo_anterior = None
+        for _ in range(tentativas):
             ultima = (
-                Custodia.objects.select_for_update()
-                .filter(caso=caso, ativo=True)
+                Custodia.objects.filter(caso=caso, ativo=True)
                 .order_by('-versao', '-data_criacao', '-id')
                 .first()
             )
+            try:
+                custodia = preparar_versao(
+                    caso, ultima, registros, progresso,
+                    policial=policial,
+                    caminho_pasta=caminho_pasta,
+                    observacoes=observacoes,
+                )
+            finally:
+                if preparo_anterior is not None:
+                    descartar_preparo(preparo_anterior.pk)
+            try:
+                publicacao = publicar_versao(custodia, tarefa)
+            except BaseException:
+                descartar_preparo(custodia.pk)
+                raise
+            if publicacao is None:
+                custodia.ativo = True
+                custodia.publicada = True
+                return custodia
+            if publicacao is not VERSAO_ANTERIOR_MUDOU:
+                # A tarefa já gerou sua custódia (ex.: reexecutada após perder o lease)
+                descartar_preparo(custodia.pk)
+                return Custodia.objects.get(pk=publicacao)
+            registros = registros_do_inventario(custodia)
+            preparo_anterior = custodia
 
-            hash_cadeia_anterior = ''
-            novos_infos = []
-            if ultima:
-                mapa_prev = {
-                    a.caminho_relativo: a.hash_arquivo
-                    for a in ultima.arquivos.all()
-                }
-                novos_infos, _ = particionar_novos_ou_alterados(lista_arquivos, mapa_prev)
-                if not novos_infos:
-                    raise ValidationError(
-                        'Não há arquivos novos nem alterados em relação à versão anterior '
-                        'deste procedimento. Inclua documentos ou altere arquivos existentes '
-                        'antes de gerar uma nova versão.'
-                    )
-                hash_conteudo_novos = combinar_hashes_lista_arquivos(novos_infos)
-                hash_cadeia_anterior = ultima.hash_pasta
-                hash_pasta_final = calcular_hash_cadeia(hash_cadeia_anterior, hash_conteudo_novos)
-                Custodia.objects.filter(pk=ultima.pk).update(ativo=False)
-                nova_versao = ultima.versao + 1
-                custodia_anterior = ultima
-                novos_paths = {x['caminho_relativo'] for x in novos_infos}
-            else:
-                hash_conteudo_novos = combinar_hashes_lista_arquivos(lista_arquivos)
-                hash_pasta_final = hash_conteudo_novos
-                nova_versao = 1
-                custodia_anterior = None
-                novos_paths = None
-
-            # Gerar número do documento (microsegundos evitam colisão em reenvios no mesmo segundo)
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
-            caso_limpo = ''.join(c for c in numero_procedimento if c.isalnum() or c in ['-', '_'])
-            numero_documento = f"CUST-{caso_limpo}-{timestamp}"
-
-            # Calcular tamanho total
-            tamanho_total = sum(arquivo['tamanho_bytes'] for arquivo in lista_arquivos)
-
-            # Criar Custodia
-            custodia = Custodia.objects.create(
-                numero_documento=numero_documento,
-                hash_pasta=hash_pasta_final,
-                hash_cadeia_anterior=hash_cadeia_anterior,
-                hash_conteudo_novos=hash_conteudo_novos,
-                caminho_pasta=caminho_pasta,
-                tamanho_total=tamanho_total,
-                total_arquivos=len(lista_arquivos),
-                observacoes=observacoes,
-                policial=policial,
-                caso=caso,
-                versao=nova_versao,
-                custodia_anterior=custodia_anterior,
-                ativo=True,
+        descartar_preparo(preparo_anterior.pk)
+        raise RuntimeError(
+            f'Não foi possível publicar a versão: o procedimento {numero_procedimento} '
+            f'recebeu outras versões durante {tentativas} tentativas.'
+        )
+
+
+class FiltroCustodiasForm(forms.Form):
+    """Filtros da listagem de custódias (GET)"""
+
+    SITUACAO_ATUAIS = 'atuais'
+    SITUACAO_ANTERIORES = 'anteriores'
+    SITUACAO_TODAS = 'todas'
+
+    procedimento = forms.CharField(
+        max_length=100,
+        label="Procedimento",
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Número exato'}),
+    )
+    matricula = forms.CharField(
+        max_length=50,
+        label="Matrícula do policial",
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: 12345'}),
+    )
+    delegacia = forms.CharField(
+        max_length=255,
+        label="Delegacia/Unidade",
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Parte do nome'}),
+    )
+    data_inicio = forms.DateField(
+        label="Criada a partir de",
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    data_fim = forms.DateField(
+        label="Criada até",
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    situacao = forms.ChoiceField(
+        label="Versões",
+        required=False,
+        choices=[
+            (SITUACAO_ATUAIS, 'Apenas atuais'),
+            (SITUACAO_ANTERIORES, 'Apenas anteriores'),
+            (SITUACAO_TODAS, 'Todas (histórico)'),
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio, fim = cleaned_data.get('data_inicio'), cleaned_data.get('data_fim')
+        if inicio and fim and inicio > fim:
+            raise ValidationError('A data inicial deve ser anterior à data final.')
+        return cleaned_data
+
+    def filtrar(self, queryset):
+        """
+        Aplica os filtros válidos. Procedimento e matrícula são comparados por
+        igualdade (índices únicos de Caso/Policial e, em Custodia, os índices
+        (caso|policial, data_criacao, id)); a delegacia é resolvida na tabela de
+        policiais, e o período vira uma faixa de data_criacao.
+        """
+        dados = self.cleaned_data if self.is_valid() else {}
+        situacao = dados.get('situacao') or self.SITUACAO_ATUAIS
+        if situacao == self.SITUACAO_ATUAIS:
+            queryset = queryset.filter(ativo=True)
+        elif situacao == self.SITUACAO_ANTERIORES:
+            queryset = queryset.filter(ativo=False)
+
+        procedimento = (dados.get('procedimento') or '').strip()
+        if procedimento:
+            queryset = queryset.filter(caso__numero_procedimento=procedimento)
+        matricula = (dados.get('matricula') or '').strip()
+        if matricula:
+            queryset = queryset.filter(policial__matricula=matricula)
+        delegacia = (dados.get('delegacia') or '').strip()
+        if delegacia:
+            queryset = queryset.filter(
+                policial__in=Policial.objects.filter(delegacia__icontains=delegacia).values('pk')
             )
 
-            # Criar registros de Arquivo (inventário completo; marca o que entrou no delta desta versão)
-            for info_arquivo in lista_arquivos:
-                rel = info_arquivo['caminho_relativo']
-                novo_flag = True if novos_paths is None else (rel in novos_paths)
-                Arquivo.objects.create(
-                    custodia=custodia,
-                    nome_arquivo=info_arquivo['nome_arquivo'],
-                    caminho_completo=info_arquivo['caminho_completo'],
-                    caminho_relativo=info_arquivo['caminho_relativo'],
-                    tamanho_bytes=info_arquivo['tamanho_bytes'],
-                    data_modificacao=info_arquivo['data_modificacao'],
-                    hash_arquivo=info_arquivo.get('hash', ''),
-                    tipo_mime=info_arquivo['tipo_mime'],
-                    novo_ou_alterado=novo_flag,
-                )
+        # Datas locais convertidas em instantes: [início do dia inicial, início do dia seguinte ao final)
+        if dados.get('data_inicio'):
+            queryset = queryset.filter(data_criacao__gte=self._inicio_do_dia(dados['data_inicio']))
+        if dados.get('data_fim'):
+            queryset = queryset.filter(
+                data_criacao__lt=self._inicio_do_dia(dados['data_fim'] + timedelta(days=1))
+            )
+        return queryset
 
-        return custodia
+    @staticmethod
+    def _inicio_do_dia(data):
+        inicio = datetime.combine(data, time.min)
+        if settings.USE_TZ:
+            inicio = timezone.make_aware(inicio)
+        return inicio
@@ -0,0 +1,158 @@
+import json
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from custodia.auditoria import auditar_custodias
+
+
+class Command(BaseCommand):
+    help = (
+        "Audita a cadeia de hashes de todas as custódias a partir do inventário gravado "
+        "(hash_conteudo_novos, hash_pasta e hashes de arquivos herdados). Grava um "
+        "relatório JSON Lines e um checkpoint para retomar com --retomar. Sai com erro "
+        "se houver divergência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--relatorio',
+            default='auditoria_cadeias.jsonl',
+            help='Arquivo do relatório, uma linha JSON por custódia e um resumo ao final '
+                 '(padrão: auditoria_cadeias.jsonl).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=None,
+            help='Arquivo de checkpoint (padrão: <relatorio>.checkpoint).',
+        )
+        parser.add_argument(
+            '--retomar',
+            action='store_true',
+            help='Continua a partir do checkpoint em vez de recomeçar.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processos auditando custódias em paralelo (padrão: 1).',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=2000,
+            help='Linhas lidas por vez dos cursores do banco (padrão: 2000).',
+        )
+        parser.add_argument(
+            '--checkpoint-a-cada',
+            type=int,
+            default=100,
+            help='Custódias auditadas entre gravações do checkpoint (padrão: 100).',
+        )
+
+    def _ler_checkpoint(self, caminho: Path):
+        try:
+            return json.loads(caminho.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise CommandError(f"Checkpoint ilegível ({caminho}): {e}")
+
+    def _gravar_checkpoint(self, caminho: Path, estado: dict) -> None:
+        # Grava ao lado e troca de uma vez: um checkpoint nunca fica pela metade
+        temporario = caminho.with_name(caminho.name + '.tmp')
+        temporario.write_text(json.dumps(estado), encoding='utf-8')
+        os.replace(temporario, caminho)
+
+    def handle(self, *args, **options):
+        relatorio = Path(options['relatorio'])
+        checkpoint = Path(options['checkpoint'] or f"{relatorio}.checkpoint")
+
+        estado = self._ler_checkpoint(checkpoint) if options['retomar'] else None
+        if estado and estado.get('concluida'):
+            self.stdout.write(
+                f"Auditoria já concluída em {estado['atualizado_em']}: {estado['custodias']} custódia(s), "
+                f"{estado['divergentes']} divergente(s). Rode sem --retomar para auditar de novo."
+            )
+            return
+        if estado:
+            try:
+                tamanho = relatorio.stat().st_size
+            except FileNotFoundError:
+                raise CommandError(
+                    f"Checkpoint {checkpoint} sem o relatório {relatorio}; rode sem --retomar para auditar de novo."
+                )
+            if tamanho < estado['bytes_relatorio']:
+                raise CommandError(
+                    f"Relatório {relatorio} menor ({tamanho} bytes) que o registrado no checkpoint "
+                    f"({estado['bytes_relatorio']} bytes); rode sem --retomar para auditar de novo."
+                )
+            saida = open(relatorio, 'r+b')
+            # Linhas gravadas depois do último checkpoint serão refeitas
+            saida.truncate(estado['bytes_relatorio'])
+            saida.seek(estado['bytes_relatorio'])
+            self.stdout.write(f"Retomando após a custódia {estado['ultimo_custodia_id']}.")
+        else:
+            saida = open(relatorio, 'wb')
+            estado = {
+                'ultimo_custodia_id': None,
+                'bytes_relatorio': 0,
+                'custodias': 0,
+                'divergentes': 0,
+                'iniciada_em': timezone.now().isoformat(),
+            }
+
+        def salvar(concluida=False):
+            saida.flush()
+            os.fsync(saida.fileno())
+            estado.update(
+                bytes_relatorio=saida.tell(),
+                atualizado_em=timezone.now().isoformat(),
+                concluida=concluida,
+            )
+            self._gravar_checkpoint(checkpoint, estado)
+
+        with saida:
+            desde_checkpoint = 0
+            resultados = auditar_custodias(
+                apos_id=estado['ultimo_custodia_id'],
+                max_workers=options['workers'],
+                tamanho_lote=options['lote'],
+            )
+            for resultado in resultados:
+                saida.write((json.dumps(resultado, ensure_ascii=False) + '\n').encode('utf-8'))
+                estado['ultimo_custodia_id'] = resultado['custodia_id']
+                estado['custodias'] += 1
+                if not resultado['integra']:
+                    estado['divergentes'] += 1
+                    self.stderr.write(
+                        f"{resultado['numero_documento']} (v{resultado['versao']}): "
+                        + ' '.join(resultado['problemas'])
+                    )
+                desde_checkpoint += 1
+                if desde_checkpoint >= options['checkpoint_a_cada']:
+                    salvar()
+                    desde_checkpoint = 0
+
+            # Resumo gravado (e sincronizado por salvar) antes do checkpoint
+            # concluído: um checkpoint concluído sempre tem o relatório inteiro
+            concluida_em = timezone.now().isoformat()
+            resumo = {
+                'resumo': {
+                    'custodias': estado['custodias'],
+                    'divergentes': estado['divergentes'],
+                    'iniciada_em': estado['iniciada_em'],
+                    'concluida_em': concluida_em,
+                }
+            }
+            saida.write((json.dumps(resumo) + '\n').encode('utf-8'))
+            salvar(concluida=True)
+
+        self.stdout.write(
+            f"{estado['custodias']} custódia(s) auditada(s), {estado['divergentes']} divergente(s). "
+            f"Relatório: {relatorio}"
+        )
+        if estado['divergentes']:
+            raise CommandError(f"Divergências em {estado['divergentes']} custódia(s); ver {relatorio}.")
@@ -0,0 +1,86 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from custodia.forms import arquivos_do_manifesto, persistir_inventario
+from custodia.models import Caso, Custodia, Policial
+
+
+def _infos_sinteticos(quantidade: int):
+    """Registros no formato do manifesto, sem tocar o disco"""
+    data = timezone.make_aware(datetime(2024, 1, 1))
+    for i in range(quantidade):
+        nome = f"arquivo{i:07d}.bin"
+        yield {
+            'nome_arquivo': nome,
+            'caminho_completo': f"/evidencias/benchmark/{i // 1000:04d}/{nome}",
+            'caminho_relativo': f"{i // 1000:04d}/{nome}",
+            'tamanho_bytes': 1024 + i,
+            'data_modificacao': data,
+            'hash': f"{i:064x}",
+            'tipo_mime': 'application/octet-stream',
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a gravação do inventário (linhas de Arquivo por segundo): um INSERT por "
+        "arquivo versus INSERTs em lote. Tudo roda numa transação desfeita ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivos', type=int, default=20000, help='Linhas a gravar (padrão: 20000).')
+        parser.add_argument(
+            '--lote',
+            type=int,
+            action='append',
+            help='Tamanho do lote; pode repetir (padrão: CUSTODIA_ARQUIVO_LOTE).',
+        )
+
+    def _custodia_temporaria(self, sufixo: str) -> Custodia:
+        policial, _ = Policial.objects.get_or_create(
+            matricula='BENCHMARK', defaults={'nome_completo': 'Benchmark'}
+        )
+        caso, _ = Caso.objects.get_or_create(
+            numero_procedimento='BENCHMARK',
+            defaults={'local_crime': '-', 'data_coleta': timezone.now()},
+        )
+        return Custodia.objects.create(
+            numero_documento=f"CUST-BENCHMARK-{sufixo}",
+            hash_pasta='0' * 64,
+            caminho_pasta='/evidencias/benchmark',
+            policial=policial,
+            caso=caso,
+        )
+
+    def _medir(self, rotulo: str, quantidade: int, gravar) -> None:
+        with transaction.atomic():
+            custodia = self._custodia_temporaria(rotulo)
+            inicio = time.perf_counter()
+            gravar(custodia)
+            duracao = time.perf_counter() - inicio
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f"{rotulo:>20}: {quantidade} linhas em {duracao:.2f} s "
+            f"({quantidade / duracao if duracao else 0:,.0f} linhas/s)"
+        )
+
+    def handle(self, *args, **options):
+        quantidade = options['arquivos']
+
+        def um_por_arquivo(custodia):
+            for arquivo in arquivos_do_manifesto(custodia, _infos_sinteticos(quantidade)):
+                arquivo.save(force_insert=True)
+
+        self._medir('1 INSERT por arquivo', quantidade, um_por_arquivo)
+        for tamanho_lote in options['lote'] or [None]:
+            self._medir(
+                f"lote de {tamanho_lote or 'padrão'}",
+                quantidade,
+                lambda custodia: persistir_inventario(
+                    custodia, _infos_sinteticos(quantidade), tamanho_lote=tamanho_lote
+                ),
+            )
@@ -0,0 +1,133 @@
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from custodia.forms import persistir_inventario
+from custodia.management.commands.benchmark_inventario import _infos_sinteticos
+from custodia.models import Arquivo, Caso, Custodia, IndiceHash, Policial
+from custodia.pdf_generator import gerar_pdf_custodia
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a geração do PDF de custódias com inventários sintéticos de vários tamanhos "
+        "(tempo total, tempo por mil arquivos, páginas e pico de memória). A custódia "
+        "sintética é gravada (os processos de anexos precisam lê-la) e apagada ao final; "
+        "os PDFs vão para uma pasta temporária."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--arquivos',
+            type=int,
+            action='append',
+            help='Arquivos no inventário; pode repetir (padrão: 1000, 10000 e 100000).',
+        )
+        parser.add_argument(
+            '--memoria',
+            action='store_true',
+            help='Mede o pico de memória Python com tracemalloc (deixa a geração mais lenta).',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=1,
+            help='Gera o PDF N vezes por tamanho e informa a média e o mínimo por documento '
+                 '(útil para medir o custo fixo de custódias pequenas).',
+        )
+        parser.add_argument(
+            '--arquivos-por-anexo',
+            type=int,
+            help='Sobrepõe CUSTODIA_PDF_ARQUIVOS_POR_ANEXO (0 gera tudo num PDF só).',
+        )
+        parser.add_argument(
+            '--workers-anexos',
+            type=int,
+            help='Sobrepõe CUSTODIA_PDF_WORKERS_ANEXOS.',
+        )
+
+    def _custodia_temporaria(self, quantidade: int) -> Custodia:
+        policial, _ = Policial.objects.get_or_create(
+            matricula='BENCHMARK', defaults={'nome_completo': 'Benchmark'}
+        )
+        caso, _ = Caso.objects.get_or_create(
+            numero_procedimento='BENCHMARK',
+            defaults={'local_crime': '-', 'data_coleta': timezone.now()},
+        )
+        custodia = Custodia.objects.create(
+            numero_documento=f"CUST-BENCHMARK-PDF-{quantidade}",
+            hash_pasta='0' * 64,
+            hash_conteudo_novos='0' * 64,
+            caminho_pasta='/evidencias/benchmark',
+            policial=policial,
+            caso=caso,
+            total_arquivos=quantidade,
+        )
+        persistir_inventario(custodia, _infos_sinteticos(quantidade))
+        return custodia
+
+    def _apagar(self, custodia: Custodia) -> None:
+        with transaction.atomic():
+            IndiceHash.objects.filter(custodia=custodia).delete()
+            Arquivo.objects.filter(custodia=custodia).delete()
+            custodia.delete()
+
+    def _medir(self, quantidade: int, pasta: Path, memoria: bool, configuracao: dict, repeticoes: int) -> None:
+        with transaction.atomic():
+            custodia = self._custodia_temporaria(quantidade)
+        duracoes = []
+        try:
+            custodia.estatisticas_inventario()
+            with override_settings(PDFS_DIR=pasta, **configuracao):
+                if memoria:
+                    tracemalloc.start()
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    caminho = Path(gerar_pdf_custodia(custodia))
+                    duracoes.append(time.perf_counter() - inicio)
+                    if len(duracoes) < repeticoes:
+                        caminho.unlink()
+                pico = tracemalloc.get_traced_memory()[1] if memoria else None
+                if memoria:
+                    tracemalloc.stop()
+        finally:
+            self._apagar(custodia)
+        duracao = sum(duracoes) / len(duracoes)
+        if caminho.suffix == '.zip':
+            with zipfile.ZipFile(caminho) as pacote:
+                pdfs = [pacote.read(nome) for nome in pacote.namelist() if nome.endswith('.pdf')]
+            detalhe = f"pacote com {len(pdfs) - 1} anexos"
+        else:
+            pdfs = [caminho.read_bytes()]
+            detalhe = "PDF único"
+        paginas = sum(conteudo.count(b'/Type /Page\n') for conteudo in pdfs)
+        if repeticoes > 1:
+            tempo = f"{duracao * 1000:7.1f} ms por documento (mínimo {min(duracoes) * 1000:.1f} ms em {repeticoes})"
+        else:
+            tempo = f"{duracao:7.2f} s"
+        linha = (
+            f"{quantidade:>8} arquivos: {tempo} "
+            f"({duracao * 1000 / quantidade * 1000:6.0f} ms por mil arquivos), "
+            f"{paginas} páginas, {caminho.stat().st_size / 1024 / 1024:.1f} MB, {detalhe}"
+        )
+        if pico is not None:
+            linha += f", pico de memória {pico / 1024 / 1024:.1f} MB (processo principal)"
+        self.stdout.write(linha)
+        caminho.unlink()
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as pasta:
+            configuracao = {}
+            if options['arquivos_por_anexo'] is not None:
+                configuracao['CUSTODIA_PDF_ARQUIVOS_POR_ANEXO'] = options['arquivos_por_anexo'] or None
+            if options['workers_anexos'] is not None:
+                configuracao['CUSTODIA_PDF_WORKERS_ANEXOS'] = options['workers_anexos']
+            for quantidade in options['arquivos'] or [1000, 10000, 100000]:
+                self._medir(quantidade, Path(pasta), options['memoria'], configuracao, max(1, options['repeticoes']))
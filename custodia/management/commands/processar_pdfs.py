@@ -0,0 +1,85 @@
+import multiprocessing
+import time
+
+import django
+from django.core.management.base import BaseCommand
+
+
+def _executar_worker(intervalo: float, uma_vez: bool, escrever=print, workers: int = 1) -> None:
+    """Laço de um worker de PDF (no processo do comando ou num processo do pool)."""
+    # Processos em 'spawn' começam sem o Django configurado; no pai é inofensivo
+    django.setup()
+    from custodia.pdf_generator import definir_workers_pdf
+    from custodia.tarefas import identificador_worker, processar_proximo_pdf
+
+    # O pool de anexos de cada worker divide os núcleos com os demais
+    definir_workers_pdf(workers)
+
+    worker = identificador_worker()
+    escrever(f"Worker de PDF {worker} iniciado.")
+    try:
+        while True:
+            custodia = processar_proximo_pdf()
+            if custodia is None:
+                if uma_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+            escrever(
+                f"PDF de {custodia.numero_documento}: {custodia.get_estado_pdf_display()}"
+                + (f" - {custodia.mensagem_pdf}" if custodia.mensagem_pdf else '')
+            )
+    except KeyboardInterrupt:
+        escrever(f"Worker de PDF {worker} encerrado.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de PDFs: gera os PDFs das custódias gravadas pelos workers de "
+        "processar_tarefas, com novas tentativas automáticas em caso de falha. Vários "
+        "workers podem rodar em paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processos gerando PDFs em paralelo (padrão: 1).',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 2).',
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Gera os PDFs disponíveis e encerra quando a fila esvaziar.',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            _executar_worker(options['intervalo'], options['uma_vez'], self.stdout.write)
+            return
+
+        # A geração do PDF é CPU (ReportLab): um processo por worker, fora do GIL
+        contexto = multiprocessing.get_context('spawn')
+        processos = [
+            contexto.Process(
+                target=_executar_worker,
+                args=(options['intervalo'], options['uma_vez']),
+                kwargs={'workers': options['workers']},
+            )
+            for _ in range(options['workers'])
+        ]
+        for processo in processos:
+            processo.start()
+        try:
+            for processo in processos:
+                processo.join()
+        except KeyboardInterrupt:
+            for processo in processos:
+                processo.join()
+            self.stdout.write("Workers de PDF encerrados.")
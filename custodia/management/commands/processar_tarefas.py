@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from custodia.tarefas import identificador_worker, processar_proxima_tarefa
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker da fila de custódias: processa tarefas pendentes (hashes e versão; o PDF "
+        "é gerado por processar_pdfs). Vários workers podem rodar em paralelo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 2).',
+        )
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa as tarefas disponíveis e encerra quando a fila esvaziar.',
+        )
+
+    def handle(self, *args, **options):
+        worker = identificador_worker()
+        self.stdout.write(f"Worker {worker} iniciado.")
+        try:
+            while True:
+                tarefa = processar_proxima_tarefa(worker)
+                if tarefa is None:
+                    if options['uma_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                self.stdout.write(
+                    f"Tarefa {tarefa.pk}: {tarefa.get_estado_display()}"
+                    + (f" - {tarefa.mensagem}" if tarefa.mensagem else '')
+                )
+        except KeyboardInterrupt:
+            self.stdout.write("Worker encerrado.")
@@ -0,0 +1,104 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from custodia.models import Custodia
+from custodia.verificacao import MODO_COMPLETO, MODO_RAPIDO, verificar_custodia
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifica a integridade de custódias: confere a pasta no disco contra o "
+        "inventário registrado (ausentes, extras, modificados, inalterados). "
+        "Sai com erro se houver divergência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'custodia_ids',
+            nargs='*',
+            type=int,
+            help='IDs das custódias; sem IDs, verifica todas as versões atuais.',
+        )
+        parser.add_argument(
+            '--rapido',
+            action='store_true',
+            help='Confia em tamanho e data de modificação iguais (relê só divergentes e a amostra).',
+        )
+        parser.add_argument(
+            '--amostra',
+            type=float,
+            default=None,
+            help='Fração relida mesmo com metadados iguais no modo rápido (padrão: CUSTODIA_VERIFICACAO_AMOSTRA).',
+        )
+        parser.add_argument(
+            '--semente',
+            type=int,
+            default=None,
+            help='Semente da amostragem (para repetir a mesma amostra).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Workers de hash (padrão: CUSTODIA_HASH_WORKERS).',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprime o relatório em JSON (uma linha por custódia).',
+        )
+
+    def handle(self, *args, **options):
+        if options['custodia_ids']:
+            custodias = Custodia.objects.filter(pk__in=options['custodia_ids']).order_by('pk')
+            faltando = set(options['custodia_ids']) - set(custodias.values_list('pk', flat=True))
+            if faltando:
+                raise CommandError(f"Custódia(s) não encontrada(s): {sorted(faltando)}")
+        else:
+            custodias = Custodia.objects.filter(ativo=True).order_by('pk')
+
+        modo = MODO_RAPIDO if options['rapido'] else MODO_COMPLETO
+        divergentes = []
+        for custodia in custodias.select_related('caso'):
+            try:
+                resultado = verificar_custodia(
+                    custodia,
+                    modo=modo,
+                    amostra=options['amostra'],
+                    semente=options['semente'],
+                    max_workers=options['workers'],
+                )
+            except ValueError as e:
+                divergentes.append(custodia.pk)
+                if options['json']:
+                    self.stdout.write(json.dumps({'custodia_id': custodia.pk, 'erro': str(e)}))
+                else:
+                    self.stderr.write(f"{custodia.numero_documento}: {e}")
+                continue
+
+            if not resultado.integro:
+                divergentes.append(custodia.pk)
+            if options['json']:
+                self.stdout.write(json.dumps(resultado.como_dict(), ensure_ascii=False))
+                continue
+
+            situacao = 'ÍNTEGRA' if resultado.integro else 'DIVERGENTE'
+            self.stdout.write(
+                f"{custodia.numero_documento} (v{custodia.versao}): {situacao} - "
+                f"{len(resultado.inalterados)} inalterados, {len(resultado.modificados)} modificados, "
+                f"{len(resultado.ausentes)} ausentes, {len(resultado.extras)} extras, "
+                f"{len(resultado.ilegiveis)} ilegíveis "
+                f"({resultado.arquivos_rehasheados} relidos em {resultado.duracao_segundos:.1f} s)"
+            )
+            for rotulo, caminhos in (
+                ('modificado', resultado.modificados),
+                ('ausente', resultado.ausentes),
+                ('extra', resultado.extras),
+                ('ilegível', resultado.ilegiveis),
+            ):
+                for caminho in caminhos:
+                    self.stdout.write(f"  {rotulo}: {caminho}")
+
+        if divergentes:
+            raise CommandError(f"Divergências em {len(divergentes)} custódia(s): {divergentes}")
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.4 on 2026-10-17 02:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0004_hash_cadeia_explicito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheHashArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True, verbose_name='Chave (dispositivo, inode, tamanho, mtime, caminho)')),
+                ('caminho_completo', models.TextField(verbose_name='Caminho Completo')),
+                ('hash_arquivo', models.CharField(max_length=64, verbose_name='Hash SHA-256 do Arquivo')),
+                ('data_cadastro', models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')),
+                ('ultimo_uso', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Último Uso')),
+            ],
+            options={
+                'verbose_name': 'Cache de Hash',
+                'verbose_name_plural': 'Cache de Hashes',
+                'ordering': ['-ultimo_uso'],
+            },
+        ),
+        migrations.AddField(
+            model_name='arquivo',
+            name='hash_do_cache',
+            field=models.BooleanField(default=False, help_text='Verdadeiro se o hash veio do cache (arquivo com mesmo dispositivo, inode, tamanho e data) sem releitura.', verbose_name='Hash reaproveitado do cache'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.4 on 2026-10-17 02:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0005_hash_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaCustodia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('em_execucao', 'Em execução'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=20, verbose_name='Estado')),
+                ('dados', models.JSONField(verbose_name='Dados do formulário')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('worker', models.CharField(blank=True, max_length=255, verbose_name='Worker')),
+                ('mensagem', models.TextField(blank=True, verbose_name='Mensagem')),
+                ('data_criacao', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data de Criação')),
+                ('data_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Início da Execução')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Conclusão')),
+                ('ultimo_sinal', models.DateTimeField(blank=True, help_text='Atualizado periodicamente durante a execução; sinal antigo indica worker interrompido.', null=True, verbose_name='Último sinal do worker')),
+                ('custodia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to='custodia.custodia', verbose_name='Custódia gerada')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Custódia',
+                'verbose_name_plural': 'Tarefas de Custódia',
+                'ordering': ['-data_criacao'],
+                'indexes': [models.Index(fields=['estado', 'data_criacao'], name='tarefa_estado_criacao_idx')],
+            },
+        ),
+    ]
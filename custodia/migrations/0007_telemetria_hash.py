@@ -0,0 +1,33 @@
+# Generated by Django 6.0.4 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0006_tarefa_custodia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custodia',
+            name='bytes_hash_lidos',
+            field=models.BigIntegerField(blank=True, help_text='Não inclui arquivos cujo hash veio do cache.', null=True, verbose_name='Bytes lidos no cálculo de hashes'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='duracao_hash_segundos',
+            field=models.FloatField(blank=True, null=True, verbose_name='Duração do cálculo de hashes (s)'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='vazao_hash_mb_s',
+            field=models.FloatField(blank=True, null=True, verbose_name='Vazão de leitura (MB/s)'),
+        ),
+        migrations.AddField(
+            model_name='tarefacustodia',
+            name='progresso',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Progresso do cálculo de hashes'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.4 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0007_telemetria_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivo',
+            name='hashes_adicionais',
+            field=models.JSONField(blank=True, default=dict, help_text='Digests extras calculados na mesma leitura (ex.: md5, sha512). Não entram na cadeia.', verbose_name='Hashes adicionais'),
+        ),
+        migrations.AddField(
+            model_name='cachehasharquivo',
+            name='hashes_adicionais',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Hashes adicionais'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.4 on 2026-10-17 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0008_hashes_adicionais'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivo',
+            name='hash_raiz_chunks',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Hash raiz dos chunks'),
+        ),
+        migrations.AddField(
+            model_name='arquivo',
+            name='hashes_chunks',
+            field=models.JSONField(blank=True, default=list, verbose_name='Hashes SHA-256 dos chunks'),
+        ),
+        migrations.AddField(
+            model_name='arquivo',
+            name='tamanho_chunk',
+            field=models.BigIntegerField(blank=True, help_text='Preenchido quando o arquivo foi hasheado também por chunks.', null=True, verbose_name='Tamanho do chunk (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='cachehasharquivo',
+            name='arvore_chunks',
+            field=models.JSONField(blank=True, null=True, verbose_name='Árvore de chunks'),
+        ),
+    ]
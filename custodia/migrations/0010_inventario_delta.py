@@ -0,0 +1,27 @@
+# Generated by Django 6.0.4 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0009_hash_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arquivo',
+            name='removido',
+            field=models.BooleanField(default=False, help_text='Registro de remoção em inventário delta: o arquivo existia na versão anterior e não existe nesta.', verbose_name='Removido nesta versão'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='inventario_delta',
+            field=models.BooleanField(default=False, help_text='Verdadeiro se esta versão grava só os arquivos novos, alterados ou removidos e herda os demais da custódia anterior (ver inventario()).', verbose_name='Inventário em delta'),
+        ),
+        migrations.AddIndex(
+            model_name='arquivo',
+            index=models.Index(fields=['custodia', 'caminho_relativo'], name='arquivo_custodia_caminho_idx'),
+        ),
+    ]
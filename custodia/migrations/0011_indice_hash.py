@@ -0,0 +1,66 @@
+# Generated by Django 6.0.4 on 2026-10-17 05:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOTE_BACKFILL = 5000
+
+
+def backfill_indice_hash(apps, schema_editor):
+    Custodia = apps.get_model('custodia', 'Custodia')
+    Arquivo = apps.get_model('custodia', 'Arquivo')
+    IndiceHash = apps.get_model('custodia', 'IndiceHash')
+
+    entradas = []
+    for pk, *hashes in Custodia.objects.values_list(
+        'pk', 'hash_pasta', 'hash_cadeia_anterior', 'hash_conteudo_novos'
+    ).iterator(chunk_size=LOTE_BACKFILL):
+        for origem, valor in zip(('hash_pasta', 'hash_cadeia_anterior', 'hash_conteudo_novos'), hashes):
+            if valor:
+                entradas.append(IndiceHash(hash=valor.lower(), origem=origem, custodia_id=pk))
+    IndiceHash.objects.bulk_create(entradas, batch_size=LOTE_BACKFILL)
+
+    entradas = []
+    consulta = (
+        Arquivo.objects.exclude(hash_arquivo='')
+        .filter(removido=False)
+        .values_list('pk', 'custodia_id', 'hash_arquivo')
+    )
+    for pk, custodia_id, hash_arquivo in consulta.iterator(chunk_size=LOTE_BACKFILL):
+        entradas.append(
+            IndiceHash(hash=hash_arquivo.lower(), origem='hash_arquivo', custodia_id=custodia_id, arquivo_id=pk)
+        )
+        if len(entradas) >= LOTE_BACKFILL:
+            IndiceHash.objects.bulk_create(entradas)
+            entradas = []
+    IndiceHash.objects.bulk_create(entradas)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0010_inventario_delta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceHash',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, verbose_name='Hash')),
+                ('origem', models.CharField(choices=[('hash_pasta', 'Hash final da cadeia'), ('hash_cadeia_anterior', 'Hash final da versão anterior'), ('hash_conteudo_novos', 'Hash agregado dos novos ou alterados'), ('hash_arquivo', 'Hash de arquivo do inventário')], max_length=24, verbose_name='Origem')),
+                ('arquivo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='custodia.arquivo', verbose_name='Arquivo')),
+                ('custodia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indices_hash', to='custodia.custodia', verbose_name='Custódia')),
+            ],
+            options={
+                'verbose_name': 'Índice de Hash',
+                'verbose_name_plural': 'Índice de Hashes',
+                'indexes': [models.Index(fields=['hash', 'custodia'], name='indice_hash_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_indice_hash, noop_reverse),
+    ]
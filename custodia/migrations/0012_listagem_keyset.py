@@ -0,0 +1,29 @@
+# Generated by Django 6.0.4 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0011_indice_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['data_criacao', 'id'], name='custodia_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['ativo', 'data_criacao', 'id'], name='custodia_ativo_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['caso', 'data_criacao', 'id'], name='custodia_caso_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['policial', 'data_criacao', 'id'], name='custodia_policial_criacao_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.4 on 2026-10-17 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0012_listagem_keyset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custodia',
+            name='estatisticas',
+            field=models.JSONField(blank=True, help_text='Calculadas no processamento: arquivos e bytes por extensão e por tipo MIME, e contagem de novos, alterados, inalterados e removidos (ver estatisticas_inventario()).', null=True, verbose_name='Estatísticas do inventário'),
+        ),
+    ]
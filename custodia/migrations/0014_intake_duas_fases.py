@@ -0,0 +1,22 @@
+# Generated by Django 6.0.4 on 2026-10-17 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0013_estatisticas_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custodia',
+            name='publicada',
+            field=models.BooleanField(default=True, help_text='Falso enquanto o inventário da versão é gravado, antes de ela entrar na cadeia do caso; versões em preparo não aparecem em Custodia.objects.', verbose_name='Publicada'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['publicada', 'data_criacao'], name='custodia_publicada_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.4 on 2026-10-17 08:05
+
+from django.db import migrations, models
+
+
+def estado_pdf_de_pdf_gerado(apps, schema_editor):
+    # Custódias sem PDF entram na fila dos workers de PDF (estado padrão)
+    Custodia = apps.get_model('custodia', 'Custodia')
+    Custodia.objects.filter(pdf_gerado=True).update(estado_pdf='gerado')
+
+
+def pdf_gerado_de_estado_pdf(apps, schema_editor):
+    Custodia = apps.get_model('custodia', 'Custodia')
+    Custodia.objects.filter(estado_pdf='gerado').update(pdf_gerado=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0014_intake_duas_fases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custodia',
+            name='estado_pdf',
+            field=models.CharField(choices=[('pendente', 'Na fila'), ('gerando', 'Gerando'), ('gerado', 'Gerado'), ('erro', 'Erro')], default='pendente', max_length=20, verbose_name='Estado do PDF'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='mensagem_pdf',
+            field=models.TextField(blank=True, verbose_name='Mensagem da geração do PDF'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='proxima_tentativa_pdf',
+            field=models.DateTimeField(blank=True, help_text='Depois de uma falha, o PDF só volta a ser gerado a partir deste momento.', null=True, verbose_name='Próxima tentativa do PDF'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='tentativas_pdf',
+            field=models.PositiveIntegerField(default=0, verbose_name='Tentativas de geração do PDF'),
+        ),
+        migrations.AddField(
+            model_name='custodia',
+            name='ultimo_sinal_pdf',
+            field=models.DateTimeField(blank=True, help_text='Atualizado durante a geração; sinal antigo indica worker interrompido.', null=True, verbose_name='Último sinal do worker de PDF'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['estado_pdf', 'data_criacao'], name='custodia_estado_pdf_idx'),
+        ),
+        migrations.RunPython(estado_pdf_de_pdf_gerado, pdf_gerado_de_estado_pdf),
+        migrations.RemoveField(
+            model_name='custodia',
+            name='pdf_gerado',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.4 on 2026-10-17 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0015_pdf_assincrono'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefacustodia',
+            name='resultado',
+            field=models.JSONField(blank=True, null=True, verbose_name='Relatório da verificação'),
+        ),
+        migrations.AddField(
+            model_name='tarefacustodia',
+            name='tipo',
+            field=models.CharField(choices=[('entrada', 'Entrada de custódia'), ('verificacao', 'Verificação de integridade')], default='entrada', max_length=20, verbose_name='Tipo'),
+        ),
+        migrations.AlterField(
+            model_name='tarefacustodia',
+            name='custodia',
+            field=models.ForeignKey(blank=True, help_text='Gerada pela entrada ou conferida pela verificação.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to='custodia.custodia', verbose_name='Custódia'),
+        ),
+    ]
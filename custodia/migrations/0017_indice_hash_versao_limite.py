@@ -0,0 +1,77 @@
+# Generated by Django 6.0.4 on 2026-10-17 11:20
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+LOTE_BACKFILL = 5000
+
+
+def backfill_versoes_limite(apps, schema_editor):
+    Custodia = apps.get_model('custodia', 'Custodia')
+    Arquivo = apps.get_model('custodia', 'Arquivo')
+    IndiceHash = apps.get_model('custodia', 'IndiceHash')
+
+    for caso_id in Custodia.objects.values_list('caso_id', flat=True).distinct().order_by('caso_id'):
+        versoes = list(
+            Custodia.objects.filter(caso_id=caso_id)
+            .order_by('versao', 'id')
+            .values_list('pk', 'versao', 'custodia_anterior_id', 'inventario_delta', 'publicada')
+        )
+        base = {}
+        for pk, versao, anterior_id, delta, _ in versoes:
+            base[pk] = base.get(anterior_id, versao) if delta and anterior_id else versao
+            Custodia.objects.filter(pk=pk).update(versao_inventario_completo=base[pk])
+
+        # Caminho -> registro vigente na cadeia; um registro novo para o caminho
+        # encerra o anterior na versão que o gravou
+        vigentes = {}
+        encerrar = defaultdict(list)
+        for pk, versao, _, delta, publicada in versoes:
+            if not publicada:
+                continue
+            if not delta:
+                vigentes = {}
+            for arquivo_id, caminho in (
+                Arquivo.objects.filter(custodia_id=pk)
+                .values_list('pk', 'caminho_relativo')
+                .iterator(chunk_size=LOTE_BACKFILL)
+            ):
+                anterior = vigentes.get(caminho)
+                if anterior is not None:
+                    encerrar[versao].append(anterior)
+                vigentes[caminho] = arquivo_id
+        for versao, arquivos in encerrar.items():
+            for inicio in range(0, len(arquivos), LOTE_BACKFILL):
+                IndiceHash.objects.filter(
+                    arquivo_id__in=arquivos[inicio:inicio + LOTE_BACKFILL]
+                ).update(versao_limite=versao)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custodia', '0016_verificacao_em_fila'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='custodia',
+            name='versao_inventario_completo',
+            field=models.PositiveIntegerField(blank=True, help_text='Versão com inventário completo em que começa a cadeia do inventário desta (a própria versão se não estiver em delta). Preenchida ao criar a custódia.', null=True, verbose_name='Versão do inventário completo'),
+        ),
+        migrations.AddField(
+            model_name='indicehash',
+            name='versao_limite',
+            field=models.PositiveIntegerField(blank=True, help_text='Hash de arquivo: primeira versão do caso (exclusive) que alterou ou removeu o caminho; vazio enquanto o registro for herdado pelas versões seguintes.', null=True, verbose_name='Válido até a versão'),
+        ),
+        migrations.AddIndex(
+            model_name='custodia',
+            index=models.Index(fields=['caso', 'versao_inventario_completo', 'versao'], name='custodia_caso_cadeia_idx'),
+        ),
+        migrations.RunPython(backfill_versoes_limite, noop_reverse),
+    ]
@@ -46,9 +46,81 @@ class Caso(models.Model):
     def __str__(self):
         return f"{self.numero_procedimento} - {self.local_crime[:50]}"
 
+    def linha_do_tempo(self):
+        """
+        Versões do caso em ordem, carregadas numa única consulta (índice caso,
+        versao), com o delta de cada versão e a conferência de cada elo:
+
+        - v1: sem anterior e hash_pasta igual ao agregado (hash_conteudo_novos);
+        - vN: anterior é a versão N-1, hash_cadeia_anterior igual ao hash_pasta
+          dela e hash_pasta == SHA-256(hash_pasta anterior | hash_conteudo_novos).
+
+        Retorna uma lista de dicts (serializáveis em JSON, exceto data_criacao),
+        cada um com 'elo_valido' e a lista 'problemas'.
+        """
+        from .utils import calcular_hash_cadeia
+
+        campos = (
+            'id', 'numero_documento', 'versao', 'data_criacao', 'ativo', 'custodia_anterior_id',
+            'hash_pasta', 'hash_cadeia_anterior', 'hash_conteudo_novos',
+            'total_arquivos', 'tamanho_total', 'estatisticas',
+        )
+        versoes = []
+        anterior = None
+        for registro in Custodia.objects.filter(caso_id=self.pk).order_by('versao', 'id').values(*campos):
+            estatisticas = registro.pop('estatisticas')
+            problemas = []
+            if anterior is None:
+                if registro['versao'] != 1:
+                    problemas.append(f"Primeira versão registrada é a v{registro['versao']}, não a v1.")
+                if registro['custodia_anterior_id'] is not None:
+                    problemas.append('A primeira versão aponta para uma custódia anterior.')
+                if registro['hash_pasta'] != registro['hash_conteudo_novos']:
+                    problemas.append('Na v1 o hash final deveria ser igual ao hash agregado dos arquivos.')
+            else:
+                if registro['versao'] != anterior['versao'] + 1:
+                    problemas.append(f"Versão v{registro['versao']} após v{anterior['versao']}.")
+                if registro['custodia_anterior_id'] != anterior['id']:
+                    problemas.append(f"Custódia anterior não é {anterior['numero_documento']}.")
+                if registro['hash_cadeia_anterior'] != anterior['hash_pasta']:
+                    problemas.append('Hash da versão anterior registrado difere do hash final dela.')
+                esperado = calcular_hash_cadeia(anterior['hash_pasta'], registro['hash_conteudo_novos'])
+                if registro['hash_pasta'] != esperado:
+                    problemas.append(
+                        'Hash final difere de SHA-256(hash anterior | hash dos novos): '
+                        f'esperado {esperado}.'
+                    )
+            registro['delta'] = (
+                {chave: estatisticas[chave] for chave in ('novos', 'alterados', 'inalterados', 'removidos')}
+                if estatisticas else None
+            )
+            registro['elo_valido'] = not problemas
+            registro['problemas'] = problemas
+            versoes.append(registro)
+            anterior = registro
+        return versoes
+
+
+class CustodiaManager(models.Manager):
+    """Só custódias publicadas; as em preparo (ver CustodiaForm.save) ficam em Custodia.todas"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(publicada=True)
+
 
 class Custodia(models.Model):
     """Modelo principal para armazenar informações da cadeia de custódia"""
+    PDF_PENDENTE = 'pendente'
+    PDF_GERANDO = 'gerando'
+    PDF_GERADO = 'gerado'
+    PDF_ERRO = 'erro'
+    ESTADOS_PDF = [
+        (PDF_PENDENTE, 'Na fila'),
+        (PDF_GERANDO, 'Gerando'),
+        (PDF_GERADO, 'Gerado'),
+        (PDF_ERRO, 'Erro'),
+    ]
+
     numero_documento = models.CharField(
         max_length=50, 
         unique=True, 
@@ -78,7 +150,35 @@ class Custodia(models.Model):
     tamanho_total = models.BigIntegerField(verbose_name="Tamanho Total (bytes)", null=True, blank=True)
     total_arquivos = models.IntegerField(verbose_name="Total de Arquivos", default=0)
     observacoes = models.TextField(blank=True, verbose_name="Observações")
-    pdf_gerado = models.BooleanField(default=False, verbose_name="PDF Gerado")
+    duracao_hash_segundos = models.FloatField(null=True, blank=True, verbose_name="Duração do cálculo de hashes (s)")
+    bytes_hash_lidos = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Bytes lidos no cálculo de hashes",
+        help_text="Não inclui arquivos cujo hash veio do cache.",
+    )
+    vazao_hash_mb_s = models.FloatField(null=True, blank=True, verbose_name="Vazão de leitura (MB/s)")
+    # PDF gerado fora da entrada, por workers próprios (ver tarefas.processar_proximo_pdf)
+    estado_pdf = models.CharField(
+        max_length=20,
+        choices=ESTADOS_PDF,
+        default=PDF_PENDENTE,
+        verbose_name="Estado do PDF",
+    )
+    tentativas_pdf = models.PositiveIntegerField(default=0, verbose_name="Tentativas de geração do PDF")
+    mensagem_pdf = models.TextField(blank=True, verbose_name="Mensagem da geração do PDF")
+    proxima_tentativa_pdf = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Próxima tentativa do PDF",
+        help_text="Depois de uma falha, o PDF só volta a ser gerado a partir deste momento.",
+    )
+    ultimo_sinal_pdf = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Último sinal do worker de PDF",
+        help_text="Atualizado durante a geração; sinal antigo indica worker interrompido.",
+    )
     caminho_pdf = models.TextField(blank=True, verbose_name="Caminho do PDF")
     
     # Relacionamentos
@@ -113,6 +213,43 @@ class Custodia(models.Model):
         verbose_name="Versão atual do caso",
         help_text="Somente a versão mais recente do caso fica marcada como atual.",
     )
+    inventario_delta = models.BooleanField(
+        default=False,
+        verbose_name="Inventário em delta",
+        help_text=(
+            "Verdadeiro se esta versão grava só os arquivos novos, alterados ou removidos "
+            "e herda os demais da custódia anterior (ver inventario())."
+        ),
+    )
+    estatisticas = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name="Estatísticas do inventário",
+        help_text=(
+            "Calculadas no processamento: arquivos e bytes por extensão e por tipo MIME, "
+            "e contagem de novos, alterados, inalterados e removidos (ver estatisticas_inventario())."
+        ),
+    )
+    publicada = models.BooleanField(
+        default=True,
+        verbose_name="Publicada",
+        help_text=(
+            "Falso enquanto o inventário da versão é gravado, antes de ela entrar na "
+            "cadeia do caso; versões em preparo não aparecem em Custodia.objects."
+        ),
+    )
+    versao_inventario_completo = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Versão do inventário completo",
+        help_text=(
+            "Versão com inventário completo em que começa a cadeia do inventário desta "
+            "(a própria versão se não estiver em delta). Preenchida ao criar a custódia."
+        ),
+    )
+
+    objects = CustodiaManager()
+    todas = models.Manager()
 
     class Meta:
         verbose_name = "Custódia"
@@ -121,11 +258,138 @@ class Custodia(models.Model):
         indexes = [
             models.Index(fields=['caso', 'ativo'], name='custodia_caso_ativo_idx'),
             models.Index(fields=['caso', 'versao'], name='custodia_caso_versao_idx'),
+            # Versões que herdam um registro de Arquivo (IndiceHashQuerySet.de_arquivos_por_versao)
+            models.Index(fields=['caso', 'versao_inventario_completo', 'versao'], name='custodia_caso_cadeia_idx'),
+            # Listagem paginada por chave (data_criacao, id), com e sem filtros
+            models.Index(fields=['data_criacao', 'id'], name='custodia_criacao_idx'),
+            models.Index(fields=['ativo', 'data_criacao', 'id'], name='custodia_ativo_criacao_idx'),
+            models.Index(fields=['caso', 'data_criacao', 'id'], name='custodia_caso_criacao_idx'),
+            models.Index(fields=['policial', 'data_criacao', 'id'], name='custodia_policial_criacao_idx'),
+            # Limpeza de versões em preparo abandonadas
+            models.Index(fields=['publicada', 'data_criacao'], name='custodia_publicada_idx'),
+            # Fila de geração de PDFs
+            models.Index(fields=['estado_pdf', 'data_criacao'], name='custodia_estado_pdf_idx'),
         ]
 
     def __str__(self):
         return f"{self.numero_documento} - {self.hash_pasta[:16]}..."
 
+    @property
+    def pdf_gerado(self):
+        return self.estado_pdf == self.PDF_GERADO
+
+    @property
+    def pdf_em_andamento(self):
+        return self.estado_pdf in (self.PDF_PENDENTE, self.PDF_GERANDO)
+
+    @property
+    def pdf_em_pacote(self):
+        """PDF gerado como pacote ZIP (resumo + anexos do inventário)"""
+        return self.caminho_pdf.endswith('.zip')
+
+    def save(self, *args, **kwargs):
+        nova = self._state.adding
+        if nova and self.versao_inventario_completo is None:
+            if self.inventario_delta and self.custodia_anterior_id:
+                self.versao_inventario_completo = self.custodia_anterior.versao_inventario_completo
+            else:
+                self.versao_inventario_completo = self.versao
+        super().save(*args, **kwargs)
+        if nova:
+            IndiceHash.objects.bulk_create(IndiceHash.entradas_custodia(self))
+
+    def ids_cadeia_inventario(self):
+        """
+        IDs das versões cujos registros de Arquivo compõem o inventário desta:
+        ela mesma e, enquanto a versão estiver em delta, as anteriores até a
+        última com inventário completo. Uma consulta (versões do mesmo caso).
+        """
+        if not self.inventario_delta:
+            return [self.pk]
+        # todas: a cadeia de uma versão em preparo (ainda não publicada) também vale
+        versoes = {
+            pk: (anterior_id, delta)
+            for pk, anterior_id, delta in Custodia.todas.filter(caso_id=self.caso_id).values_list(
+                'id', 'custodia_anterior_id', 'inventario_delta'
+            )
+        }
+        ids = [self.pk]
+        anterior_id, delta = versoes[self.pk]
+        while delta and anterior_id is not None:
+            ids.append(anterior_id)
+            anterior_id, delta = versoes[anterior_id]
+        return ids
+
+    def inventario(self):
+        """
+        Inventário completo desta versão como QuerySet de Arquivo (aceita
+        filter/order_by/paginação). Em versões em delta, para cada caminho vale
+        o registro da versão mais recente da cadeia; caminhos cujo registro mais
+        recente é de remoção ficam de fora.
+
+        Cada Arquivo vem anotado com novo_nesta_versao: novo_ou_alterado de
+        registros herdados se refere à versão que os gravou.
+        """
+        ids = self.ids_cadeia_inventario()
+        arquivos = Arquivo.objects.filter(custodia_id__in=ids, removido=False)
+        if len(ids) > 1:
+            mais_recente = Arquivo.objects.filter(
+                custodia_id__in=ids,
+                caminho_relativo=models.OuterRef('caminho_relativo'),
+                custodia__versao__gt=models.OuterRef('custodia__versao'),
+            )
+            arquivos = arquivos.exclude(models.Exists(mais_recente))
+        return arquivos.annotate(
+            novo_nesta_versao=models.ExpressionWrapper(
+                models.Q(custodia_id=self.pk, novo_ou_alterado=True),
+                output_field=models.BooleanField(),
+            )
+        )
+
+    def estatisticas_inventario(self):
+        """
+        Estatísticas do inventário (formato de calcular_estatisticas_inventario).
+        Custódias gravadas antes de existirem as estatísticas as calculam aqui
+        uma vez, a partir do inventário, e as guardam.
+        """
+        if self.estatisticas is not None:
+            return self.estatisticas
+        from .utils import calcular_estatisticas_inventario
+
+        mapa_anterior = None
+        if self.custodia_anterior_id:
+            mapa_anterior = dict(
+                self.custodia_anterior.inventario()
+                .values_list('caminho_relativo', 'hash_arquivo')
+                .iterator(chunk_size=2000)
+            )
+        registros = (
+            dict(zip(('caminho_relativo', 'nome_arquivo', 'tamanho_bytes', 'tipo_mime', 'hash', 'hash_do_cache'), valores))
+            for valores in self.inventario()
+            .values_list('caminho_relativo', 'nome_arquivo', 'tamanho_bytes', 'tipo_mime', 'hash_arquivo', 'hash_do_cache')
+            .iterator(chunk_size=2000)
+        )
+        self.estatisticas = calcular_estatisticas_inventario(registros, mapa_anterior)
+        Custodia.objects.filter(pk=self.pk).update(estatisticas=self.estatisticas)
+        return self.estatisticas
+
+    def estatisticas_por_extensao(self):
+        """[(extensão ou 'sem extensão', arquivos, bytes)] por extensão, em ordem alfabética"""
+        return [
+            (extensao or 'sem extensão', agregado['arquivos'], agregado['bytes'])
+            for extensao, agregado in sorted(self.estatisticas_inventario()['por_extensao'].items())
+        ]
+
+    def estatisticas_por_tipo_mime(self):
+        """[(tipo MIME, arquivos, bytes)] por tipo MIME, do que mais ocupa espaço ao que menos ocupa"""
+        return sorted(
+            (
+                (tipo_mime, agregado['arquivos'], agregado['bytes'])
+                for tipo_mime, agregado in self.estatisticas_inventario()['por_tipo_mime'].items()
+            ),
+            key=lambda item: (-item[2], item[0]),
+        )
+
     def tamanho_total_formatado(self):
         """Retorna o tamanho total formatado em MB/GB"""
         if not self.tamanho_total:
@@ -138,6 +402,16 @@ class Custodia(models.Model):
         return f"{tamanho:.2f} PB"
 
 
+class ArquivoQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Grava os arquivos e as entradas correspondentes de IndiceHash"""
+        objs = super().bulk_create(objs, *args, **kwargs)
+        IndiceHash.objects.bulk_create(
+            IndiceHash.entradas_arquivos(objs), batch_size=kwargs.get('batch_size')
+        )
+        return objs
+
+
 class Arquivo(models.Model):
     """Modelo para armazenar informações dos arquivos individuais"""
     custodia = models.ForeignKey(
@@ -152,6 +426,12 @@ class Arquivo(models.Model):
     tamanho_bytes = models.BigIntegerField(verbose_name="Tamanho (bytes)", null=True, blank=True)
     data_modificacao = models.DateTimeField(null=True, blank=True, verbose_name="Data de Modificação")
     hash_arquivo = models.CharField(max_length=64, blank=True, verbose_name="Hash SHA-256 do Arquivo")
+    hashes_adicionais = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Hashes adicionais",
+        help_text="Digests extras calculados na mesma leitura (ex.: md5, sha512). Não entram na cadeia.",
+    )
     tipo_mime = models.CharField(max_length=100, blank=True, verbose_name="Tipo MIME")
     duracao_segundos = models.IntegerField(null=True, blank=True, verbose_name="Duração (segundos)")
     novo_ou_alterado = models.BooleanField(
@@ -159,15 +439,85 @@ class Arquivo(models.Model):
         verbose_name="Novo ou alterado nesta versão",
         help_text="Falso se o arquivo já existia com o mesmo hash na versão anterior.",
     )
+    hash_do_cache = models.BooleanField(
+        default=False,
+        verbose_name="Hash reaproveitado do cache",
+        help_text="Verdadeiro se o hash veio do cache (arquivo com mesmo dispositivo, inode, tamanho e data) sem releitura.",
+    )
+    tamanho_chunk = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Tamanho do chunk (bytes)",
+        help_text="Preenchido quando o arquivo foi hasheado também por chunks.",
+    )
+    hashes_chunks = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Hashes SHA-256 dos chunks",
+    )
+    hash_raiz_chunks = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Hash raiz dos chunks",
+    )
+    removido = models.BooleanField(
+        default=False,
+        verbose_name="Removido nesta versão",
+        help_text="Registro de remoção em inventário delta: o arquivo existia na versão anterior e não existe nesta.",
+    )
+
+    objects = ArquivoQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Arquivo"
         verbose_name_plural = "Arquivos"
         ordering = ['caminho_relativo']
+        indexes = [
+            models.Index(fields=['custodia', 'caminho_relativo'], name='arquivo_custodia_caminho_idx'),
+        ]
 
     def __str__(self):
         return self.nome_arquivo
 
+    def save(self, *args, **kwargs):
+        novo = self._state.adding
+        super().save(*args, **kwargs)
+        if novo:
+            IndiceHash.objects.bulk_create(IndiceHash.entradas_arquivos([self]))
+
+    def hashes_adicionais_ordenados(self):
+        """Lista [(ALGORITMO, hex)] dos hashes adicionais, em ordem alfabética"""
+        return [(nome.upper(), valor) for nome, valor in sorted((self.hashes_adicionais or {}).items())]
+
+    @property
+    def arvore_chunks(self):
+        """Árvore de chunks no formato de calcular_arvore_hash_arquivo, ou None"""
+        if not self.tamanho_chunk:
+            return None
+        return {
+            'tamanho_chunk': self.tamanho_chunk,
+            'hashes': self.hashes_chunks,
+            'raiz': self.hash_raiz_chunks,
+        }
+
+    def verificar_amostra_chunks(self, quantidade: int, semente=None, max_workers: int = 1):
+        """
+        Spot-check: relê uma amostra aleatória de `quantidade` chunks do arquivo
+        em caminho_completo e compara com os hashes gravados.
+
+        Retorna o dicionário de verificar_chunks_arquivo. Exige que o arquivo
+        tenha sido hasheado por chunks.
+        """
+        from .utils import amostrar_chunks, verificar_chunks_arquivo
+
+        arvore = self.arvore_chunks
+        if arvore is None:
+            raise ValueError(f"Arquivo sem hashes de chunks: {self.caminho_relativo}")
+        indices = amostrar_chunks(len(arvore['hashes']), quantidade, semente)
+        return verificar_chunks_arquivo(
+            self.caminho_completo, arvore, self.tamanho_bytes, indices, max_workers
+        )
+
     def tamanho_formatado(self):
         """Retorna o tamanho formatado em MB/GB"""
         if not self.tamanho_bytes:
@@ -178,3 +528,250 @@ class Arquivo(models.Model):
                 return f"{tamanho:.2f} {unidade}"
             tamanho /= 1024.0
         return f"{tamanho:.2f} PB"
+
+
+class IndiceHashQuerySet(models.QuerySet):
+    def com_prefixo(self, prefixo: str):
+        """
+        Entradas cujo hash começa com `prefixo` (hexadecimal minúsculo); com 64
+        caracteres, busca exata. O prefixo vira um intervalo [prefixo, prefixo+'g'),
+        resolvido pelo índice em qualquer banco ('g' vem logo depois de 'f').
+        """
+        if len(prefixo) >= 64:
+            return self.filter(hash=prefixo)
+        return self.filter(hash__gte=prefixo, hash__lt=prefixo + 'g')
+
+    def de_arquivos_por_versao(self):
+        """
+        Entradas de hash de arquivo, uma linha por versão publicada cujo
+        inventário contém o registro, com o id dela em custodia_visivel_id.
+
+        Em delta, um registro de Arquivo gravado na versão X vale também nas
+        versões seguintes da mesma cadeia (mesma versao_inventario_completo) até
+        versao_limite, exclusive: a versão que alterou ou removeu o caminho,
+        gravada na publicação dela. Mesma regra de
+        Custodia.ids_cadeia_inventario/inventario(), resolvida pelo índice
+        custodia_caso_cadeia_idx: cada entrada se expande em no máximo
+        CUSTODIA_INVENTARIO_COMPLETO_A_CADA versões, sem subconsultas.
+        """
+        return (
+            self.filter(origem=IndiceHash.ORIGEM_HASH_ARQUIVO, custodia__publicada=True)
+            .annotate(
+                # Mesma junção (caso -> versões) nas quatro anotações
+                custodia_visivel_id=models.F('custodia__caso__custodias__id'),
+                versao_visivel=models.F('custodia__caso__custodias__versao'),
+                cadeia_visivel=models.F('custodia__caso__custodias__versao_inventario_completo'),
+                visivel_publicada=models.F('custodia__caso__custodias__publicada'),
+            )
+            .filter(
+                models.Q(versao_limite__isnull=True) | models.Q(versao_visivel__lt=models.F('versao_limite')),
+                cadeia_visivel=models.F('custodia__versao_inventario_completo'),
+                visivel_publicada=True,
+                versao_visivel__gte=models.F('custodia__versao'),
+            )
+        )
+
+    def encerrar_substituidas(self, custodia):
+        """
+        Na publicação de uma versão em delta, grava versao_limite nas entradas
+        dos registros herdados cujo caminho ela regravou (alteração ou remoção).
+        Em lotes pelos caminhos gravados na versão; só entradas ainda abertas.
+        """
+        if not custodia.inventario_delta:
+            return 0
+        from .utils import em_lotes
+
+        anteriores = custodia.ids_cadeia_inventario()[1:]
+        caminhos = (
+            Arquivo.objects.filter(custodia=custodia)
+            .values_list('caminho_relativo', flat=True)
+            .iterator(chunk_size=2000)
+        )
+        encerradas = 0
+        for lote in em_lotes(caminhos, 500):
+            encerradas += self.filter(
+                origem=IndiceHash.ORIGEM_HASH_ARQUIVO,
+                versao_limite__isnull=True,
+                arquivo__in=Arquivo.objects.filter(custodia_id__in=anteriores, caminho_relativo__in=lote),
+            ).update(versao_limite=custodia.versao)
+        return encerradas
+
+
+class IndiceHash(models.Model):
+    """
+    Índice de busca por hash: uma linha por hash registrado (hashes da custódia
+    e hash de cada arquivo), em minúsculas, para busca exata ou por prefixo sem
+    varrer as tabelas. Mantido na gravação de Custodia e Arquivo (save e
+    bulk_create); os registros existentes são preenchidos pela migração.
+    """
+    ORIGEM_HASH_PASTA = 'hash_pasta'
+    ORIGEM_HASH_CADEIA_ANTERIOR = 'hash_cadeia_anterior'
+    ORIGEM_HASH_CONTEUDO_NOVOS = 'hash_conteudo_novos'
+    ORIGEM_HASH_ARQUIVO = 'hash_arquivo'
+    ORIGENS = [
+        (ORIGEM_HASH_PASTA, 'Hash final da cadeia'),
+        (ORIGEM_HASH_CADEIA_ANTERIOR, 'Hash final da versão anterior'),
+        (ORIGEM_HASH_CONTEUDO_NOVOS, 'Hash agregado dos novos ou alterados'),
+        (ORIGEM_HASH_ARQUIVO, 'Hash de arquivo do inventário'),
+    ]
+    ORIGENS_CUSTODIA = (ORIGEM_HASH_PASTA, ORIGEM_HASH_CADEIA_ANTERIOR, ORIGEM_HASH_CONTEUDO_NOVOS)
+
+    hash = models.CharField(max_length=64, verbose_name="Hash")
+    origem = models.CharField(max_length=24, choices=ORIGENS, verbose_name="Origem")
+    custodia = models.ForeignKey(
+        Custodia,
+        on_delete=models.CASCADE,
+        related_name='indices_hash',
+        verbose_name="Custódia",
+    )
+    arquivo = models.ForeignKey(
+        Arquivo,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Arquivo",
+    )
+    versao_limite = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Válido até a versão",
+        help_text=(
+            "Hash de arquivo: primeira versão do caso (exclusive) que alterou ou removeu o "
+            "caminho; vazio enquanto o registro for herdado pelas versões seguintes."
+        ),
+    )
+
+    objects = IndiceHashQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Índice de Hash"
+        verbose_name_plural = "Índice de Hashes"
+        indexes = [
+            models.Index(fields=['hash', 'custodia'], name='indice_hash_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hash[:16]}... ({self.get_origem_display()})"
+
+    @classmethod
+    def entradas_custodia(cls, custodia) -> list:
+        return [
+            cls(hash=valor.lower(), origem=origem, custodia_id=custodia.pk)
+            for origem in cls.ORIGENS_CUSTODIA
+            if (valor := getattr(custodia, origem))
+        ]
+
+    @classmethod
+    def entradas_arquivos(cls, arquivos) -> list:
+        """Entradas de hash_arquivo; arquivos sem pk (banco sem RETURNING) são buscados"""
+        arquivos = [a for a in arquivos if a.hash_arquivo and not a.removido]
+        sem_pk = [a for a in arquivos if a.pk is None]
+        if sem_pk:
+            ids = {}
+            for custodia_id in {a.custodia_id for a in sem_pk}:
+                ids.update(
+                    ((custodia_id, rel), pk)
+                    for pk, rel in Arquivo.objects.filter(custodia_id=custodia_id)
+                    .values_list('pk', 'caminho_relativo')
+                )
+            for a in sem_pk:
+                a.pk = ids.get((a.custodia_id, a.caminho_relativo))
+        return [
+            cls(
+                hash=a.hash_arquivo.lower(),
+                origem=cls.ORIGEM_HASH_ARQUIVO,
+                custodia_id=a.custodia_id,
+                arquivo_id=a.pk,
+            )
+            for a in arquivos
+        ]
+
+
+class CacheHashArquivo(models.Model):
+    """Cache persistente de hashes de arquivos, indexado pelos metadados de stat"""
+    chave = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name="Chave (dispositivo, inode, tamanho, mtime, caminho)",
+    )
+    caminho_completo = models.TextField(verbose_name="Caminho Completo")
+    hash_arquivo = models.CharField(max_length=64, verbose_name="Hash SHA-256 do Arquivo")
+    hashes_adicionais = models.JSONField(default=dict, blank=True, verbose_name="Hashes adicionais")
+    arvore_chunks = models.JSONField(null=True, blank=True, verbose_name="Árvore de chunks")
+    data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name="Data de Cadastro")
+    ultimo_uso = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Último Uso")
+
+    class Meta:
+        verbose_name = "Cache de Hash"
+        verbose_name_plural = "Cache de Hashes"
+        ordering = ['-ultimo_uso']
+
+    def __str__(self):
+        return f"{self.caminho_completo} - {self.hash_arquivo[:16]}..."
+
+
+class TarefaCustodia(models.Model):
+    """
+    Tarefa de processamento de custódia (fila no banco, executada por workers):
+    entrada de uma nova versão ou verificação de integridade de uma custódia
+    """
+    TIPO_ENTRADA = 'entrada'
+    TIPO_VERIFICACAO = 'verificacao'
+    TIPOS = [
+        (TIPO_ENTRADA, 'Entrada de custódia'),
+        (TIPO_VERIFICACAO, 'Verificação de integridade'),
+    ]
+
+    ESTADO_PENDENTE = 'pendente'
+    ESTADO_EM_EXECUCAO = 'em_execucao'
+    ESTADO_CONCLUIDA = 'concluida'
+    ESTADO_ERRO = 'erro'
+    ESTADOS = [
+        (ESTADO_PENDENTE, 'Pendente'),
+        (ESTADO_EM_EXECUCAO, 'Em execução'),
+        (ESTADO_CONCLUIDA, 'Concluída'),
+        (ESTADO_ERRO, 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS, default=TIPO_ENTRADA, verbose_name="Tipo")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ESTADO_PENDENTE, verbose_name="Estado")
+    dados = models.JSONField(verbose_name="Dados do formulário")
+    custodia = models.ForeignKey(
+        Custodia,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tarefas',
+        verbose_name="Custódia",
+        help_text="Gerada pela entrada ou conferida pela verificação.",
+    )
+    tentativas = models.PositiveIntegerField(default=0, verbose_name="Tentativas")
+    worker = models.CharField(max_length=255, blank=True, verbose_name="Worker")
+    mensagem = models.TextField(blank=True, verbose_name="Mensagem")
+    progresso = models.JSONField(default=dict, blank=True, verbose_name="Progresso do cálculo de hashes")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Relatório da verificação")
+    data_criacao = models.DateTimeField(default=timezone.now, verbose_name="Data de Criação")
+    data_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Início da Execução")
+    data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Conclusão")
+    ultimo_sinal = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Último sinal do worker",
+        help_text="Atualizado periodicamente durante a execução; sinal antigo indica worker interrompido.",
+    )
+
+    class Meta:
+        verbose_name = "Tarefa de Custódia"
+        verbose_name_plural = "Tarefas de Custódia"
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['estado', 'data_criacao'], name='tarefa_estado_criacao_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tarefa {self.pk} ({self.get_estado_display()})"
+
+    @property
+    def finalizada(self):
+        return self.estado in (self.ESTADO_CONCLUIDA, self.ESTADO_ERRO)
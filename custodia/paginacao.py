@@ -0,0 +1,132 @@
+import base64
+import json
+from datetime import date, datetime, time as dt_time
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class PaginaKeyset:
+    """
+    Página de uma paginação por chave (keyset/cursor): em vez de OFFSET, cada
+    página começa logo após (ou antes de) um cursor com os valores da ordenação
+    do último (ou primeiro) item, então páginas profundas custam o mesmo que a
+    primeira.
+    """
+
+    def __init__(self, itens: list, cursor_proxima: Optional[str], cursor_anterior: Optional[str]):
+        self.itens = itens
+        self.cursor_proxima = cursor_proxima
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tem_proxima(self) -> bool:
+        return self.cursor_proxima is not None
+
+    @property
+    def tem_anterior(self) -> bool:
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+
+class _EncoderCursor(DjangoJSONEncoder):
+    """Datas com microssegundos (o DjangoJSONEncoder trunca em milissegundos e o cursor não casaria)"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, date, dt_time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def codificar_cursor(valores: List[Any]) -> str:
+    texto = json.dumps(valores, cls=_EncoderCursor, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: Optional[str], campos: List) -> Optional[Tuple]:
+    """Valores do cursor convertidos pelos campos do modelo; None se ausente ou inválido"""
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        valores = json.loads(texto)
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        return tuple(campo.to_python(valor) for campo, valor in zip(campos, valores))
+    except (ValueError, ValidationError):
+        return None
+
+
+def _campo_ordenacao(queryset, campo: str):
+    """Campo do modelo ou de uma anotação (para converter os valores do cursor)"""
+    anotacao = queryset.query.annotations.get(campo)
+    if anotacao is not None:
+        return anotacao.output_field
+    return queryset.model._meta.get_field(campo)
+
+
+def _depois_da_chave(queryset, campo: str, valor, pk, crescente: bool):
+    """
+    Itens estritamente depois de (valor, pk) na ordem (campo, pk). A condição é
+    escrita como faixa em `campo` mais o desempate por pk, que o banco resolve
+    com uma faixa do índice (campo, id).
+    """
+    if crescente:
+        return queryset.filter(**{f'{campo}__gte': valor}).exclude(**{campo: valor, 'pk__lte': pk})
+    return queryset.filter(**{f'{campo}__lte': valor}).exclude(**{campo: valor, 'pk__gte': pk})
+
+
+def paginar_keyset(
+    queryset,
+    campo: str,
+    tamanho: int,
+    cursor_apos: Optional[str] = None,
+    cursor_antes: Optional[str] = None,
+    decrescente: bool = True,
+) -> PaginaKeyset:
+    """
+    Pagina `queryset` na ordem (campo, id), decrescente por padrão. `campo`
+    pode ser uma anotação do queryset, mas não pode ter NULL.
+
+    cursor_apos: itens seguintes ao cursor; cursor_antes: itens anteriores,
+    para voltar uma página. Sem cursor, primeira página.
+    """
+    campos = [_campo_ordenacao(queryset, campo), queryset.model._meta.pk]
+    apos = decodificar_cursor(cursor_apos, campos)
+    antes = None if apos else decodificar_cursor(cursor_antes, campos)
+
+    ordem = [f'-{campo}', '-pk'] if decrescente else [campo, 'pk']
+    if antes:
+        # Percorre a ordem inversa a partir do cursor e desinverte no fim
+        inversa = [campo, 'pk'] if decrescente else [f'-{campo}', '-pk']
+        qs = _depois_da_chave(queryset, campo, *antes, crescente=decrescente).order_by(*inversa)
+    else:
+        qs = queryset.order_by(*ordem)
+        if apos:
+            qs = _depois_da_chave(qs, campo, *apos, crescente=not decrescente)
+
+    itens = list(qs[:tamanho + 1])
+    ha_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    if antes:
+        itens.reverse()
+
+    def cursor_de(item):
+        return codificar_cursor([getattr(item, campo), item.pk])
+
+    if not itens:
+        return PaginaKeyset([], None, None)
+    # Voltando (antes), sempre há próxima; avançando (apos), sempre há anterior
+    tem_proxima = ha_mais if not antes else True
+    tem_anterior = bool(apos) or (bool(antes) and ha_mais)
+    return PaginaKeyset(
+        itens,
+        cursor_de(itens[-1]) if tem_proxima else None,
+        cursor_de(itens[0]) if tem_anterior else None,
+    )
@@ -2,17 +2,27 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
+from reportlab.pdfbase.pdfmetrics import getFont
+from reportlab.graphics.barcode import qrencoder
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Flowable
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 from reportlab.pdfgen import canvas
-from io import BytesIO
+from reportlab.pdfgen.pathobject import PDFPathObject
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 import html
-import qrcode
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+import django
 from django.conf import settings
 from django.utils import timezone
 from pathlib import Path
 from .models import Custodia
-from .utils import formatar_tamanho
+from .utils import calcular_hash_arquivo, formatar_tamanho, mapear_em_ordem
 
 
 def _formato_versao_pdf(versao: int) -> str:
@@ -20,22 +30,69 @@ def _formato_versao_pdf(versao: int) -> str:
     return f"V{versao}.0"
 
 
-def criar_qrcode_hash(hash_value: str) -> BytesIO:
-    """Cria um QR Code com o hash e retorna como BytesIO"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(hash_value)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    img_bytes = BytesIO()
-    img.save(img_bytes, format='PNG')
-    img_bytes.seek(0)
-    return img_bytes
+# Matrizes de QR Code guardadas por processo (regerar PDFs de custódias já
+# vistas não recalcula a codificação nem a escolha de máscara)
+TAMANHO_CACHE_QRCODE = 1024
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_QRCODE)
+def matriz_qrcode(valor: str) -> Tuple[bytes, ...]:
+    """
+    Módulos do QR Code (correção L, menor versão que comporta o valor), uma
+    linha por bytes com 1 = escuro (~2 KB por matriz no cache)
+    """
+    qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.L)
+    qr.addData(valor)
+    qr.make()
+    n = qr.getModuleCount()
+    return tuple(bytes(qr.isDark(linha, coluna) for coluna in range(n)) for linha in range(n))
+
+
+class QrCodeVetorial(Flowable):
+    """
+    QR Code desenhado como retângulos no próprio PDF (sem imagem raster): cada
+    sequência de módulos escuros de uma linha vira um retângulo, com
+    coordenadas inteiras em unidades de módulo (escala aplicada pelo canvas),
+    e tudo é preenchido num único path.
+    """
+
+    def __init__(self, valor: str, tamanho: float = 5*cm, borda: int = 4):
+        super().__init__()
+        self.valor = valor
+        self.tamanho = tamanho
+        self.borda = borda
+        self.hAlign = 'CENTER'
+
+    def wrap(self, largura_disponivel, altura_disponivel):
+        return self.tamanho, self.tamanho
+
+    def _operacoes(self, matriz: Tuple[bytes, ...]) -> List[str]:
+        total = len(matriz) + 2 * self.borda
+        operacoes = []
+        for i, linha in enumerate(matriz):
+            y = total - self.borda - i - 1
+            coluna, n = 0, len(linha)
+            while coluna < n:
+                if not linha[coluna]:
+                    coluna += 1
+                    continue
+                inicio = coluna
+                while coluna < n and linha[coluna]:
+                    coluna += 1
+                operacoes.append(f"{self.borda + inicio} {y} {coluna - inicio} 1 re")
+        return operacoes
+
+    def draw(self):
+        matriz = matriz_qrcode(self.valor)
+        canv = self.canv
+        canv.saveState()
+        canv.setFillColor(colors.white)
+        canv.rect(0, 0, self.tamanho, self.tamanho, stroke=0, fill=1)
+        modulo = self.tamanho / (len(matriz) + 2 * self.borda)
+        canv.scale(modulo, modulo)
+        canv.setFillColor(colors.black)
+        canv.drawPath(PDFPathObject(code=self._operacoes(matriz)), stroke=0, fill=1)
+        canv.restoreState()
 
 
 def formatar_datetime(dt, formato: str) -> str:
@@ -47,359 +104,760 @@ def formatar_datetime(dt, formato: str) -> str:
     return dt.strftime(formato)
 
 
-def gerar_pdf_custodia(custodia: Custodia) -> str:
+# ---------------------------------------------------------------------------
+# Inventário de arquivos
+#
+# Com dezenas de milhares de arquivos, uma única Table com um Paragraph por
+# célula estoura memória e tempo (o ReportLab mede a tabela inteira de uma
+# vez). O inventário é emitido como uma Table pequena por página, com células
+# de texto simples já quebradas em linhas (larguras medidas pela fonte), e as
+# linhas vêm de um cursor do banco: a memória fica na ordem de uma página.
+# ---------------------------------------------------------------------------
+
+COLUNAS_INVENTARIO = ['Caminho Relativo', 'Nome', 'Novo/alt.', 'Tamanho', 'Data Mod.', 'Hash']
+# Somam a largura útil do frame em A4 com margens de 2 cm (16,5 cm); a coluna
+# de hash comporta 32 hexadecimais por linha em Courier 7 (SHA-256 em duas linhas)
+LARGURAS_INVENTARIO = [3.9*cm, 2.7*cm, 1.4*cm, 1.7*cm, 1.8*cm, 5.0*cm]
+FONTE_INVENTARIO = 'Helvetica'
+FONTE_HASH_INVENTARIO = 'Courier'
+TAMANHO_FONTE_INVENTARIO = 7.5
+TAMANHO_FONTE_HASH_INVENTARIO = 7
+ENTRELINHA_INVENTARIO = 9
+PADDING_H_INVENTARIO = 3
+PADDING_V_INVENTARIO = 3
+ALTURA_CABECALHO_INVENTARIO = ENTRELINHA_INVENTARIO + 2 * PADDING_V_INVENTARIO + 4
+# Caminhos muito longos são truncados para que uma linha nunca passe de uma página
+MAX_LINHAS_CELULA_INVENTARIO = 40
+# Linhas de Arquivo lidas por vez do banco
+LOTE_INVENTARIO_PDF = 2000
+
+CAMPOS_INVENTARIO_PDF = (
+    'caminho_relativo',
+    'nome_arquivo',
+    'novo_nesta_versao',
+    'tamanho_bytes',
+    'data_modificacao',
+    'hash_arquivo',
+    'hashes_adicionais',
+    'tamanho_chunk',
+    'hashes_chunks',
+    'hash_raiz_chunks',
+    'hash_do_cache',
+)
+
+ESTILO_TABELA_INVENTARIO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), TAMANHO_FONTE_INVENTARIO),
+    ('LEADING', (0, 0), (-1, -1), ENTRELINHA_INVENTARIO),
+    ('FONTNAME', (0, 1), (-2, -1), FONTE_INVENTARIO),
+    ('FONTNAME', (-1, 1), (-1, -1), FONTE_HASH_INVENTARIO),
+    ('FONTSIZE', (-1, 1), (-1, -1), TAMANHO_FONTE_HASH_INVENTARIO),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), PADDING_H_INVENTARIO),
+    ('RIGHTPADDING', (0, 0), (-1, -1), PADDING_H_INVENTARIO),
+    ('TOPPADDING', (0, 0), (-1, -1), PADDING_V_INVENTARIO),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), PADDING_V_INVENTARIO),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), PADDING_V_INVENTARIO + 4),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+])
+
+
+# Larguras de caractere por (fonte, tamanho, caractere), guardadas por processo
+TAMANHO_CACHE_LARGURAS = 8192
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_LARGURAS)
+def _largura_caractere(fonte: str, tamanho: float, caractere: str) -> float:
+    return getFont(fonte).stringWidth(caractere, tamanho)
+
+
+class _QuebraTexto:
     """
-    Gera o PDF completo da cadeia de custódia
-    
-    Retorna o caminho do arquivo PDF gerado
+    Quebra texto em linhas que cabem numa largura, medindo cada caractere pela
+    fonte (_largura_caractere, com cache por processo). Caminhos raramente têm
+    espaços: a quebra cai de preferência logo após um separador ('/', '\\',
+    espaço, '_', '-', '.'). Sem estado mutável: é compartilhada pelo TemaPdf.
     """
-    # Criar nome do arquivo
-    nome_arquivo = f"custodia_{custodia.numero_documento}_{timezone.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    caminho_pdf = Path(settings.PDFS_DIR) / nome_arquivo
-    
-    # Garantir que a pasta existe
-    settings.PDFS_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Criar documento PDF
-    doc = SimpleDocTemplate(
-        str(caminho_pdf),
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-    
-    # Container para elementos do PDF
-    story = []
-    
-    # Estilos
+    SEPARADORES = frozenset('/\\ _-.')
+
+    def __init__(self, fonte: str, tamanho: float):
+        getFont(fonte)  # fonte desconhecida falha aqui, não no meio da geração
+        self._fonte = fonte
+        self._tamanho = tamanho
+
+    def _largura(self, caractere: str) -> float:
+        return _largura_caractere(self._fonte, self._tamanho, caractere)
+
+    def linhas(self, texto: str, largura_maxima: float) -> List[str]:
+        linhas = []
+        for paragrafo in texto.split('\n'):
+            inicio, acumulada, ultimo_separador = 0, 0.0, -1
+            for i, caractere in enumerate(paragrafo):
+                acumulada += self._largura(caractere)
+                if acumulada > largura_maxima and i > inicio:
+                    corte = ultimo_separador + 1 if ultimo_separador >= inicio else i
+                    linhas.append(paragrafo[inicio:corte])
+                    inicio, ultimo_separador = corte, -1
+                    acumulada = sum(self._largura(c) for c in paragrafo[inicio:i + 1])
+                if caractere in self.SEPARADORES:
+                    ultimo_separador = i
+            linhas.append(paragrafo[inicio:])
+        return linhas
+
+    def texto(self, texto: str, largura_maxima: float) -> str:
+        """Texto com as quebras de linha ('\\n') para uma célula de Table"""
+        return '\n'.join(self.linhas(texto, largura_maxima))
+
+
+class FormatadorInventarioPdf:
+    """Converte linhas do inventário (CAMPOS_INVENTARIO_PDF) em células de texto simples e altura"""
+
+    def __init__(self, texto: Optional[_QuebraTexto] = None):
+        self._texto = texto or _QuebraTexto(FONTE_INVENTARIO, TAMANHO_FONTE_INVENTARIO)
+        util = [largura - 2 * PADDING_H_INVENTARIO for largura in LARGURAS_INVENTARIO]
+        self._largura_caminho, self._largura_nome = util[0], util[1]
+        # Courier: todos os caracteres têm 0,6 em de largura
+        self._hex_por_linha = max(1, int(util[-1] // (0.6 * TAMANHO_FONTE_HASH_INVENTARIO)))
+
+    def _limitar(self, linhas: List[str]) -> List[str]:
+        if len(linhas) > MAX_LINHAS_CELULA_INVENTARIO:
+            linhas = linhas[:MAX_LINHAS_CELULA_INVENTARIO]
+            linhas[-1] = linhas[-1][:-1] + '…'
+        return linhas
+
+    def _linhas_hash(self, texto: str) -> List[str]:
+        n = self._hex_por_linha
+        return [texto[i:i + n] for i in range(0, len(texto), n)] or ['']
+
+    def celulas(self, registro: tuple) -> Tuple[list, float]:
+        (caminho, nome, novo, tamanho, data, hash_arquivo, adicionais,
+         tamanho_chunk, hashes_chunks, raiz_chunks, do_cache) = registro
+        caminho_linhas = self._limitar(self._texto.linhas(caminho or '', self._largura_caminho))
+        nome_linhas = self._limitar(self._texto.linhas(nome or '', self._largura_nome))
+        hash_linhas = self._linhas_hash(hash_arquivo or 'N/A')
+        for algoritmo, valor in sorted((adicionais or {}).items()):
+            hash_linhas += self._linhas_hash(f'{algoritmo.upper()}: {valor}')
+        if tamanho_chunk:
+            hash_linhas.append(f'RAIZ ({len(hashes_chunks or [])} x {formatar_tamanho(tamanho_chunk)}):')
+            hash_linhas += self._linhas_hash(raiz_chunks or '')
+        if do_cache:
+            hash_linhas.append('(cache)')
+        data_linhas = formatar_datetime(data, '%d/%m/%Y\n%H:%M').split('\n')
+        altura_linhas = max(len(caminho_linhas), len(nome_linhas), len(hash_linhas), len(data_linhas))
+        return (
+            [
+                '\n'.join(caminho_linhas),
+                '\n'.join(nome_linhas),
+                'Sim' if novo else 'Não',
+                formatar_tamanho(tamanho or 0),
+                '\n'.join(data_linhas),
+                '\n'.join(hash_linhas),
+            ],
+            altura_linhas * ENTRELINHA_INVENTARIO + 2 * PADDING_V_INVENTARIO,
+        )
+
+    def linhas(self, registros: Iterable[tuple]) -> Iterator[Tuple[list, float]]:
+        for registro in registros:
+            yield self.celulas(registro)
+
+
+class InventarioPaginado(Flowable):
+    """
+    Tabela do inventário emitida uma página por vez.
+
+    wrap() nunca cabe enquanto há linhas, o que faz o ReportLab chamar split()
+    em cada frame: split() monta uma Table só com as linhas que cabem na altura
+    disponível (com o cabeçalho repetido) e devolve a si mesmo para o restante.
+    As alturas são calculadas pelo formatador, então a Table não precisa
+    medir as células.
+    """
+
+    def __init__(self, linhas: Iterable[Tuple[list, float]]):
+        super().__init__()
+        self._linhas = iter(linhas)
+        self._proxima = None
+        self.total_linhas = 0
+        self.paginas = 0
+
+    def _espiar(self):
+        if self._proxima is None:
+            self._proxima = next(self._linhas, None)
+        return self._proxima
+
+    def wrap(self, largura_disponivel, altura_disponivel):
+        if self._espiar() is None:
+            return largura_disponivel, 0
+        return largura_disponivel, altura_disponivel + 1
+
+    def draw(self):
+        # Só chega aqui sem linhas restantes (altura zero)
+        pass
+
+    def split(self, largura_disponivel, altura_disponivel):
+        celulas, alturas = [COLUNAS_INVENTARIO], [ALTURA_CABECALHO_INVENTARIO]
+        restante = altura_disponivel - ALTURA_CABECALHO_INVENTARIO
+        while True:
+            linha = self._espiar()
+            if linha is None or linha[1] > restante:
+                break
+            celulas.append(linha[0])
+            alturas.append(linha[1])
+            restante -= linha[1]
+            self._proxima = None
+        if len(celulas) == 1:
+            # Nem uma linha cabe no fim deste frame: o ReportLab passa ao próximo
+            return []
+        self.total_linhas += len(celulas) - 1
+        self.paginas += 1
+        if hasattr(self, '_postponed'):
+            del self._postponed
+        tabela = Table(celulas, colWidths=LARGURAS_INVENTARIO, rowHeights=alturas, style=ESTILO_TABELA_INVENTARIO)
+        if self._espiar() is None:
+            return [tabela]
+        return [tabela, self]
+
+
+def inventario_paginado(custodia: Custodia, consulta=None) -> Optional[InventarioPaginado]:
+    """
+    Flowable do inventário da custódia em ordem de caminho (ou das linhas de
+    `consulta`, um queryset de inventario()), lido do banco em lotes;
+    None se não houver arquivos.
+    """
+    consulta = consulta if consulta is not None else custodia.inventario()
+    consulta = consulta.order_by('caminho_relativo')
+    if not consulta.exists():
+        return None
+    registros = consulta.values_list(*CAMPOS_INVENTARIO_PDF).iterator(chunk_size=LOTE_INVENTARIO_PDF)
+    return InventarioPaginado(FormatadorInventarioPdf(tema_pdf().inventario).linhas(registros))
+
+
+# ---------------------------------------------------------------------------
+# Tema e seções do documento
+#
+# Estilos de parágrafo e de tabela são montados uma vez por processo
+# (tema_pdf) e compartilhados por todas as gerações; cada seção do documento
+# é uma função (custodia, tema) -> flowables. As tabelas de rótulo/valor usam
+# texto simples já quebrado pela métrica da fonte, sem montar um Paragraph
+# por célula.
+# ---------------------------------------------------------------------------
+
+LARGURAS_CAMPOS = [6*cm, 10*cm]
+# Padding horizontal padrão das células do ReportLab
+PADDING_H_CAMPOS = 6
+
+
+def _estilo_tabela_campos(padding: float) -> TableStyle:
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
+        ('TEXTCOLOR', (1, 0), (1, -1), colors.HexColor('#34495e')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('LEADING', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), padding),
+        ('TOPPADDING', (0, 0), (-1, -1), padding),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ])
+
+
+class TemaPdf(NamedTuple):
+    """Estilos do documento de custódia; compartilhado entre gerações, não deve ser alterado"""
+    titulo: ParagraphStyle
+    subtitulo: ParagraphStyle
+    normal: ParagraphStyle
+    titulo_anexo: ParagraphStyle
+    celula_anexo: ParagraphStyle
+    hash_anexo: ParagraphStyle
+    tabela_campos: TableStyle
+    tabela_cadeia: TableStyle
+    tabela_anexos: TableStyle
+    rotulos: _QuebraTexto
+    valores: _QuebraTexto
+    inventario: _QuebraTexto
+
+
+@lru_cache(maxsize=1)
+def tema_pdf() -> TemaPdf:
+    """Tema montado na primeira geração do processo"""
     styles = getSampleStyleSheet()
-    
-    # Estilos customizados
-    titulo_style = ParagraphStyle(
-        'TituloCustom',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitulo_style = ParagraphStyle(
-        'SubtituloCustom',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#2c3e50'),
-        spaceAfter=12,
-        spaceBefore=12,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = ParagraphStyle(
+    normal = ParagraphStyle(
         'NormalCustom',
         parent=styles['Normal'],
         fontSize=10,
         textColor=colors.HexColor('#34495e'),
-        alignment=TA_JUSTIFY
+        alignment=TA_JUSTIFY,
     )
-
-    label_style = ParagraphStyle(
-        'LabelCustom',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.black,
-        fontName='Helvetica-Bold',
-        wordWrap='CJK'
+    return TemaPdf(
+        titulo=ParagraphStyle(
+            'TituloCustom',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#1a1a1a'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold',
+        ),
+        subtitulo=ParagraphStyle(
+            'SubtituloCustom',
+            parent=styles['Heading2'],
+            fontSize=14,
+            textColor=colors.HexColor('#2c3e50'),
+            spaceAfter=12,
+            spaceBefore=12,
+            fontName='Helvetica-Bold',
+        ),
+        normal=normal,
+        titulo_anexo=ParagraphStyle('TituloAnexo', parent=styles['Heading2'], fontSize=14, alignment=TA_CENTER),
+        celula_anexo=ParagraphStyle('CelulaAnexo', parent=normal, fontSize=8, leading=10, alignment=TA_LEFT, wordWrap='CJK'),
+        hash_anexo=ParagraphStyle('HashAnexo', parent=normal, fontName='Courier', fontSize=7, leading=9, alignment=TA_LEFT, wordWrap='CJK'),
+        tabela_campos=_estilo_tabela_campos(padding=8),
+        tabela_cadeia=_estilo_tabela_campos(padding=6),
+        tabela_anexos=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+        ]),
+        rotulos=_QuebraTexto('Helvetica-Bold', 10),
+        valores=_QuebraTexto('Helvetica', 10),
+        inventario=_QuebraTexto(FONTE_INVENTARIO, TAMANHO_FONTE_INVENTARIO),
     )
 
-    wrap_style = ParagraphStyle(
-        'WrapCustom',
-        parent=normal_style,
-        wordWrap='CJK'
-    )
-    
-    # Estilo para células da tabela (quebra de linha)
-    cell_style = ParagraphStyle(
-        'CellCustom',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.black,
-        alignment=TA_LEFT,
-        leftIndent=0,
-        rightIndent=0,
-        spaceBefore=0,
-        spaceAfter=0,
-        wordWrap='CJK',
-    )
-    
-    # ========== CABEÇALHO ==========
-    story.append(Paragraph("DOCUMENTO DE CADEIA DE CUSTÓDIA", titulo_style))
-    story.append(Paragraph("DOCUMENTOS E ARQUIVOS", titulo_style))
-    story.append(Spacer(1, 0.5*cm))
-    
+
+def _tabela_campos(campos: List[Tuple[str, str]], tema: TemaPdf, estilo: Optional[TableStyle] = None) -> Table:
+    """Tabela de pares (rótulo, valor) nas larguras LARGURAS_CAMPOS"""
+    largura_rotulo, largura_valor = (largura - 2 * PADDING_H_CAMPOS for largura in LARGURAS_CAMPOS)
+    linhas = [
+        [tema.rotulos.texto(rotulo, largura_rotulo), tema.valores.texto(valor, largura_valor)]
+        for rotulo, valor in campos
+    ]
+    return Table(linhas, colWidths=LARGURAS_CAMPOS, style=estilo or tema.tabela_campos)
+
+
+def _secao_cabecalho(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
     doc_anterior_txt = (
         custodia.custodia_anterior.numero_documento
         if getattr(custodia, 'custodia_anterior_id', None)
         else 'N/A (primeira versão)'
     )
-
-    # Informações do documento
-    info_doc_data = [
-        [Paragraph('Número do Documento:', label_style), Paragraph(custodia.numero_documento or 'N/A', wrap_style)],
-        [Paragraph('Versão (procedimento):', label_style), Paragraph(_formato_versao_pdf(custodia.versao), wrap_style)],
-        [Paragraph('Documento anterior (mesmo caso):', label_style), Paragraph(doc_anterior_txt, wrap_style)],
-        [Paragraph('Data e Hora de Geração:', label_style), Paragraph(formatar_datetime(timezone.now(), '%d/%m/%Y %H:%M:%S'), wrap_style)],
+    return [
+        Paragraph("DOCUMENTO DE CADEIA DE CUSTÓDIA", tema.titulo),
+        Paragraph("DOCUMENTOS E ARQUIVOS", tema.titulo),
+        Spacer(1, 0.5*cm),
+        _tabela_campos([
+            ('Número do Documento:', custodia.numero_documento or 'N/A'),
+            ('Versão (procedimento):', _formato_versao_pdf(custodia.versao)),
+            ('Documento anterior (mesmo caso):', doc_anterior_txt),
+            ('Data e Hora de Geração:', formatar_datetime(timezone.now(), '%d/%m/%Y %H:%M:%S')),
+        ], tema),
+        Spacer(1, 0.4*cm),
+        Paragraph(
+            "<i>Em caso de nova coleta ou alteração do conjunto de arquivos no mesmo procedimento, "
+            "uma nova versão é registrada; as versões anteriores permanecem no histórico para rastreabilidade.</i>",
+            tema.normal,
+        ),
+        Spacer(1, 0.8*cm),
     ]
-    info_doc_table = Table(info_doc_data, colWidths=[6*cm, 10*cm])
-    info_doc_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(info_doc_table)
-    story.append(Spacer(1, 0.4*cm))
-    story.append(Paragraph(
-        "<i>Em caso de nova coleta ou alteração do conjunto de arquivos no mesmo procedimento, "
-        "uma nova versão é registrada; as versões anteriores permanecem no histórico para rastreabilidade.</i>",
-        normal_style,
-    ))
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== INFORMAÇÕES DO POLICIAL ==========
-    story.append(Paragraph("INFORMAÇÕES DO POLICIAL RESPONSÁVEL", subtitulo_style))
-    
-    policial_data = [
-        [Paragraph('Nome Completo:', label_style), Paragraph(custodia.policial.nome_completo or 'N/A', wrap_style)],
-        [Paragraph('Matrícula/Registro:', label_style), Paragraph(custodia.policial.matricula or 'N/A', wrap_style)],
-        [Paragraph('Cargo/Função:', label_style), Paragraph(custodia.policial.cargo or 'Não informado', wrap_style)],
-        [Paragraph('Delegacia/Unidade:', label_style), Paragraph(custodia.policial.delegacia or 'Não informado', wrap_style)],
+
+
+def _secao_policial(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    return [
+        Paragraph("INFORMAÇÕES DO POLICIAL RESPONSÁVEL", tema.subtitulo),
+        _tabela_campos([
+            ('Nome Completo:', custodia.policial.nome_completo or 'N/A'),
+            ('Matrícula/Registro:', custodia.policial.matricula or 'N/A'),
+            ('Cargo/Função:', custodia.policial.cargo or 'Não informado'),
+            ('Delegacia/Unidade:', custodia.policial.delegacia or 'Não informado'),
+        ], tema),
+        Spacer(1, 0.8*cm),
     ]
-    policial_table = Table(policial_data, colWidths=[6*cm, 10*cm])
-    policial_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(policial_table)
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== INFORMAÇÕES DO CASO ==========
-    story.append(Paragraph("INFORMAÇÕES DO CASO", subtitulo_style))
-    
-    caso_data = [
-        [Paragraph('Número do Procedimento/Inquérito:', label_style), Paragraph(custodia.caso.numero_procedimento or 'N/A', wrap_style)],
-        [Paragraph('Local do Crime:', label_style), Paragraph(custodia.caso.local_crime or 'N/A', wrap_style)],
-        [Paragraph('Data e Hora da Coleta no Local:', label_style), Paragraph(formatar_datetime(custodia.caso.data_coleta, '%d/%m/%Y %H:%M:%S'), wrap_style)],
+
+
+def _secao_caso(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    return [
+        Paragraph("INFORMAÇÕES DO CASO", tema.subtitulo),
+        _tabela_campos([
+            ('Número do Procedimento/Inquérito:', custodia.caso.numero_procedimento or 'N/A'),
+            ('Local do Crime:', custodia.caso.local_crime or 'N/A'),
+            ('Data e Hora da Coleta no Local:', formatar_datetime(custodia.caso.data_coleta, '%d/%m/%Y %H:%M:%S')),
+        ], tema),
+        Spacer(1, 0.8*cm),
     ]
-    caso_table = Table(caso_data, colWidths=[6*cm, 10*cm])
-    caso_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(caso_table)
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== INFORMAÇÕES TÉCNICAS ==========
-    story.append(Paragraph("INFORMAÇÕES TÉCNICAS", subtitulo_style))
-
-    story.append(Paragraph(
-        "<b>Cadeia de hashes (versão atual do procedimento)</b><br/>"
-        "O hash final desta versão incorpora explicitamente o hash da versão anterior "
-        "(quando existir) e um agregado SHA-256 apenas dos arquivos novos ou com conteúdo alterado. "
-        "Fórmula: <i>SHA-256( hex_anterior + \"|\" + hex_agregado_novos )</i>. "
-        "Na primeira versão (V1.0), o conceito de agregado apenas de novos não se aplica; o hash final reflete todos os arquivos.",
-        normal_style,
-    ))
-    story.append(Spacer(1, 0.35*cm))
 
+
+def _secao_tecnica(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
     if custodia.versao == 1:
         agregado_exibicao = 'Não se aplica'
     else:
         agregado_exibicao = custodia.hash_conteudo_novos or 'N/A'
 
-    cadeia_rows = [
-        [Paragraph('Hash final (cadeia, esta versão):', label_style), Paragraph(custodia.hash_pasta or 'N/A', wrap_style)],
-        [Paragraph('Hash agregado (novos ou alterados nesta versão):', label_style), Paragraph(agregado_exibicao, wrap_style)],
+    cadeia = [
+        ('Hash final (cadeia, esta versão):', custodia.hash_pasta or 'N/A'),
+        ('Hash agregado (novos ou alterados nesta versão):', agregado_exibicao),
     ]
     if custodia.hash_cadeia_anterior:
-        cadeia_rows.insert(
-            1,
-            [Paragraph('Hash final da versão anterior (referência explícita):', label_style), Paragraph(custodia.hash_cadeia_anterior, wrap_style)],
-        )
-    cadeia_table = Table(cadeia_rows, colWidths=[6*cm, 10*cm])
-    cadeia_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(cadeia_table)
-    story.append(Spacer(1, 0.4*cm))
-    
-    # Outras informações técnicas
-    info_tec_data = [
-        [Paragraph('Data e Hora da Geração do Hash:', label_style), Paragraph(formatar_datetime(custodia.data_criacao, '%d/%m/%Y %H:%M:%S'), wrap_style)],
-        [Paragraph('Caminho Completo da Pasta:', label_style), Paragraph(custodia.caminho_pasta or 'N/A', wrap_style)],
-        [Paragraph('Tamanho Total da Pasta:', label_style), Paragraph(formatar_tamanho(custodia.tamanho_total or 0), wrap_style)],
-        [Paragraph('Total de Arquivos:', label_style), Paragraph(str(custodia.total_arquivos), wrap_style)],
+        cadeia.insert(1, ('Hash final da versão anterior (referência explícita):', custodia.hash_cadeia_anterior))
+
+    return [
+        Paragraph("INFORMAÇÕES TÉCNICAS", tema.subtitulo),
+        Paragraph(
+            "<b>Cadeia de hashes (versão atual do procedimento)</b><br/>"
+            "O hash final desta versão incorpora explicitamente o hash da versão anterior "
+            "(quando existir) e um agregado SHA-256 apenas dos arquivos novos ou com conteúdo alterado. "
+            "Fórmula: <i>SHA-256( hex_anterior + \"|\" + hex_agregado_novos )</i>. "
+            "Na primeira versão (V1.0), o conceito de agregado apenas de novos não se aplica; o hash final reflete todos os arquivos.",
+            tema.normal,
+        ),
+        Spacer(1, 0.35*cm),
+        _tabela_campos(cadeia, tema, tema.tabela_cadeia),
+        Spacer(1, 0.4*cm),
+        _tabela_campos([
+            ('Data e Hora da Geração do Hash:', formatar_datetime(custodia.data_criacao, '%d/%m/%Y %H:%M:%S')),
+            ('Caminho Completo da Pasta:', custodia.caminho_pasta or 'N/A'),
+            ('Tamanho Total da Pasta:', formatar_tamanho(custodia.tamanho_total or 0)),
+            ('Total de Arquivos:', str(custodia.total_arquivos)),
+        ], tema),
+        Spacer(1, 0.8*cm),
     ]
-    info_tec_table = Table(info_tec_data, colWidths=[6*cm, 10*cm])
-    info_tec_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(info_tec_table)
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== INVENTÁRIO DE ARQUIVOS ==========
-    story.append(Paragraph("INVENTÁRIO DE ARQUIVOS", subtitulo_style))
-    
-    arquivos = custodia.arquivos.all().order_by('caminho_relativo')
-    
-    if arquivos:
-        # Cabeçalho da tabela
-        arquivos_data = [['Caminho Relativo', 'Nome', 'Novo/alt.', 'Tamanho', 'Data Mod.', 'Hash']]
-        
-        for arquivo in arquivos:
-            nome_seguro = html.escape(arquivo.nome_arquivo or '')
-            hash_seguro = html.escape(arquivo.hash_arquivo or 'N/A')
-            delta_txt = 'Sim' if getattr(arquivo, 'novo_ou_alterado', True) else 'Não'
-            arquivos_data.append([
-                Paragraph(html.escape(arquivo.caminho_relativo or ''), cell_style),
-                Paragraph(nome_seguro, cell_style),
-                delta_txt,
-                formatar_tamanho(arquivo.tamanho_bytes or 0),
-                Paragraph(formatar_datetime(arquivo.data_modificacao, '%d/%m/%Y %H:%M'), cell_style),
-                Paragraph(hash_seguro, cell_style),
-            ])
-        
-        arquivos_table = Table(arquivos_data, colWidths=[3.8*cm, 2.8*cm, 1.2*cm, 1.8*cm, 2.2*cm, 3.2*cm])
-        arquivos_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ]))
-        story.append(arquivos_table)
-        
-        # Exibe todos os arquivos sem limite
+
+
+def _secao_inventario(custodia: Custodia, tema: TemaPdf, anexos: Optional[List[Dict]] = None) -> List[Flowable]:
+    secao = [Paragraph("INVENTÁRIO DE ARQUIVOS", tema.subtitulo)]
+    if anexos:
+        secao += [
+            Paragraph(
+                f"O inventário de {sum(anexo['arquivos'] for anexo in anexos)} arquivos está em "
+                f"{len(anexos)} anexos deste pacote, em ordem de caminho relativo. Cada página dos "
+                "anexos traz o hash final desta versão; o SHA-256 de cada anexo consta abaixo e no "
+                "manifesto.json do pacote.",
+                tema.normal,
+            ),
+            Spacer(1, 0.3*cm),
+            _tabela_anexos(anexos, tema),
+        ]
     else:
-        story.append(Paragraph("Nenhum arquivo registrado.", normal_style))
-    
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== ESTATÍSTICAS ==========
-    story.append(Paragraph("ESTATÍSTICAS", subtitulo_style))
-    
-    # Contar arquivos por tipo
-    tipos_arquivo = {}
-    for arquivo in custodia.arquivos.all():
-        extensao = Path(arquivo.nome_arquivo).suffix.lower() or 'sem extensão'
-        tipos_arquivo[extensao] = tipos_arquivo.get(extensao, 0) + 1
-    
-    stats_data = [
-        [Paragraph('Total de Arquivos:', label_style), Paragraph(str(custodia.total_arquivos), wrap_style)],
-        [Paragraph('Tamanho Total:', label_style), Paragraph(formatar_tamanho(custodia.tamanho_total or 0), wrap_style)],
-    ]
+        # Uma Table por página, com as linhas lidas do banco em lotes
+        inventario = inventario_paginado(custodia)
+        if inventario is not None:
+            secao.append(inventario)
+        else:
+            secao.append(Paragraph("Nenhum arquivo registrado.", tema.normal))
+    secao.append(Spacer(1, 0.8*cm))
+    return secao
+
 
+def _secao_estatisticas(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    # Agregados gravados no processamento (sem nova passada pelo inventário)
+    estatisticas = custodia.estatisticas_inventario()
+
+    campos = [
+        ('Total de Arquivos:', str(custodia.total_arquivos)),
+        ('Tamanho Total:', formatar_tamanho(custodia.tamanho_total or 0)),
+    ]
     if custodia.versao >= 2:
-        qtd_novos = custodia.arquivos.filter(novo_ou_alterado=True).count()
-        stats_data.append([
-            Paragraph('Arquivos novos ou alterados em relação à versão anterior:', label_style),
-            Paragraph(str(qtd_novos), wrap_style),
-        ])
-    
+        campos += [
+            (
+                'Arquivos novos ou alterados em relação à versão anterior:',
+                f"{estatisticas['novos'] + estatisticas['alterados']} "
+                f"({estatisticas['novos']} novos, {estatisticas['alterados']} alterados)",
+            ),
+            ('Arquivos inalterados:', str(estatisticas['inalterados'])),
+            ('Arquivos removidos desde a versão anterior:', str(estatisticas['removidos'])),
+        ]
+
+    qtd_cache = estatisticas['hashes_do_cache']
+    if qtd_cache:
+        campos += [
+            ('Hashes reaproveitados do cache (sem releitura):', str(qtd_cache)),
+            ('Hashes calculados com leitura completa:', str(custodia.total_arquivos - qtd_cache)),
+        ]
+
+    tipos_arquivo = custodia.estatisticas_por_extensao()
     if tipos_arquivo:
-        tipos_str = ', '.join([f"{ext} ({count})" for ext, count in sorted(tipos_arquivo.items())])
-        stats_data.append([Paragraph('Formatos de Arquivo:', label_style), Paragraph(tipos_str, wrap_style)])
-    
-    stats_table = Table(stats_data, colWidths=[6*cm, 10*cm])
-    stats_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#ecf0f1')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
-    story.append(stats_table)
-    story.append(Spacer(1, 0.8*cm))
-    
-    # ========== QR CODE ==========
-    story.append(Spacer(1, 0.5*cm))
-    story.append(Paragraph("VERIFICAÇÃO RÁPIDA", subtitulo_style))
-    story.append(Paragraph("Escaneie o QR Code abaixo para verificar o hash:", normal_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Criar QR Code
-    qr_img_bytes = criar_qrcode_hash(custodia.hash_pasta)
-    qr_img = Image(qr_img_bytes, width=5*cm, height=5*cm)
-    story.append(qr_img)
-    story.append(Spacer(1, 0.5*cm))
+        campos.append(('Formatos de Arquivo:', ', '.join(
+            f"{ext} ({quantidade}; {formatar_tamanho(tamanho)})" for ext, quantidade, tamanho in tipos_arquivo
+        )))
+
+    tipos_mime = custodia.estatisticas_por_tipo_mime()
+    if tipos_mime:
+        campos.append(('Tipos MIME:', ', '.join(
+            f"{tipo} ({quantidade}; {formatar_tamanho(tamanho)})" for tipo, quantidade, tamanho in tipos_mime
+        )))
+
+    return [
+        Paragraph("ESTATÍSTICAS", tema.subtitulo),
+        _tabela_campos(campos, tema),
+        Spacer(1, 0.8*cm),
+    ]
+
+
+def _secao_qrcode(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    return [
+        Spacer(1, 0.5*cm),
+        Paragraph("VERIFICAÇÃO RÁPIDA", tema.subtitulo),
+        Paragraph("Escaneie o QR Code abaixo para verificar o hash:", tema.normal),
+        Spacer(1, 0.3*cm),
+        QrCodeVetorial(custodia.hash_pasta or '', tamanho=5*cm),
+        Spacer(1, 0.5*cm),
+    ]
+
+
+def _secao_observacoes(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    if not custodia.observacoes:
+        return []
+    return [
+        Paragraph("OBSERVAÇÕES", tema.subtitulo),
+        Paragraph(custodia.observacoes, tema.normal),
+        Spacer(1, 0.5*cm),
+    ]
+
+
+def _secao_rodape(custodia: Custodia, tema: TemaPdf) -> List[Flowable]:
+    return [
+        Spacer(1, 1*cm),
+        Paragraph(
+            "<i>Este documento foi gerado automaticamente pelo Sistema de Cadeia de Custódia. "
+            "O hash SHA-256 garante a integridade dos arquivos. Qualquer alteração nos arquivos "
+            "resultará em um hash diferente.</i>",
+            tema.normal,
+        ),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Anexos do inventário
+#
+# Acima de CUSTODIA_PDF_ARQUIVOS_POR_ANEXO arquivos, o inventário sai do
+# documento principal: cada faixa de caminho_relativo vira um PDF de anexo,
+# gerado num pool de processos (o ReportLab é Python puro e ocupa um núcleo
+# por documento). O resultado é um pacote ZIP com o resumo, os anexos e um
+# manifesto; resumo e manifesto listam, de cada anexo, a faixa de caminhos,
+# as folhas do inventário que ele ocupa e o SHA-256 do arquivo.
+# ---------------------------------------------------------------------------
+
+def fatias_inventario(custodia: Custodia, arquivos_por_anexo: Optional[int]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Divide o inventário, em ordem de caminho_relativo, em faixas [inicio, fim)
+    de até arquivos_por_anexo arquivos (None nas pontas abertas). Uma única
+    faixa (None, None) quando o inventário cabe no documento principal.
+    """
+    if not arquivos_por_anexo or custodia.total_arquivos <= arquivos_por_anexo:
+        return [(None, None)]
+    # Uma passada pelos caminhos em ordem; cada N-ésimo abre uma nova faixa
+    caminhos = (
+        custodia.inventario()
+        .order_by('caminho_relativo')
+        .values_list('caminho_relativo', flat=True)
+        .iterator(chunk_size=2000)
+    )
+    limites = list(islice(caminhos, arquivos_por_anexo, None, arquivos_por_anexo))
+    return list(zip([None] + limites, limites + [None]))
+
+
+def _consulta_fatia(custodia: Custodia, inicio: Optional[str], fim: Optional[str]):
+    consulta = custodia.inventario()
+    if inicio is not None:
+        consulta = consulta.filter(caminho_relativo__gte=inicio)
+    if fim is not None:
+        consulta = consulta.filter(caminho_relativo__lt=fim)
+    return consulta
+
+
+def gerar_anexo_inventario(anexo: Tuple[int, Optional[str], Optional[str]], custodia_id: int, total_anexos: int, pasta: str) -> Dict:
+    """
+    Gera em `pasta` o PDF do anexo (numero, inicio, fim) e retorna seus dados
+    para o resumo e o manifesto. Nível de módulo para rodar em pool de processos.
+    """
+    numero, inicio, fim = anexo
+    custodia = Custodia.todas.get(pk=custodia_id)
+    consulta = _consulta_fatia(custodia, inicio, fim)
+    primeiro = consulta.order_by('caminho_relativo').values_list('caminho_relativo', flat=True).first()
+    ultimo = consulta.order_by('-caminho_relativo').values_list('caminho_relativo', flat=True).first()
+
+    nome_arquivo = f"anexo_{numero:02d}.pdf"
+    caminho = Path(pasta) / nome_arquivo
+    doc = SimpleDocTemplate(
+        str(caminho),
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+        title=f"{custodia.numero_documento} - Anexo {numero} de {total_anexos}",
+        subject=f"Hash final: {custodia.hash_pasta}",
+    )
+    tema = tema_pdf()
+    info = _tabela_campos([
+        ('Documento:', f"{custodia.numero_documento} ({_formato_versao_pdf(custodia.versao)})"),
+        ('Hash final (cadeia, esta versão):', custodia.hash_pasta or 'N/A'),
+        ('Primeiro caminho:', primeiro or 'N/A'),
+        ('Último caminho:', ultimo or 'N/A'),
+    ], tema)
+    story = [
+        Paragraph(f"ANEXO {numero} DE {total_anexos} - INVENTÁRIO DE ARQUIVOS", tema.titulo_anexo),
+        info,
+        Spacer(1, 0.5*cm),
+    ]
+    inventario = inventario_paginado(custodia, consulta)
+    story.append(inventario if inventario is not None else Paragraph("Nenhum arquivo registrado.", tema.normal))
+
+    def rodape(canv, doc):
+        # O hash final vai em todas as páginas: uma folha solta ainda identifica a versão
+        canv.saveState()
+        canv.setFont('Helvetica', 6.5)
+        canv.drawString(2*cm, 1.2*cm, f"{custodia.numero_documento} - Anexo {numero}/{total_anexos} - página {doc.page}")
+        canv.drawRightString(A4[0] - 2*cm, 1.2*cm, f"Hash final: {custodia.hash_pasta}")
+        canv.restoreState()
+
+    doc.build(story, onFirstPage=rodape, onLaterPages=rodape)
+    return {
+        'numero': numero,
+        'arquivo': nome_arquivo,
+        'primeiro_caminho': primeiro,
+        'ultimo_caminho': ultimo,
+        'arquivos': inventario.total_linhas if inventario is not None else 0,
+        'paginas': doc.page,
+        'sha256': calcular_hash_arquivo(caminho),
+    }
+
+
+def gerar_anexos_inventario(custodia: Custodia, fatias: List[Tuple[Optional[str], Optional[str]]], pasta: str, max_workers: int = 1) -> List[Dict]:
+    """
+    Gera os anexos das fatias em até max_workers processos e numera as folhas
+    do inventário em sequência ('folhas': [primeira, última]) na ordem dos anexos.
+    """
+    itens = [(numero, inicio, fim) for numero, (inicio, fim) in enumerate(fatias, start=1)]
+    anexos = list(mapear_em_ordem(
+        gerar_anexo_inventario,
+        itens,
+        custodia.pk,
+        len(itens),
+        pasta,
+        max_workers=max_workers,
+        usar_processos=max_workers > 1,
+        # Processos em 'spawn' começam sem o Django nem a conexão do pai; lêem o
+        # inventário já gravado (commitado) no banco
+        contexto_processos=multiprocessing.get_context('spawn'),
+        inicializador=django.setup,
+    ))
+    folha = 1
+    for anexo in anexos:
+        anexo['folhas'] = [folha, folha + anexo['paginas'] - 1]
+        folha += anexo['paginas']
+    return anexos
+
+
+def _tabela_anexos(anexos: List[Dict], tema: TemaPdf) -> Table:
+    linhas = [['Anexo', 'Caminhos', 'Arquivos', 'Folhas', 'SHA-256 do anexo']]
+    for anexo in anexos:
+        linhas.append([
+            Paragraph(f"{anexo['numero']}<br/>{anexo['arquivo']}", tema.celula_anexo),
+            Paragraph(f"{html.escape(anexo['primeiro_caminho'] or '')}<br/>até<br/>{html.escape(anexo['ultimo_caminho'] or '')}", tema.celula_anexo),
+            str(anexo['arquivos']),
+            f"{anexo['folhas'][0]}-{anexo['folhas'][1]}",
+            Paragraph(anexo['sha256'], tema.hash_anexo),
+        ])
+    return Table(linhas, colWidths=[2.4*cm, 5.6*cm, 1.7*cm, 1.8*cm, 5.0*cm], repeatRows=1, style=tema.tabela_anexos)
+
+
+# Workers de PDF desta máquina (processar_pdfs --workers); cada um tem seu
+# próprio pool de anexos, então o padrão divide os núcleos entre eles
+_workers_pdf = 1
+
+
+def definir_workers_pdf(workers: int) -> None:
+    global _workers_pdf
+    _workers_pdf = max(1, workers)
+
+
+def workers_anexos() -> int:
+    """
+    Processos do pool de anexos: CUSTODIA_PDF_WORKERS_ANEXOS ou, se None,
+    os núcleos divididos pelos workers de PDF (até 16)
+    """
+    configurado = getattr(settings, 'CUSTODIA_PDF_WORKERS_ANEXOS', None)
+    if configurado:
+        return configurado
+    return max(1, min(16, (os.cpu_count() or 1) // _workers_pdf))
+
+
+def _gerar_pacote_com_anexos(custodia: Custodia, fatias: List[Tuple[Optional[str], Optional[str]]], caminho_pacote: Path) -> None:
+    max_workers = min(len(fatias), workers_anexos())
+    with tempfile.TemporaryDirectory(dir=settings.PDFS_DIR) as pasta:
+        anexos = gerar_anexos_inventario(custodia, fatias, pasta, max_workers)
+        caminho_resumo = Path(pasta) / 'resumo.pdf'
+        _construir_pdf(custodia, caminho_resumo, anexos)
+        manifesto = {
+            'numero_documento': custodia.numero_documento,
+            'versao': custodia.versao,
+            'hash_pasta': custodia.hash_pasta,
+            'gerado_em': timezone.now().isoformat(),
+            'resumo': {'arquivo': caminho_resumo.name, 'sha256': calcular_hash_arquivo(caminho_resumo)},
+            'anexos': anexos,
+        }
+        # PDFs já vêm comprimidos: o ZIP só agrupa
+        with zipfile.ZipFile(caminho_pacote, 'w', compression=zipfile.ZIP_STORED) as pacote:
+            pacote.write(caminho_resumo, caminho_resumo.name)
+            for anexo in anexos:
+                pacote.write(Path(pasta) / anexo['arquivo'], anexo['arquivo'])
+            pacote.writestr('manifesto.json', json.dumps(manifesto, ensure_ascii=False, indent=2))
+
+
+def gerar_pdf_custodia(custodia: Custodia) -> str:
+    """
+    Gera o PDF completo da cadeia de custódia
     
-    # ========== OBSERVAÇÕES ==========
-    if custodia.observacoes:
-        story.append(Paragraph("OBSERVAÇÕES", subtitulo_style))
-        story.append(Paragraph(custodia.observacoes, normal_style))
-        story.append(Spacer(1, 0.5*cm))
+    Retorna o caminho do arquivo gerado: o PDF ou, com o inventário acima de
+    CUSTODIA_PDF_ARQUIVOS_POR_ANEXO arquivos, o pacote ZIP com resumo e anexos
+    """
+    # Criar nome do arquivo
+    nome_base = f"custodia_{custodia.numero_documento}_{timezone.now().strftime('%Y%m%d_%H%M%S')}"
     
-    # ========== RODAPÉ ==========
-    story.append(Spacer(1, 1*cm))
-    story.append(Paragraph(
-        "<i>Este documento foi gerado automaticamente pelo Sistema de Cadeia de Custódia. "
-        "O hash SHA-256 garante a integridade dos arquivos. Qualquer alteração nos arquivos "
-        "resultará em um hash diferente.</i>",
-        normal_style
-    ))
+    # Garantir que a pasta existe
+    settings.PDFS_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Construir PDF
-    doc.build(story)
+    fatias = fatias_inventario(custodia, getattr(settings, 'CUSTODIA_PDF_ARQUIVOS_POR_ANEXO', None))
+    if len(fatias) > 1:
+        caminho_pacote = Path(settings.PDFS_DIR) / f"{nome_base}.zip"
+        _gerar_pacote_com_anexos(custodia, fatias, caminho_pacote)
+        return str(caminho_pacote)
     
+    caminho_pdf = Path(settings.PDFS_DIR) / f"{nome_base}.pdf"
+    _construir_pdf(custodia, caminho_pdf)
     return str(caminho_pdf)
+
+
+def _construir_pdf(custodia: Custodia, caminho_pdf: Path, anexos: Optional[List[Dict]] = None) -> None:
+    """Monta o documento principal; com `anexos`, o inventário é a lista dos anexos"""
+    tema = tema_pdf()
+    doc = SimpleDocTemplate(
+        str(caminho_pdf),
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    story = [
+        *_secao_cabecalho(custodia, tema),
+        *_secao_policial(custodia, tema),
+        *_secao_caso(custodia, tema),
+        *_secao_tecnica(custodia, tema),
+        *_secao_inventario(custodia, tema, anexos),
+        *_secao_estatisticas(custodia, tema),
+        *_secao_qrcode(custodia, tema),
+        *_secao_observacoes(custodia, tema),
+        *_secao_rodape(custodia, tema),
+    ]
+    doc.build(story)
@@ -0,0 +1,344 @@
+"""
+Fila de tarefas de custódia no próprio banco de dados (sem broker externo).
+
+A view apenas enfileira; o cálculo de hashes e a gravação da versão rodam em
+workers iniciados com `python manage.py processar_tarefas`. O PDF é uma etapa
+separada, com fila própria (Custodia.estado_pdf) e workers iniciados com
+`python manage.py processar_pdfs`: a entrada termina sem esperar o PDF.
+
+- Vários workers podem rodar ao mesmo tempo: a reserva de uma tarefa é um
+  UPDATE condicional (só um worker consegue mudar o estado daquela linha).
+- Tarefas sobrevivem a reinícios: enquanto executa, o worker atualiza
+  `ultimo_sinal`; uma tarefa em execução sem sinal há mais de
+  CUSTODIA_TAREFA_LEASE_SEGUNDOS volta a ser elegível para outro worker.
+- PDFs com falha voltam à fila sozinhos, com espera crescente entre as
+  tentativas (CUSTODIA_PDF_ESPERA_TENTATIVA_SEGUNDOS), até
+  CUSTODIA_PDF_MAX_TENTATIVAS.
+- A verificação de integridade pela web (releitura da pasta) também é uma
+  tarefa da fila (TIPO_VERIFICACAO); o relatório fica em TarefaCustodia.resultado.
+"""
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils import timezone
+
+from .models import Custodia, TarefaCustodia
+from .utils import ProgressoHash
+from .verificacao import MODO_COMPLETO, verificar_custodia
+
+
+def _lease() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'CUSTODIA_TAREFA_LEASE_SEGUNDOS', 300))
+
+
+def _intervalo_sinal() -> float:
+    return max(1.0, _lease().total_seconds() / 5)
+
+
+def identificador_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def enfileirar_custodia(dados: QueryDict) -> TarefaCustodia:
+    """
+    Cria uma tarefa pendente com os dados (brutos) do CustodiaForm.
+    Campos de valor único são gravados como texto; os de múltipla escolha, como lista.
+    """
+    serializados = {}
+    for campo, valores in dados.lists():
+        if campo == 'csrfmiddlewaretoken':
+            continue
+        serializados[campo] = valores[0] if len(valores) == 1 else valores
+    return TarefaCustodia.objects.create(dados=serializados)
+
+
+def enfileirar_verificacao(custodia: Custodia, modo: str) -> TarefaCustodia:
+    """Cria uma tarefa pendente de verificação de integridade da custódia."""
+    return TarefaCustodia.objects.create(
+        tipo=TarefaCustodia.TIPO_VERIFICACAO,
+        dados={'modo': modo},
+        custodia=custodia,
+    )
+
+
+def _dados_formulario(dados: dict) -> QueryDict:
+    """Reconstrói o QueryDict do formulário a partir de TarefaCustodia.dados."""
+    query = QueryDict(mutable=True)
+    for campo, valor in dados.items():
+        query.setlist(campo, valor if isinstance(valor, list) else [valor])
+    return query
+
+
+def _filtro_disponiveis(agora):
+    return Q(estado=TarefaCustodia.ESTADO_PENDENTE) | Q(
+        estado=TarefaCustodia.ESTADO_EM_EXECUCAO,
+        ultimo_sinal__lt=agora - _lease(),
+    )
+
+
+def reservar_proxima_tarefa(worker: Optional[str] = None) -> Optional[TarefaCustodia]:
+    """
+    Reserva a tarefa disponível mais antiga para este worker.
+
+    A reserva é um UPDATE condicionado ao estado lido: se outro worker reservou
+    a mesma linha antes, o UPDATE não altera nada e tenta-se a próxima.
+    """
+    worker = worker or identificador_worker()
+    while True:
+        agora = timezone.now()
+        candidata = (
+            TarefaCustodia.objects.filter(_filtro_disponiveis(agora))
+            .order_by('data_criacao', 'id')
+            .values('id', 'estado', 'ultimo_sinal', 'tentativas')
+            .first()
+        )
+        if candidata is None:
+            return None
+        reservadas = TarefaCustodia.objects.filter(
+            pk=candidata['id'],
+            estado=candidata['estado'],
+            ultimo_sinal=candidata['ultimo_sinal'],
+        ).update(
+            estado=TarefaCustodia.ESTADO_EM_EXECUCAO,
+            worker=worker,
+            tentativas=candidata['tentativas'] + 1,
+            data_inicio=agora,
+            ultimo_sinal=agora,
+        )
+        if reservadas:
+            return TarefaCustodia.objects.get(pk=candidata['id'])
+
+
+class _SinalVida(threading.Thread):
+    """Atualiza o campo de sinal das linhas da consulta enquanto a tarefa executa."""
+
+    def __init__(self, consulta, campo: str = 'ultimo_sinal'):
+        super().__init__(daemon=True)
+        self.consulta = consulta
+        self.campo = campo
+        self.parar = threading.Event()
+
+    def run(self):
+        try:
+            while not self.parar.wait(_intervalo_sinal()):
+                try:
+                    self.consulta.update(**{self.campo: timezone.now()})
+                except Exception:
+                    # Banco ocupado (ex.: SQLite em escrita): tenta no próximo ciclo
+                    pass
+        finally:
+            connection.close()
+
+
+def _finalizar(tarefa: TarefaCustodia, estado: str, mensagem: str = '') -> None:
+    tarefa.estado = estado
+    tarefa.mensagem = mensagem
+    tarefa.data_conclusao = timezone.now()
+    TarefaCustodia.objects.filter(pk=tarefa.pk).update(
+        estado=estado,
+        mensagem=mensagem,
+        data_conclusao=tarefa.data_conclusao,
+    )
+
+
+def _publicador_progresso(tarefa_id: int):
+    def publicar(instantaneo: dict) -> None:
+        try:
+            TarefaCustodia.objects.filter(pk=tarefa_id).update(progresso=instantaneo)
+        except Exception:
+            # Progresso é informativo: não interrompe o cálculo se o banco estiver ocupado
+            pass
+    return publicar
+
+
+def _progresso_tarefa(tarefa: TarefaCustodia) -> ProgressoHash:
+    return ProgressoHash(
+        ao_atualizar=_publicador_progresso(tarefa.pk),
+        intervalo=getattr(settings, 'CUSTODIA_PROGRESSO_INTERVALO_SEGUNDOS', 1.0),
+    )
+
+
+def _executar_verificacao(tarefa: TarefaCustodia) -> None:
+    """Relê a pasta da custódia e grava o relatório na tarefa."""
+    if tarefa.custodia is None:
+        _finalizar(tarefa, TarefaCustodia.ESTADO_ERRO, 'A custódia verificada não existe mais.')
+        return
+    try:
+        resultado = verificar_custodia(
+            tarefa.custodia,
+            modo=tarefa.dados.get('modo', MODO_COMPLETO),
+            progresso=_progresso_tarefa(tarefa),
+        )
+    except ValueError as e:
+        # Pasta inexistente ou modo inválido: outra tentativa não mudaria nada
+        _finalizar(tarefa, TarefaCustodia.ESTADO_ERRO, str(e))
+        return
+    tarefa.resultado = resultado.como_dict()
+    TarefaCustodia.objects.filter(pk=tarefa.pk).update(resultado=tarefa.resultado)
+    _finalizar(tarefa, TarefaCustodia.ESTADO_CONCLUIDA)
+
+
+def executar_tarefa(tarefa: TarefaCustodia) -> TarefaCustodia:
+    """
+    Processa uma tarefa já reservada: grava a versão da custódia (o PDF fica na
+    fila de PDFs e não atrasa a conclusão) ou, nas tarefas de verificação,
+    confere a pasta contra o inventário gravado.
+    """
+    from .forms import CustodiaForm
+
+    max_tentativas = getattr(settings, 'CUSTODIA_TAREFA_MAX_TENTATIVAS', 3)
+    sinal = _SinalVida(
+        TarefaCustodia.objects.filter(pk=tarefa.pk, estado=TarefaCustodia.ESTADO_EM_EXECUCAO)
+    )
+    sinal.start()
+    try:
+        if tarefa.tipo == TarefaCustodia.TIPO_VERIFICACAO:
+            _executar_verificacao(tarefa)
+            return tarefa
+        custodia = tarefa.custodia
+        if custodia is None:
+            form = CustodiaForm(_dados_formulario(tarefa.dados))
+            if not form.is_valid():
+                erros = [f"{campo}: {', '.join(msgs)}" for campo, msgs in form.errors.items()]
+                _finalizar(tarefa, TarefaCustodia.ESTADO_ERRO, '\n'.join(erros))
+                return tarefa
+            # A custódia é vinculada à tarefa na mesma transação em que é gravada:
+            # se o worker cair depois disso, a nova tentativa não cria outra versão
+            custodia = form.save(tarefa=tarefa, progresso=_progresso_tarefa(tarefa))
+
+        tarefa.custodia = custodia
+        _finalizar(tarefa, TarefaCustodia.ESTADO_CONCLUIDA)
+    except ValidationError as e:
+        _finalizar(tarefa, TarefaCustodia.ESTADO_ERRO, '\n'.join(e.messages))
+    except Exception as e:
+        if tarefa.tentativas < max_tentativas:
+            # Devolve para a fila; outro worker (ou este) tenta novamente
+            TarefaCustodia.objects.filter(pk=tarefa.pk).update(
+                estado=TarefaCustodia.ESTADO_PENDENTE,
+                mensagem=f'Tentativa {tarefa.tentativas} falhou: {str(e)}',
+            )
+            tarefa.estado = TarefaCustodia.ESTADO_PENDENTE
+        else:
+            _finalizar(tarefa, TarefaCustodia.ESTADO_ERRO, f'Erro ao processar custódia: {str(e)}')
+    finally:
+        sinal.parar.set()
+        sinal.join()
+    return tarefa
+
+
+def processar_proxima_tarefa(worker: Optional[str] = None) -> Optional[TarefaCustodia]:
+    """Reserva e executa uma tarefa; retorna None se a fila estiver vazia."""
+    close_old_connections()
+    tarefa = reservar_proxima_tarefa(worker)
+    if tarefa is None:
+        return None
+    return executar_tarefa(tarefa)
+
+
+def _filtro_pdfs_disponiveis(agora):
+    return Q(
+        Q(proxima_tentativa_pdf__isnull=True) | Q(proxima_tentativa_pdf__lte=agora),
+        estado_pdf=Custodia.PDF_PENDENTE,
+    ) | Q(
+        estado_pdf=Custodia.PDF_GERANDO,
+        ultimo_sinal_pdf__lt=agora - _lease(),
+    )
+
+
+def reservar_proximo_pdf() -> Optional[Custodia]:
+    """
+    Reserva o PDF disponível mais antigo (pendente, ou em geração sem sinal além
+    do lease), com o mesmo UPDATE condicional de reservar_proxima_tarefa.
+    """
+    while True:
+        agora = timezone.now()
+        candidata = (
+            Custodia.objects.filter(_filtro_pdfs_disponiveis(agora))
+            .order_by('data_criacao', 'id')
+            .values('id', 'estado_pdf', 'ultimo_sinal_pdf', 'tentativas_pdf')
+            .first()
+        )
+        if candidata is None:
+            return None
+        reservadas = Custodia.objects.filter(
+            pk=candidata['id'],
+            estado_pdf=candidata['estado_pdf'],
+            ultimo_sinal_pdf=candidata['ultimo_sinal_pdf'],
+        ).update(
+            estado_pdf=Custodia.PDF_GERANDO,
+            tentativas_pdf=candidata['tentativas_pdf'] + 1,
+            ultimo_sinal_pdf=agora,
+        )
+        if reservadas:
+            return Custodia.objects.select_related('policial', 'caso', 'custodia_anterior').get(
+                pk=candidata['id']
+            )
+
+
+def _espera_nova_tentativa_pdf(tentativas: int) -> timedelta:
+    base = getattr(settings, 'CUSTODIA_PDF_ESPERA_TENTATIVA_SEGUNDOS', 30)
+    return timedelta(seconds=base * 2 ** max(0, tentativas - 1))
+
+
+def gerar_pdf_reservado(custodia: Custodia) -> Custodia:
+    """
+    Gera o PDF de uma custódia já reservada. Uma falha devolve o PDF à fila com
+    espera crescente; depois de CUSTODIA_PDF_MAX_TENTATIVAS fica em erro.
+    """
+    from .pdf_generator import gerar_pdf_custodia
+
+    max_tentativas = getattr(settings, 'CUSTODIA_PDF_MAX_TENTATIVAS', 5)
+    em_geracao = Custodia.objects.filter(pk=custodia.pk, estado_pdf=Custodia.PDF_GERANDO)
+    sinal = _SinalVida(em_geracao, campo='ultimo_sinal_pdf')
+    sinal.start()
+    try:
+        custodia.caminho_pdf = gerar_pdf_custodia(custodia)
+        custodia.estado_pdf = Custodia.PDF_GERADO
+        custodia.mensagem_pdf = ''
+        custodia.proxima_tentativa_pdf = None
+    except Exception as e:
+        custodia.mensagem_pdf = f'Tentativa {custodia.tentativas_pdf} falhou: {str(e)}'
+        if custodia.tentativas_pdf < max_tentativas:
+            custodia.estado_pdf = Custodia.PDF_PENDENTE
+            custodia.proxima_tentativa_pdf = timezone.now() + _espera_nova_tentativa_pdf(custodia.tentativas_pdf)
+        else:
+            custodia.estado_pdf = Custodia.PDF_ERRO
+    finally:
+        sinal.parar.set()
+        sinal.join()
+    # Só grava se a reserva ainda é deste worker (não foi retomada por outro após o lease)
+    em_geracao.update(
+        estado_pdf=custodia.estado_pdf,
+        caminho_pdf=custodia.caminho_pdf,
+        mensagem_pdf=custodia.mensagem_pdf,
+        proxima_tentativa_pdf=custodia.proxima_tentativa_pdf,
+    )
+    return custodia
+
+
+def processar_proximo_pdf() -> Optional[Custodia]:
+    """Reserva e gera um PDF; retorna None se a fila de PDFs estiver vazia."""
+    close_old_connections()
+    custodia = reservar_proximo_pdf()
+    if custodia is None:
+        return None
+    return gerar_pdf_reservado(custodia)
+
+
+def reenfileirar_pdf(custodia: Custodia) -> None:
+    """Devolve o PDF da custódia à fila (ex.: arquivo apagado do disco ou erro definitivo)."""
+    Custodia.objects.filter(pk=custodia.pk).exclude(estado_pdf=Custodia.PDF_GERANDO).update(
+        estado_pdf=Custodia.PDF_PENDENTE,
+        tentativas_pdf=0,
+        proxima_tentativa_pdf=None,
+        mensagem_pdf='',
+    )
+    custodia.refresh_from_db(fields=['estado_pdf', 'tentativas_pdf', 'proxima_tentativa_pdf', 'mensagem_pdf'])
@@ -1,12 +1,42 @@
 """Testes de versionamento de custódia por caso."""
+import hashlib
+import json
+import os
 import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
 from pathlib import Path
+from unittest.mock import patch
 
-from django.test import Client, TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
-from .models import Custodia
-from .utils import calcular_hash_cadeia
+from .forms import CustodiaForm, persistir_inventario
+from .models import Arquivo, Caso, Custodia, IndiceHash, Policial, TarefaCustodia
+from .tarefas import processar_proxima_tarefa, processar_proximo_pdf, reservar_proxima_tarefa
+from .verificacao import verificar_custodia
+from .views import ARQUIVOS_POR_RESULTADO_BUSCA, _buscar_por_hash_no_banco
+from .utils import (
+    AgregadorHash,
+    BACKENDS_LEITURA,
+    amostrar_chunks,
+    calcular_arvore_hash_arquivo,
+    calcular_digests_arquivo,
+    calcular_hash_arquivo,
+    calcular_hash_cadeia,
+    calcular_hash_pasta,
+    coletar_info_arquivo,
+    combinar_hashes_lista_arquivos,
+    gerar_manifesto_pasta,
+    percorrer_arquivos,
+    verificar_chunks_arquivo,
+    validar_pasta_arquivos,
+)
 
 
 class CustodiaVersioningTests(TestCase):
@@ -18,8 +48,14 @@ class CustodiaVersioningTests(TestCase):
         self.addCleanup(self.tmp.cleanup)
         base = Path(self.tmp.name)
         (base / "arquivo1.txt").write_bytes(b"conteudo-a")
+        # PDFs gerados nos testes vão para uma pasta temporária, não para settings.PDFS_DIR
+        self.pdfs = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pdfs.cleanup)
+        pasta_pdfs = override_settings(PDFS_DIR=Path(self.pdfs.name))
+        pasta_pdfs.enable()
+        self.addCleanup(pasta_pdfs.disable)
 
-    def _post_custodia(self, procedimento="INQ-VERS-001"):
+    def _post_custodia(self, procedimento="INQ-VERS-001", **extra):
         url = reverse("custodia:index")
         data = {
             "nome_policial": "Fulano da Silva",
@@ -32,7 +68,12 @@ class CustodiaVersioningTests(TestCase):
             "caminho_pasta": str(Path(self.tmp.name)),
             "observacoes": "",
         }
-        return self.client.post(url, data)
+        data.update(extra)
+        response = self.client.post(url, data)
+        # O processamento roda no worker da fila; aqui executa em linha
+        while processar_proxima_tarefa("teste") is not None:
+            pass
+        return response
 
     def test_primeira_versao_ativa(self):
         response = self._post_custodia()
@@ -68,19 +109,754 @@ class CustodiaVersioningTests(TestCase):
             v2.hash_pasta,
             calcular_hash_cadeia(v1.hash_pasta, v2.hash_conteudo_novos),
         )
-        arq_v2 = {a.caminho_relativo: a.novo_ou_alterado for a in v2.arquivos.all()}
+        arq_v2 = {a.caminho_relativo: a.novo_nesta_versao for a in v2.inventario()}
         self.assertFalse(arq_v2["arquivo1.txt"])
         self.assertTrue(arq_v2["arquivo2.txt"])
 
+    def _inventario(self, custodia):
+        return [
+            (a.caminho_relativo, a.hash_arquivo, a.tamanho_bytes, a.novo_nesta_versao)
+            for a in custodia.inventario().order_by("caminho_relativo")
+        ]
+
+    @override_settings(CUSTODIA_INVENTARIO_COMPLETO_A_CADA=3)
+    def test_inventario_delta_materializa_versao_completa(self):
+        base = Path(self.tmp.name)
+        for i in range(5):
+            (base / f"doc{i}.txt").write_bytes(f"doc-{i}".encode())
+        self._post_custodia("INQ-DELTA")
+
+        (base / "doc1.txt").write_bytes(b"doc-1-alterado")
+        (base / "doc2.txt").unlink()
+        (base / "doc9.txt").write_bytes(b"doc-9")
+        self._post_custodia("INQ-DELTA")
+        (base / "doc3.txt").write_bytes(b"doc-3-alterado")
+        self._post_custodia("INQ-DELTA")
+        (base / "doc4.txt").unlink()
+        (base / "doc2.txt").write_bytes(b"doc-2-de-volta")
+        self._post_custodia("INQ-DELTA")
+
+        v1, v2, v3, v4 = Custodia.objects.filter(
+            caso__numero_procedimento="INQ-DELTA"
+        ).order_by("versao")
+        self.assertEqual([v.inventario_delta for v in (v1, v2, v3, v4)], [False, True, True, False])
+        # v2 grava só alterado, novo e remoção
+        self.assertEqual(
+            sorted((a.caminho_relativo, a.removido) for a in v2.arquivos.all()),
+            [("doc1.txt", False), ("doc2.txt", True), ("doc9.txt", False)],
+        )
+        self.assertEqual(v3.ids_cadeia_inventario(), [v3.id, v2.id, v1.id])
+
+        def h(conteudo):
+            return hashlib.sha256(conteudo).hexdigest()
+
+        self.assertEqual(
+            self._inventario(v3),
+            [
+                ("arquivo1.txt", h(b"conteudo-a"), 10, False),
+                ("doc0.txt", h(b"doc-0"), 5, False),
+                ("doc1.txt", h(b"doc-1-alterado"), 14, False),
+                ("doc3.txt", h(b"doc-3-alterado"), 14, True),
+                ("doc4.txt", h(b"doc-4"), 5, False),
+                ("doc9.txt", h(b"doc-9"), 5, False),
+            ],
+        )
+        self.assertEqual(v3.inventario().count(), v3.total_arquivos)
+        self.assertEqual(
+            [rel for rel, *_ in self._inventario(v4)],
+            ["arquivo1.txt", "doc0.txt", "doc1.txt", "doc2.txt", "doc3.txt", "doc9.txt"],
+        )
+        self.assertEqual(v4.arquivos.count(), 6)
+        self.assertEqual(
+            [rel for rel, _, _, novo in self._inventario(v4) if novo], ["doc2.txt"]
+        )
+
+    @override_settings(CUSTODIA_INVENTARIO_COMPLETO_A_CADA=3)
+    def test_busca_por_hash_encontra_arquivo_herdado_em_delta(self):
+        base = Path(self.tmp.name)
+        (base / "doc.txt").write_bytes(b"doc-v1")
+        self._post_custodia("INQ-HERANCA")
+        (base / "doc.txt").write_bytes(b"doc-v2")
+        self._post_custodia("INQ-HERANCA")
+        (base / "novo.txt").write_bytes(b"novo")
+        self._post_custodia("INQ-HERANCA")
+        (base / "novo.txt").unlink()
+        (base / "doc.txt").write_bytes(b"doc-v4")
+        self._post_custodia("INQ-HERANCA")
+        v1, v2, v3, v4 = Custodia.objects.filter(
+            caso__numero_procedimento="INQ-HERANCA"
+        ).order_by("versao")
+        # v2 e v3 em delta não gravam arquivo1.txt; v4 volta a ter inventário completo
+        self.assertEqual([v.inventario_delta for v in (v1, v2, v3, v4)], [False, True, True, False])
+        self.assertFalse(v2.arquivos.filter(caminho_relativo="arquivo1.txt").exists())
+
+        def versoes(conteudo):
+            pagina = _buscar_por_hash_no_banco(hashlib.sha256(conteudo).hexdigest())
+            return sorted(r["custodia"].versao for r in pagina.object_list), pagina
+
+        encontradas, pagina = versoes(b"conteudo-a")
+        self.assertEqual(encontradas, [1, 2, 3, 4])
+        for r in pagina.object_list:
+            self.assertEqual(r["motivos"], ["Hash do arquivo no inventário: arquivo1.txt"])
+        # Herdado até a alteração (v2) e, para o novo, até a remoção (v4)
+        self.assertEqual(versoes(b"doc-v1")[0], [1])
+        self.assertEqual(versoes(b"doc-v2")[0], [2, 3])
+        self.assertEqual(versoes(b"novo")[0], [3])
+
+    def test_indice_de_hash_vale_para_arquivos_herdados_em_delta(self):
+        (Path(self.tmp.name) / "doc.txt").write_bytes(b"doc-v1")
+        self._post_custodia("INQ-INDICE")
+        (Path(self.tmp.name) / "doc.txt").write_bytes(b"doc-v2")
+        self._post_custodia("INQ-INDICE")
+        v1, v2 = Custodia.objects.filter(caso__numero_procedimento="INQ-INDICE").order_by("versao")
+        self.assertTrue(v2.inventario_delta)
+
+        def versoes(conteudo):
+            entradas = IndiceHash.objects.com_prefixo(hashlib.sha256(conteudo).hexdigest())
+            return sorted(entradas.de_arquivos_por_versao().values_list("custodia_visivel_id", flat=True))
+
+        # arquivo1.txt só tem registro na v1, mas faz parte do inventário das duas
+        self.assertEqual(versoes(b"conteudo-a"), [v1.id, v2.id])
+        self.assertEqual(versoes(b"doc-v1"), [v1.id])
+        self.assertEqual(versoes(b"doc-v2"), [v2.id])
+
+    @override_settings(CUSTODIA_INVENTARIO_COMPLETO_A_CADA=10)
+    def test_indice_de_hash_comum_em_cadeia_longa(self):
+        base = Path(self.tmp.name)
+        for i in range(3):
+            (base / f"copia{i}.txt").write_bytes(b"comum")
+        for versao in range(1, 26):
+            (base / "varia.txt").write_bytes(f"varia-{versao}".encode())
+            if versao == 12:
+                (base / "copia2.txt").write_bytes(b"copia-alterada")
+            self._post_custodia("INQ-LONGA")
+        versoes = list(Custodia.objects.filter(caso__numero_procedimento="INQ-LONGA").order_by("versao"))
+        self.assertEqual(len(versoes), 25)
+        h_comum = hashlib.sha256(b"comum").hexdigest()
+
+        with CaptureQueriesContext(connection) as consultas:
+            linhas = list(
+                IndiceHash.objects.com_prefixo(h_comum)
+                .de_arquivos_por_versao()
+                .values_list("custodia_visivel_id", "arquivo__caminho_relativo")
+            )
+        # Uma consulta só com junções; versao_limite vem gravado, não de subconsultas
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(consultas[0]["sql"].upper().count("SELECT"), 1)
+        # Uma linha por versão e arquivo que o contém, igual ao inventário de cada versão
+        esperadas = sorted(
+            (v.id, rel)
+            for v in versoes
+            for rel in v.inventario().filter(hash_arquivo=h_comum).values_list("caminho_relativo", flat=True)
+        )
+        self.assertEqual(sorted(linhas), esperadas)
+        self.assertEqual(len(linhas), 3 * 11 + 2 * 14)
+
+    @override_settings(CUSTODIA_INVENTARIO_POR_PAGINA=2)
+    def test_inventario_paginado_em_json(self):
+        base = Path(self.tmp.name)
+        for i in range(4):
+            (base / f"doc{i}.txt").write_bytes(b"d" * (i + 1))
+        (base / "foto.JPG").write_bytes(b"jpg")
+        self._post_custodia("INQ-PAGINAS")
+        (base / "doc2.txt").write_bytes(b"doc-2-alterado")
+        self._post_custodia("INQ-PAGINAS")
+        v2 = Custodia.objects.get(caso__numero_procedimento="INQ-PAGINAS", ativo=True)
+
+        # A página de detalhes não traz o inventário; a tabela busca o JSON
+        r = self.client.get(reverse("custodia:detalhes", args=[v2.id]))
+        self.assertEqual(r.status_code, 200)
+        self.assertNotContains(r, "doc0.txt")
+        self.assertContains(r, reverse("custodia:inventario", args=[v2.id]))
+
+        url = reverse("custodia:inventario", args=[v2.id])
+
+        def todas_as_paginas(**parametros):
+            arquivos, tamanhos = [], []
+            while True:
+                dados = self.client.get(url, parametros).json()
+                arquivos += [a["caminho_relativo"] for a in dados["arquivos"]]
+                tamanhos.append(len(dados["arquivos"]))
+                if not dados["proxima"]:
+                    return arquivos, tamanhos
+                parametros["apos"] = dados["proxima"]
+
+        caminhos, tamanhos = todas_as_paginas()
+        self.assertEqual(
+            caminhos, ["arquivo1.txt", "doc0.txt", "doc1.txt", "doc2.txt", "doc3.txt", "foto.JPG"]
+        )
+        self.assertEqual(tamanhos, [2, 2, 2])
+        self.assertEqual(
+            todas_as_paginas(ordenar="-tamanho")[0],
+            ["doc2.txt", "arquivo1.txt", "doc3.txt", "foto.JPG", "doc1.txt", "doc0.txt"],
+        )
+        self.assertEqual(todas_as_paginas(novo="1")[0], ["doc2.txt"])
+        self.assertEqual(todas_as_paginas(extensao="jpg")[0], ["foto.JPG"])
+        self.assertEqual(todas_as_paginas(caminho="DOC", ordenar="-nome")[0],
+                         ["doc3.txt", "doc2.txt", "doc1.txt", "doc0.txt"])
+        self.assertEqual(self.client.get(url, {"ordenar": "hash"}).status_code, 400)
+
+    def test_estatisticas_gravadas_no_processamento(self):
+        base = Path(self.tmp.name)
+        (base / "laudo.PDF").write_bytes(b"%PDF" * 10)
+        (base / "foto.jpg").write_bytes(b"jpg")
+        (base / "LEIAME").write_bytes(b"sem extensao")
+        self._post_custodia("INQ-ESTAT")
+        v1 = Custodia.objects.get(caso__numero_procedimento="INQ-ESTAT")
+        self.assertEqual(v1.estatisticas["por_extensao"], {
+            ".txt": {"arquivos": 1, "bytes": 10},
+            ".pdf": {"arquivos": 1, "bytes": 40},
+            ".jpg": {"arquivos": 1, "bytes": 3},
+            "": {"arquivos": 1, "bytes": 12},
+        })
+        self.assertEqual(v1.estatisticas["por_tipo_mime"]["image/jpeg"], {"arquivos": 1, "bytes": 3})
+        self.assertEqual((v1.estatisticas["novos"], v1.estatisticas["removidos"]), (4, 0))
+        self.assertEqual(v1.estatisticas_por_extensao()[0], ("sem extensão", 1, 12))
+
+        (base / "foto.jpg").write_bytes(b"jpg-alterado")
+        (base / "LEIAME").unlink()
+        (base / "novo.txt").write_bytes(b"novo")
+        self._post_custodia("INQ-ESTAT")
+        v2 = Custodia.objects.get(caso__numero_procedimento="INQ-ESTAT", ativo=True)
+        contagens = {k: v2.estatisticas[k] for k in ("novos", "alterados", "inalterados", "removidos")}
+        self.assertEqual(contagens, {"novos": 1, "alterados": 1, "inalterados": 2, "removidos": 1})
+        self.assertEqual(v2.estatisticas["por_extensao"][".txt"], {"arquivos": 2, "bytes": 14})
+
+        # Detalhes e PDF leem o que foi gravado, sem percorrer o inventário
+        r = self.client.get(reverse("custodia:detalhes", args=[v2.id]))
+        self.assertContains(r, "1 removido(s)")
+        with patch.object(Custodia, "inventario", side_effect=AssertionError("releu o inventário")):
+            v2.estatisticas_inventario()
+
+        # Custódias anteriores ao campo calculam uma vez a partir do inventário
+        gravadas = v2.estatisticas
+        Custodia.objects.filter(pk=v2.pk).update(estatisticas=None)
+        legado = Custodia.objects.get(pk=v2.pk)
+        self.assertEqual(legado.estatisticas_inventario(), gravadas)
+        self.assertEqual(Custodia.objects.get(pk=v2.pk).estatisticas, gravadas)
+
+    def test_linha_do_tempo_confere_elos_em_uma_consulta(self):
+        base = Path(self.tmp.name)
+        self._post_custodia("INQ-TEMPO")
+        for i in range(2):
+            (base / f"novo{i}.txt").write_bytes(f"novo-{i}".encode())
+            self._post_custodia("INQ-TEMPO")
+        caso = Caso.objects.get(numero_procedimento="INQ-TEMPO")
+
+        with self.assertNumQueries(1):
+            versoes = caso.linha_do_tempo()
+        self.assertEqual([v["versao"] for v in versoes], [1, 2, 3])
+        self.assertTrue(all(v["elo_valido"] for v in versoes))
+        self.assertEqual(versoes[2]["delta"], {"novos": 1, "alterados": 0, "inalterados": 2, "removidos": 0})
+
+        url = reverse("custodia:linha_do_tempo", args=[caso.id])
+        dados = self.client.get(url, {"formato": "json"}).json()
+        self.assertTrue(dados["cadeia_integra"])
+        self.assertEqual(dados["versoes"][1]["url_detalhes"], reverse("custodia:detalhes", args=[versoes[1]["id"]]))
+
+        # Hash final adulterado na v2 quebra o elo da v2 e o da v3, que a referencia
+        Custodia.objects.filter(pk=versoes[1]["id"]).update(hash_pasta="f" * 64)
+        dados = self.client.get(url, {"formato": "json"}).json()
+        self.assertFalse(dados["cadeia_integra"])
+        self.assertEqual([v["elo_valido"] for v in dados["versoes"]], [True, False, False])
+        r = self.client.get(url)
+        self.assertContains(r, "Elos inconsistentes")
+
+    @override_settings(CUSTODIA_INVENTARIO_DELTA=False)
+    def test_auditoria_global_das_cadeias(self):
+        base = Path(self.tmp.name)
+        self._post_custodia("INQ-AUDIT")
+        (base / "b.txt").write_bytes(b"b")
+        # "b" < "b.txt" por caminho, mas "b.txt:..." < "b:..." nas entradas agregadas
+        (base / "b").write_bytes(b"b-sem-extensao")
+        (base / "a").mkdir()
+        (base / "a" / "x.txt").write_bytes(b"x")
+        self._post_custodia("INQ-AUDIT")
+        (base / "c.txt").write_bytes(b"c")
+        self._post_custodia("INQ-AUDIT")
+        v1, v2, v3 = Custodia.objects.filter(caso__numero_procedimento="INQ-AUDIT").order_by("versao")
+
+        saida = Path(self.tmp.name) / "auditoria"
+        saida.mkdir()
+        relatorio = saida / "relatorio.jsonl"
+        call_command("auditar_cadeias", relatorio=str(relatorio), stdout=StringIO())
+        linhas = [json.loads(l) for l in relatorio.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([l["custodia_id"] for l in linhas[:-1]], [v1.id, v2.id, v3.id])
+        self.assertTrue(all(l["integra"] for l in linhas[:-1]))
+        self.assertEqual(linhas[-1]["resumo"]["divergentes"], 0)
+
+        # Checkpoint concluído só depois do resumo gravado
+        checkpoint = Path(f"{relatorio}.checkpoint")
+        estado = json.loads(checkpoint.read_text())
+        self.assertTrue(estado["concluida"])
+        self.assertEqual(estado["bytes_relatorio"], relatorio.stat().st_size)
+
+        # Retomada: checkpoint após a v1 refaz só o restante, sem linhas duplicadas
+        primeira = relatorio.read_bytes().split(b"\n")[0] + b"\n"
+        estado.update(ultimo_custodia_id=v1.id, bytes_relatorio=len(primeira), custodias=1, concluida=False)
+        checkpoint.write_text(json.dumps(estado))
+        completo = relatorio.read_text(encoding="utf-8").splitlines()
+        call_command("auditar_cadeias", relatorio=str(relatorio), retomar=True, stdout=StringIO())
+        retomado = relatorio.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(retomado[:-1], completo[:-1])
+
+        # Hash de arquivo herdado adulterado na v2 (inventário completo) e agregado da v3
+        Arquivo.objects.filter(custodia=v2, caminho_relativo="arquivo1.txt").update(hash_arquivo="0" * 64)
+        Custodia.objects.filter(pk=v3.pk).update(hash_conteudo_novos="1" * 64)
+        with self.assertRaises(CommandError):
+            call_command("auditar_cadeias", relatorio=str(relatorio), stdout=StringIO(), stderr=StringIO())
+        linhas = {l.get("custodia_id"): l for l in map(json.loads, relatorio.read_text(encoding="utf-8").splitlines())}
+        self.assertTrue(linhas[v1.id]["integra"])
+        self.assertEqual(linhas[v2.id]["herdados_divergentes"][0]["caminho_relativo"], "arquivo1.txt")
+        # v3: agregado e hash_pasta, e o herdado que agora difere do adulterado na v2
+        self.assertEqual(len(linhas[v3.id]["problemas"]), 3)
+
+    @override_settings(CUSTODIA_INVENTARIO_COMPLETO_A_CADA=3)
+    def test_auditoria_das_cadeias_com_inventario_delta(self):
+        base = Path(self.tmp.name)
+        self._post_custodia("INQ-AUDIT-DELTA")
+        (base / "b.txt").write_bytes(b"b")
+        self._post_custodia("INQ-AUDIT-DELTA")
+        (base / "b.txt").unlink()
+        (base / "c.txt").write_bytes(b"c")
+        self._post_custodia("INQ-AUDIT-DELTA")
+        (base / "arquivo1.txt").write_bytes(b"conteudo-a2")
+        self._post_custodia("INQ-AUDIT-DELTA")
+        versoes = list(Custodia.objects.filter(caso__numero_procedimento="INQ-AUDIT-DELTA").order_by("versao"))
+        self.assertEqual([v.inventario_delta for v in versoes], [False, True, True, False])
+
+        saida = Path(self.tmp.name) / "auditoria"
+        saida.mkdir()
+        relatorio = saida / "relatorio.jsonl"
+        call_command("auditar_cadeias", relatorio=str(relatorio), stdout=StringIO())
+        linhas = [json.loads(l) for l in relatorio.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([l["custodia_id"] for l in linhas[:-1]], [v.id for v in versoes])
+        self.assertTrue(all(l["integra"] for l in linhas[:-1]))
+
+        # Retomada exige o relatório inteiro até o ponto do checkpoint
+        checkpoint = Path(f"{relatorio}.checkpoint")
+        estado = json.loads(checkpoint.read_text())
+        estado.update(ultimo_custodia_id=versoes[0].id, concluida=False)
+        checkpoint.write_text(json.dumps(estado))
+        relatorio.write_bytes(relatorio.read_bytes()[:10])
+        with self.assertRaisesMessage(CommandError, "menor"):
+            call_command("auditar_cadeias", relatorio=str(relatorio), retomar=True, stdout=StringIO())
+        relatorio.unlink()
+        with self.assertRaisesMessage(CommandError, "sem o relatório"):
+            call_command("auditar_cadeias", relatorio=str(relatorio), retomar=True, stdout=StringIO())
+
+        # Registro alterado de uma versão delta adulterado
+        Arquivo.objects.filter(custodia=versoes[2], caminho_relativo="c.txt").update(hash_arquivo="0" * 64)
+        with self.assertRaises(CommandError):
+            call_command("auditar_cadeias", relatorio=str(relatorio), stdout=StringIO(), stderr=StringIO())
+        linhas = {l.get("custodia_id"): l for l in map(json.loads, relatorio.read_text(encoding="utf-8").splitlines())}
+        self.assertEqual([linhas[v.id]["integra"] for v in versoes], [True, True, False, False])
+        # v4 (inventário completo) herda c.txt da v3: difere do registro adulterado
+        self.assertEqual(linhas[versoes[3].id]["herdados_divergentes"][0]["caminho_relativo"], "c.txt")
+
+    def test_modo_cache_reaproveita_hash_de_arquivos_inalterados(self):
+        self._post_custodia("INQ-CACHE")
+        v1 = Custodia.objects.get(caso__numero_procedimento="INQ-CACHE")
+        self.assertFalse(v1.arquivos.filter(hash_do_cache=True).exists())
+
+        (Path(self.tmp.name) / "arquivo2.txt").write_bytes(b"conteudo-b")
+        self._post_custodia("INQ-CACHE", modo_hash="confiar_cache")
+        v2 = Custodia.objects.get(caso__numero_procedimento="INQ-CACHE", versao=2)
+        origem = {a.caminho_relativo: a.hash_do_cache for a in v2.arquivos.all()}
+        self.assertTrue(origem["arquivo1.txt"])
+        self.assertFalse(origem["arquivo2.txt"])
+        # Hash reaproveitado é o mesmo da versão anterior
+        self.assertEqual(
+            v2.arquivos.get(caminho_relativo="arquivo1.txt").hash_arquivo,
+            v1.arquivos.get(caminho_relativo="arquivo1.txt").hash_arquivo,
+        )
+
+    def test_cache_de_hash_mescla_digests_e_arvore_existentes(self):
+        from .cache_hash import CacheHashBanco
+
+        cache = CacheHashBanco()
+        sha256 = hashlib.sha256(b"x").hexdigest()
+        md5 = hashlib.md5(b"x").hexdigest()
+        sha1 = hashlib.sha1(b"x").hexdigest()
+        arvore = {"tamanho_chunk": 1, "raiz": sha256, "chunks": [sha256]}
+        cache.registrar({"k": ("/p/x", {"sha256": sha256, "md5": md5}, arvore)})
+        # Registro posterior com outro algoritmo e sem árvore não apaga o que já havia
+        cache.registrar({"k": ("/p/x", {"sha256": sha256, "sha1": sha1}, None)})
+        self.assertEqual(cache.obter(["k"])["k"], ({"sha256": sha256, "md5": md5, "sha1": sha1}, arvore))
+
+        # Conteúdo diferente para a mesma chave substitui a entrada
+        outro = hashlib.sha256(b"y").hexdigest()
+        cache.registrar({"k": ("/p/x", {"sha256": outro}, None)})
+        self.assertEqual(cache.obter(["k"])["k"], ({"sha256": outro}, None))
+
+    def test_hashes_adicionais_gravados_no_inventario(self):
+        self._post_custodia("INQ-MD5", hashes_adicionais=["md5", "sha512"])
+        arq = Custodia.objects.get(caso__numero_procedimento="INQ-MD5").arquivos.get()
+        self.assertEqual(arq.hashes_adicionais["md5"], hashlib.md5(b"conteudo-a").hexdigest())
+        self.assertEqual(
+            arq.hashes_adicionais["sha512"], hashlib.sha512(b"conteudo-a").hexdigest()
+        )
+        self.assertEqual(arq.hash_arquivo, hashlib.sha256(b"conteudo-a").hexdigest())
+
+        # Cache sem MD5 não serve quando o MD5 é pedido: arquivo é relido
+        (Path(self.tmp.name) / "arquivo2.txt").write_bytes(b"conteudo-b")
+        self._post_custodia("INQ-MD5", modo_hash="confiar_cache", hashes_adicionais=["sha1"])
+        v2 = Custodia.objects.get(caso__numero_procedimento="INQ-MD5", versao=2)
+        arq1 = v2.arquivos.get(caminho_relativo="arquivo1.txt")
+        self.assertFalse(arq1.hash_do_cache)
+        self.assertEqual(arq1.hashes_adicionais, {"sha1": hashlib.sha1(b"conteudo-a").hexdigest()})
+
+    @override_settings(CUSTODIA_HASH_TAMANHO_CHUNK=4, CUSTODIA_HASH_CHUNK_MINIMO_BYTES=5)
+    def test_modo_chunks_grava_arvore_e_permite_spot_check(self):
+        self._post_custodia("INQ-CHUNK")
+        arq = Custodia.objects.get(caso__numero_procedimento="INQ-CHUNK").arquivos.get()
+        # Hash do arquivo inteiro não muda no modo chunks
+        self.assertEqual(arq.hash_arquivo, hashlib.sha256(b"conteudo-a").hexdigest())
+        self.assertEqual(arq.tamanho_chunk, 4)
+        self.assertEqual(
+            arq.hashes_chunks,
+            [hashlib.sha256(p).hexdigest() for p in (b"cont", b"eudo", b"-a")],
+        )
+        self.assertEqual(arq.verificar_amostra_chunks(2, semente=1)["divergentes"], [])
+
+        # Cache traz a árvore junto: arquivo inalterado não é relido
+        (Path(self.tmp.name) / "arquivo2.txt").write_bytes(b"outro")
+        self._post_custodia("INQ-CHUNK", modo_hash="confiar_cache")
+        v2 = Custodia.objects.get(caso__numero_procedimento="INQ-CHUNK", versao=2)
+        arq_v2 = v2.arquivos.get(caminho_relativo="arquivo1.txt")
+        self.assertTrue(arq_v2.hash_do_cache)
+        self.assertEqual(arq_v2.hash_raiz_chunks, arq.hash_raiz_chunks)
+
+        (Path(self.tmp.name) / "arquivo1.txt").write_bytes(b"conteXdo-a")
+        resultado = arq.verificar_amostra_chunks(3)
+        self.assertTrue(resultado["tamanho_confere"])
+        self.assertEqual(resultado["divergentes"], [1])
+
+    def test_verificacao_de_integridade(self):
+        base = Path(self.tmp.name)
+        (base / "sub").mkdir()
+        (base / "sub" / "b.txt").write_bytes(b"conteudo-b")
+        self._post_custodia("INQ-VERIF")
+        custodia = Custodia.objects.get(caso__numero_procedimento="INQ-VERIF")
+
+        resultado = verificar_custodia(custodia, max_workers=2)
+        self.assertTrue(resultado.integro)
+        self.assertTrue(resultado.hash_pasta_confere)
+        self.assertEqual(resultado.hash_pasta_atual, custodia.hash_pasta)
+        self.assertEqual(sorted(resultado.inalterados), ["arquivo1.txt", os.path.join("sub", "b.txt")])
+
+        # Mesmo tamanho e mesma data: só a releitura detecta a alteração
+        st = os.stat(base / "arquivo1.txt")
+        (base / "arquivo1.txt").write_bytes(b"conteudo-X")
+        os.utime(base / "arquivo1.txt", ns=(st.st_atime_ns, st.st_mtime_ns))
+        (base / "sub" / "b.txt").unlink()
+        (base / "novo.txt").write_bytes(b"novo")
+
+        rapido = verificar_custodia(custodia, modo="rapido", amostra=0)
+        self.assertEqual(rapido.inalterados, ["arquivo1.txt"])
+        self.assertEqual(rapido.confirmados_por_metadados, 1)
+        self.assertEqual(rapido.arquivos_rehasheados, 0)
+        self.assertEqual(rapido.ausentes, [os.path.join("sub", "b.txt")])
+        self.assertEqual(rapido.extras, ["novo.txt"])
+        self.assertFalse(rapido.integro)
+
+        self.assertEqual(verificar_custodia(custodia, modo="rapido", amostra=1).modificados, ["arquivo1.txt"])
+        completo = verificar_custodia(custodia)
+        self.assertEqual(completo.modificados, ["arquivo1.txt"])
+        self.assertFalse(completo.hash_pasta_confere)
+
+        # Pela web a releitura é uma tarefa da fila, com o acompanhamento das entradas
+        url_verificar = reverse("custodia:verificar", args=[custodia.id])
+        response = self.client.post(url_verificar, {"modo": "completo", "formato": "json"})
+        self.assertEqual(response.status_code, 202)
+        tarefa = TarefaCustodia.objects.get(id=response.json()["id"])
+        self.assertEqual((tarefa.tipo, tarefa.custodia_id), (TarefaCustodia.TIPO_VERIFICACAO, custodia.id))
+        self.assertEqual(tarefa.estado, TarefaCustodia.ESTADO_PENDENTE)
+        processar_proxima_tarefa("teste")
+        estado = self.client.get(reverse("custodia:tarefa_progresso", args=[tarefa.id])).json()
+        self.assertTrue(estado["progresso"]["concluido"])
+        self.assertEqual(estado["progresso"]["arquivos_processados"], 2)
+        relatorio = estado["resultado"]
+        self.assertFalse(relatorio["integro"])
+        self.assertEqual(relatorio["extras"], ["novo.txt"])
+        self.assertEqual(relatorio["modificados"], ["arquivo1.txt"])
+
+        response = self.client.post(url_verificar, {"modo": "rapido"})
+        tarefa = TarefaCustodia.objects.filter(tipo=TarefaCustodia.TIPO_VERIFICACAO).order_by("-id").first()
+        self.assertRedirects(response, reverse("custodia:tarefa", args=[tarefa.id]), fetch_redirect_response=False)
+        self.assertContains(self.client.get(response.url), "Verificação de Integridade")
+        processar_proxima_tarefa("teste")
+        response = self.client.get(response.url)
+        self.assertRedirects(response, f"{url_verificar}?tarefa={tarefa.id}", fetch_redirect_response=False)
+        self.assertContains(self.client.get(response.url), "Divergências encontradas")
+        self.assertEqual(self.client.post(url_verificar, {"modo": "outro", "formato": "json"}).status_code, 400)
+
+        saida = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verificar_custodia", str(custodia.id), "--json", stdout=saida)
+        self.assertEqual(json.loads(saida.getvalue())["ausentes"], [os.path.join("sub", "b.txt")])
+
+    def test_inventario_gravado_em_lotes(self):
+        self._post_custodia("INQ-LOTE")
+        custodia = Custodia.objects.get(caso__numero_procedimento="INQ-LOTE")
+        base = Path(self.tmp.name)
+        infos = []
+        for i in range(5):
+            arquivo = base / f"lote{i}.txt"
+            arquivo.write_bytes(b"x" * i)
+            info = coletar_info_arquivo(arquivo, base)
+            info["hash"] = calcular_hash_arquivo(arquivo)
+            infos.append(info)
+
+        # 5 linhas em lotes de 2: por lote, um INSERT de Arquivo e um do IndiceHash
+        with self.assertNumQueries(6):
+            total = persistir_inventario(custodia, iter(infos), {"lote1.txt"}, tamanho_lote=2)
+        self.assertEqual(total, 5)
+        gravados = custodia.arquivos.filter(caminho_relativo__startswith="lote")
+        self.assertEqual(gravados.count(), 5)
+        self.assertEqual(
+            list(gravados.filter(novo_ou_alterado=True).values_list("caminho_relativo", flat=True)),
+            ["lote1.txt"],
+        )
+
     def test_reprocessar_sem_arquivos_novos_falha(self):
         self._post_custodia("INQ-NODELTA")
         r2 = self._post_custodia("INQ-NODELTA")
-        self.assertEqual(r2.status_code, 200)
+        self.assertEqual(r2.status_code, 302)
+        tarefa = TarefaCustodia.objects.order_by("-id").first()
+        self.assertEqual(tarefa.estado, TarefaCustodia.ESTADO_ERRO)
+        self.assertIn("Não há arquivos novos", tarefa.mensagem)
+        self.assertEqual(self.client.get(r2.url).status_code, 200)
         self.assertEqual(
             Custodia.objects.filter(caso__numero_procedimento="INQ-NODELTA").count(),
             1,
         )
 
+    def test_post_enfileira_e_status_redireciona_ao_resultado(self):
+        r = self._post_custodia("INQ-FILA")
+        tarefa = TarefaCustodia.objects.get()
+        self.assertRedirects(
+            r,
+            reverse("custodia:tarefa", args=[tarefa.id]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(tarefa.estado, TarefaCustodia.ESTADO_CONCLUIDA)
+        self.assertEqual(tarefa.custodia.caso.numero_procedimento, "INQ-FILA")
+        self.assertRedirects(
+            self.client.get(r.url),
+            reverse("custodia:resultado", args=[tarefa.custodia_id]),
+            fetch_redirect_response=False,
+        )
+
+    def test_progresso_da_tarefa_e_vazao_registrada(self):
+        self._post_custodia("INQ-PROGRESSO")
+        tarefa = TarefaCustodia.objects.get()
+        self.assertEqual(tarefa.progresso["arquivos_processados"], 1)
+        self.assertTrue(tarefa.progresso["concluido"])
+        self.assertEqual(tarefa.progresso["bytes_lidos"], len(b"conteudo-a"))
+
+        r = self.client.get(reverse("custodia:tarefa_progresso", args=[tarefa.id]))
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["finalizada"])
+        self.assertIn("url_resultado", r.json())
+
+        r = self.client.get(reverse("custodia:tarefa_eventos", args=[tarefa.id]))
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        corpo = b"".join(r.streaming_content).decode()
+        self.assertIn('"estado": "concluida"', corpo)
+        self.assertIn("event: fim", corpo)
+        self.assertTrue(corpo.startswith("retry: "))
+
+        self.assertEqual(tarefa.custodia.bytes_hash_lidos, len(b"conteudo-a"))
+        self.assertIsNotNone(tarefa.custodia.vazao_hash_mb_s)
+
+    @override_settings(CUSTODIA_PROGRESSO_INTERVALO_SEGUNDOS=0, CUSTODIA_EVENTOS_DURACAO_MAXIMA_SEGUNDOS=0)
+    def test_eventos_da_tarefa_encerram_apos_duracao_maxima(self):
+        self._post_custodia("INQ-SSE")
+        tarefa = TarefaCustodia.objects.get()
+        TarefaCustodia.objects.filter(id=tarefa.id).update(estado=TarefaCustodia.ESTADO_PENDENTE)
+
+        r = self.client.get(reverse("custodia:tarefa_eventos", args=[tarefa.id]))
+        corpo = b"".join(r.streaming_content).decode()
+        # Tarefa ainda pendente: a conexão fecha sem "fim" e o navegador reconecta
+        self.assertTrue(corpo.startswith("retry: 1000\n\n"))
+        self.assertIn('"estado": "pendente"', corpo)
+        self.assertNotIn("event: fim", corpo)
+
+    def test_pdf_gerado_em_fila_propria_com_novas_tentativas(self):
+        self._post_custodia("INQ-PDF")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-PDF")
+        # A entrada termina sem o PDF: ele fica na fila dos workers de PDF
+        self.assertEqual(c.estado_pdf, Custodia.PDF_PENDENTE)
+        self.assertContains(self.client.get(reverse("custodia:resultado", args=[c.id])), "Gerando o PDF")
+        self.assertTrue(self.client.get(reverse("custodia:estado_pdf", args=[c.id])).json()["em_andamento"])
+
+        with patch("custodia.pdf_generator.gerar_pdf_custodia", side_effect=RuntimeError("sem disco")):
+            processar_proximo_pdf()
+        c.refresh_from_db()
+        self.assertEqual((c.estado_pdf, c.tentativas_pdf), (Custodia.PDF_PENDENTE, 1))
+        self.assertIn("sem disco", c.mensagem_pdf)
+        self.assertGreater(c.proxima_tentativa_pdf, timezone.now())
+        # Aguardando a espera entre tentativas: nada a gerar ainda
+        self.assertIsNone(processar_proximo_pdf())
+
+        Custodia.objects.filter(pk=c.pk).update(proxima_tentativa_pdf=timezone.now())
+        processar_proximo_pdf()
+        c.refresh_from_db()
+        self.assertEqual((c.estado_pdf, c.tentativas_pdf, c.mensagem_pdf), (Custodia.PDF_GERADO, 2, ""))
+        r = self.client.get(reverse("custodia:download_pdf", args=[c.id]))
+        self.assertEqual(r.status_code, 200)
+        r.close()
+
+        # PDF apagado do disco: o download devolve à fila em vez de gerar na requisição
+        Path(c.caminho_pdf).unlink()
+        r = self.client.get(reverse("custodia:download_pdf", args=[c.id]))
+        self.assertRedirects(r, reverse("custodia:resultado", args=[c.id]), fetch_redirect_response=False)
+        c.refresh_from_db()
+        self.assertEqual((c.estado_pdf, c.tentativas_pdf), (Custodia.PDF_PENDENTE, 0))
+
+        with override_settings(CUSTODIA_PDF_MAX_TENTATIVAS=1), patch(
+            "custodia.pdf_generator.gerar_pdf_custodia", side_effect=RuntimeError("falha")
+        ):
+            processar_proximo_pdf()
+        c.refresh_from_db()
+        self.assertEqual(c.estado_pdf, Custodia.PDF_ERRO)
+        self.assertContains(self.client.get(reverse("custodia:resultado", args=[c.id])), "Gerar PDF novamente")
+        self.client.post(reverse("custodia:gerar_pdf", args=[c.id]))
+        c.refresh_from_db()
+        self.assertEqual(c.estado_pdf, Custodia.PDF_PENDENTE)
+
+    def test_inventario_do_pdf_paginado_com_celulas_simples(self):
+        from io import BytesIO
+
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate
+
+        from .pdf_generator import FormatadorInventarioPdf, InventarioPaginado
+
+        agora = timezone.now()
+        caminho_longo = "pasta_" * 60 + "arquivo.bin"
+        registros = [
+            (f"dir/arquivo_{i:04d}.txt", f"arquivo_{i:04d}.txt", i % 2 == 0, 10, agora,
+             "a" * 64, {"md5": "b" * 32}, None, None, None, False)
+            for i in range(300)
+        ] + [(caminho_longo, "arquivo.bin", True, 10, agora, "c" * 64, {}, None, None, None, True)]
+        formatador = FormatadorInventarioPdf()
+        celulas, altura = formatador.celulas(registros[-1])
+        self.assertGreater(len(celulas[0].split("\n")), 1)
+        self.assertEqual(celulas[0].replace("\n", ""), caminho_longo)
+        self.assertIn("(cache)", celulas[-1])
+        self.assertGreater(altura, formatador.celulas(registros[0])[1])
+
+        inventario = InventarioPaginado(formatador.linhas(registros))
+        SimpleDocTemplate(BytesIO(), pagesize=A4).build([inventario])
+        self.assertEqual(inventario.total_linhas, len(registros))
+        self.assertGreater(inventario.paginas, 1)
+
+    def test_pdf_com_tema_compartilhado_e_campos_em_texto_simples(self):
+        from .pdf_generator import gerar_pdf_custodia, tema_pdf
+
+        self._post_custodia("INQ-TEMA")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-TEMA")
+        # Valores vão como texto simples: marcação de Paragraph não quebra a geração
+        c.caminho_pasta = "/evidencias/<caso & 1>/" + "x" * 200
+        caminho = Path(gerar_pdf_custodia(c))
+        self.assertTrue(caminho.read_bytes().startswith(b"%PDF"))
+        self.assertIs(tema_pdf(), tema_pdf())
+
+    def test_qrcode_vetorial_com_matriz_em_cache(self):
+        from .pdf_generator import gerar_pdf_custodia, matriz_qrcode
+
+        hash_pasta = "ab" * 32
+        matriz_qrcode.cache_clear()
+        matriz = matriz_qrcode(hash_pasta)
+        # 64 caracteres com correção L: versão 4 (33 x 33), padrões de posição nos cantos
+        self.assertEqual(len(matriz), 33)
+        self.assertEqual(list(matriz[0][:7]), [1] * 7)
+        self.assertEqual(list(matriz[0][-7:]), [1] * 7)
+        self.assertEqual(list(matriz[-1][:7]), [1] * 7)
+        self.assertEqual(list(matriz[1][1:6]), [0] * 5)
+        self.assertIs(matriz_qrcode(hash_pasta), matriz)
+        self.assertEqual(matriz_qrcode.cache_info().hits, 1)
+
+        self._post_custodia("INQ-QR")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-QR")
+        conteudo = Path(gerar_pdf_custodia(c)).read_bytes()
+        # Desenhado em vetor: nenhuma imagem embutida no PDF
+        self.assertNotIn(b"/Subtype /Image", conteudo)
+
+    def test_pdf_de_inventario_grande_em_pacote_com_anexos(self):
+        import zipfile
+
+        base = Path(self.tmp.name)
+        for i in range(2, 6):
+            (base / f"arquivo{i}.txt").write_bytes(f"conteudo-{i}".encode())
+        self._post_custodia("INQ-ANEXOS")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-ANEXOS")
+        with override_settings(CUSTODIA_PDF_ARQUIVOS_POR_ANEXO=2, CUSTODIA_PDF_WORKERS_ANEXOS=1):
+            processar_proximo_pdf()
+        c.refresh_from_db()
+        self.assertEqual(c.estado_pdf, Custodia.PDF_GERADO)
+        self.assertTrue(c.pdf_em_pacote)
+
+        with zipfile.ZipFile(c.caminho_pdf) as pacote:
+            manifesto = json.loads(pacote.read("manifesto.json"))
+            self.assertEqual(manifesto["hash_pasta"], c.hash_pasta)
+            anexos = manifesto["anexos"]
+            # 5 arquivos em faixas de até 2 caminhos: 3 anexos, folhas em sequência
+            self.assertEqual([a["arquivos"] for a in anexos], [2, 2, 1])
+            self.assertEqual(anexos[0]["primeiro_caminho"], "arquivo1.txt")
+            self.assertEqual(anexos[-1]["ultimo_caminho"], "arquivo5.txt")
+            self.assertEqual([a["folhas"] for a in anexos], [[1, 1], [2, 2], [3, 3]])
+            for anexo in anexos:
+                conteudo = pacote.read(anexo["arquivo"])
+                self.assertEqual(hashlib.sha256(conteudo).hexdigest(), anexo["sha256"])
+            resumo = pacote.read(manifesto["resumo"]["arquivo"])
+            self.assertEqual(hashlib.sha256(resumo).hexdigest(), manifesto["resumo"]["sha256"])
+
+        r = self.client.get(reverse("custodia:download_pdf", args=[c.id]))
+        self.assertEqual(r["Content-Type"], "application/zip")
+        r.close()
+
+    def test_fatias_e_pool_de_anexos(self):
+        from . import pdf_generator
+
+        base = Path(self.tmp.name)
+        for i in range(2, 6):
+            (base / f"arquivo{i}.txt").write_bytes(f"conteudo-{i}".encode())
+        self._post_custodia("INQ-FATIAS")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-FATIAS")
+        self.assertEqual(
+            pdf_generator.fatias_inventario(c, 2),
+            [(None, "arquivo3.txt"), ("arquivo3.txt", "arquivo5.txt"), ("arquivo5.txt", None)],
+        )
+        self.assertEqual(pdf_generator.fatias_inventario(c, 5), [(None, None)])
+
+        # Sem valor fixo, o pool de anexos divide os núcleos entre os workers de PDF
+        self.addCleanup(pdf_generator.definir_workers_pdf, 1)
+        with override_settings(CUSTODIA_PDF_WORKERS_ANEXOS=None), patch("os.cpu_count", return_value=8):
+            pdf_generator.definir_workers_pdf(4)
+            self.assertEqual(pdf_generator.workers_anexos(), 2)
+            pdf_generator.definir_workers_pdf(16)
+            self.assertEqual(pdf_generator.workers_anexos(), 1)
+        with override_settings(CUSTODIA_PDF_WORKERS_ANEXOS=3):
+            self.assertEqual(pdf_generator.workers_anexos(), 3)
+
+    def test_tarefa_nao_e_reservada_por_dois_workers(self):
+        tarefa = TarefaCustodia.objects.create(dados={})
+        reservada = reservar_proxima_tarefa("worker-a")
+        self.assertEqual(reservada.pk, tarefa.pk)
+        self.assertIsNone(reservar_proxima_tarefa("worker-b"))
+
+        # Worker interrompido: sem sinal além do lease, a tarefa volta a ser elegível
+        TarefaCustodia.objects.filter(pk=tarefa.pk).update(
+            ultimo_sinal=timezone.now() - timedelta(hours=1)
+        )
+        retomada = reservar_proxima_tarefa("worker-b")
+        self.assertEqual(retomada.pk, tarefa.pk)
+        self.assertEqual(retomada.worker, "worker-b")
+        self.assertEqual(retomada.tentativas, 2)
+
     def test_lista_padrao_so_versoes_ativas(self):
         self._post_custodia("INQ-LISTA")
         (Path(self.tmp.name) / "extra.txt").write_bytes(b"x")
@@ -115,3 +891,512 @@ class CustodiaVersioningTests(TestCase):
         self.assertIsNone(r.context["busca_hash_erro"])
         self.assertEqual(len(r.context["resultados_busca"]), 1)
         self.assertTrue(r.context["resultados_busca"][0]["tem_posterior"] is False)
+
+    def test_busca_hash_por_prefixo_usa_indice(self):
+        self._post_custodia("INQ-PREFIXO")
+        c = Custodia.objects.get(caso__numero_procedimento="INQ-PREFIXO")
+        hash_arquivo = hashlib.sha256(b"conteudo-a").hexdigest()
+        self.assertEqual(
+            sorted(IndiceHash.objects.filter(custodia=c).values_list("origem", flat=True)),
+            ["hash_arquivo", "hash_conteudo_novos", "hash_pasta"],
+        )
+
+        url = reverse("custodia:lista")
+        r = self.client.get(url, {"hash": hash_arquivo[:8].upper()})
+        self.assertEqual(len(r.context["resultados_busca"]), 1)
+        self.assertIn("arquivo1.txt", r.context["resultados_busca"][0]["motivos"][-1])
+        # Prefixo, não trecho do meio
+        r = self.client.get(url, {"hash": hash_arquivo[10:30]})
+        self.assertEqual(r.context["resultados_busca"], [])
+        self.assertEqual(IndiceHash.objects.com_prefixo(hash_arquivo).count(), 1)
+
+
+class EntradaConcorrenteTests(TransactionTestCase):
+    """Várias entradas simultâneas, no mesmo caso e em casos diferentes."""
+
+    @classmethod
+    def setUpClass(cls):
+        # O SQLite em memória compartilhada não espera por locks ("database table
+        # is locked"): com ele, as threads usam um banco de testes em arquivo
+        cls._banco_original = None
+        original = connections["default"]
+        if original.vendor == "sqlite" and original.is_in_memory_db():
+            cls._pasta_banco = tempfile.TemporaryDirectory()
+            cls._banco_original = (original, original.settings_dict["NAME"])
+            original.settings_dict["NAME"] = str(Path(cls._pasta_banco.name) / "concorrencia.sqlite3")
+            connections["default"] = original.__class__(original.settings_dict, "default")
+            call_command("migrate", verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls._banco_original is not None:
+            original, nome = cls._banco_original
+            connections["default"].close()
+            original.settings_dict["NAME"] = nome
+            connections["default"] = original
+            cls._pasta_banco.cleanup()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # PDFs gerados nos testes vão para uma pasta temporária, não para settings.PDFS_DIR
+        self.pdfs = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pdfs.cleanup)
+        pasta_pdfs = override_settings(PDFS_DIR=Path(self.pdfs.name))
+        pasta_pdfs.enable()
+        self.addCleanup(pasta_pdfs.disable)
+
+    def _pasta(self, nome):
+        pasta = Path(self.tmp.name) / nome
+        pasta.mkdir()
+        # O arquivo comum muda de conteúdo entre pastas: sempre há alteração
+        (pasta / "comum.txt").write_bytes(nome.encode())
+        (pasta / f"{nome}.txt").write_bytes(b"conteudo-" + nome.encode())
+        return pasta
+
+    def _entrada(self, procedimento, pasta, resultados):
+        try:
+            form = CustodiaForm(data={
+                "nome_policial": "Fulano da Silva",
+                "matricula": "MATCONC",
+                "numero_procedimento": procedimento,
+                "local_crime": "Rua Teste, 1",
+                "data_coleta": "2024-06-01T10:00:00",
+                "caminho_pasta": str(pasta),
+            })
+            self.assertTrue(form.is_valid(), form.errors)
+            resultados.append(form.save().pk)
+        except Exception as e:
+            resultados.append(e)
+        finally:
+            connection.close()
+
+    def test_entradas_simultaneas_mantem_cadeia_consecutiva(self):
+        casos = {"INQ-CONC-1": 4, "INQ-CONC-2": 3, "INQ-CONC-3": 1}
+        resultados = []
+        barreira = threading.Barrier(sum(casos.values()))
+
+        def entrada(procedimento, pasta):
+            barreira.wait()
+            self._entrada(procedimento, pasta, resultados)
+
+        threads = [
+            threading.Thread(target=entrada, args=(procedimento, self._pasta(f"{procedimento}-{i}")))
+            for procedimento, total in casos.items()
+            for i in range(total)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        erros = [r for r in resultados if isinstance(r, Exception)]
+        self.assertEqual(erros, [])
+        self.assertEqual(len(set(resultados)), sum(casos.values()))
+        self.assertFalse(Custodia.todas.filter(publicada=False).exists())
+        for procedimento, total in casos.items():
+            caso = Caso.objects.get(numero_procedimento=procedimento)
+            versoes = caso.linha_do_tempo()
+            self.assertEqual([v["versao"] for v in versoes], list(range(1, total + 1)))
+            self.assertTrue(all(v["elo_valido"] for v in versoes), versoes)
+            self.assertEqual([v["ativo"] for v in versoes], [False] * (total - 1) + [True])
+
+    def test_preparo_desatualizado_e_refeito_e_abandonados_descartados(self):
+        from . import forms as modulo_forms
+
+        primeira = []
+        self._entrada("INQ-CONC-4", self._pasta("a"), primeira)
+        publicar = modulo_forms.publicar_versao
+        concorrente, disparada = [], []
+
+        def publicar_com_concorrente(custodia, tarefa=None):
+            # Outra entrada do caso é publicada entre o preparo e a publicação
+            if not disparada:
+                disparada.append(True)
+                self._entrada("INQ-CONC-4", self._pasta("b"), concorrente)
+            return publicar(custodia, tarefa)
+
+        segunda = []
+        from . import utils as modulo_utils
+
+        with patch.object(modulo_forms, "publicar_versao", side_effect=publicar_com_concorrente) as mock, \
+                patch.object(modulo_utils, "gerar_manifesto_pasta", wraps=modulo_utils.gerar_manifesto_pasta) as varredura:
+            self._entrada("INQ-CONC-4", self._pasta("c"), segunda)
+        self.assertEqual(mock.call_count, 3)
+
+        c = Custodia.objects.get(pk=segunda[0])
+        self.assertEqual((c.versao, c.custodia_anterior_id), (3, concorrente[0]))
+        # O novo preparo sai dos registros gravados do anterior: a pasta "c" foi
+        # varrida só pela própria entrada (uma vez) e pela concorrente
+        self.assertEqual(varredura.call_count, 2)
+        self.assertEqual(sorted(c.inventario().values_list("caminho_relativo", flat=True)), ["c.txt", "comum.txt"])
+        self.assertEqual(c.total_arquivos, 2)
+        self.assertEqual(c.estatisticas["removidos"], 1)
+        self.assertTrue(all(v["elo_valido"] for v in c.caso.linha_do_tempo()))
+        # O preparo descartado não deixa inventário nem entradas no índice
+        self.assertEqual(Custodia.todas.count(), 3)
+        self.assertFalse(Arquivo.objects.exclude(custodia__in=Custodia.objects.all()).exists())
+        self.assertFalse(IndiceHash.objects.exclude(custodia__in=Custodia.objects.all()).exists())
+
+        abandonada = Custodia.todas.create(
+            numero_documento="CUST-PREPARO", hash_pasta="0" * 64, caminho_pasta="/x",
+            policial=c.policial, caso=c.caso, versao=4, custodia_anterior=c,
+            ativo=False, publicada=False,
+        )
+        Custodia.todas.filter(pk=abandonada.pk).update(data_criacao=timezone.now() - timedelta(days=2))
+        self.assertEqual(modulo_forms.descartar_preparos_abandonados(), 1)
+        self.assertFalse(Custodia.todas.filter(pk=abandonada.pk).exists())
+
+
+@override_settings(CUSTODIA_BUSCA_HASH_POR_PAGINA=3)
+class BuscaHashTests(TestCase):
+    """Busca por hash com número de consultas fixo, mesmo para hashes muito comuns."""
+
+    HASH_VAZIO = hashlib.sha256(b"").hexdigest()
+
+    def setUp(self):
+        policial = Policial.objects.create(nome_completo="Fulano", matricula="MAT1")
+        caso = Caso.objects.create(
+            numero_procedimento="INQ-COMUM", local_crime="-", data_coleta=timezone.now()
+        )
+        anterior = None
+        for versao in range(1, 6):
+            anterior = Custodia.objects.create(
+                numero_documento=f"CUST-COMUM-{versao}",
+                hash_pasta=f"{versao:064x}",
+                hash_conteudo_novos=f"{versao:064x}",
+                caminho_pasta="/evidencias",
+                policial=policial,
+                caso=caso,
+                versao=versao,
+                custodia_anterior=anterior,
+            )
+            Arquivo.objects.bulk_create(
+                Arquivo(
+                    custodia=anterior,
+                    nome_arquivo=f"vazio{i}.txt",
+                    caminho_completo=f"/evidencias/vazio{i:02d}.txt",
+                    caminho_relativo=f"vazio{i:02d}.txt",
+                    hash_arquivo=self.HASH_VAZIO,
+                )
+                for i in range(ARQUIVOS_POR_RESULTADO_BUSCA + 5)
+            )
+
+    def test_consultas_limitadas_e_paginadas(self):
+        with self.assertNumQueries(5):
+            pagina = _buscar_por_hash_no_banco(self.HASH_VAZIO[:8])
+            resultados = list(pagina.object_list)
+        self.assertEqual(pagina.paginator.count, 5)
+        self.assertEqual([r["custodia"].versao for r in resultados], [5, 4, 3])
+        self.assertEqual(len(resultados[0]["motivos"]), ARQUIVOS_POR_RESULTADO_BUSCA)
+        self.assertEqual(resultados[0]["arquivos_omitidos"], 5)
+        self.assertIn("vazio00.txt", resultados[0]["motivos"][0])
+        self.assertFalse(resultados[0]["tem_posterior"])
+        self.assertEqual(resultados[1]["proxima"].versao, 5)
+
+        with self.assertNumQueries(5):
+            segunda = _buscar_por_hash_no_banco(self.HASH_VAZIO, 2)
+        self.assertEqual([r["custodia"].versao for r in segunda.object_list], [2, 1])
+        self.assertEqual(segunda.object_list[1]["proxima"].versao, 2)
+
+    def test_hash_comum_em_muitas_versoes_expande_so_a_pagina(self):
+        policial = Policial.objects.first()
+        h_comum = hashlib.sha256(b"comum").hexdigest()
+
+        def cadeia(numero, versoes, completa_a_cada, gravar):
+            caso = Caso.objects.create(numero_procedimento=numero, local_crime="-", data_coleta=timezone.now())
+            anterior = None
+            for versao in range(1, versoes + 1):
+                anterior = Custodia.objects.create(
+                    numero_documento=f"CUST-{numero}-{versao}",
+                    hash_pasta=hashlib.sha256(f"{numero}-{versao}".encode()).hexdigest(),
+                    caminho_pasta="/evidencias",
+                    policial=policial,
+                    caso=caso,
+                    versao=versao,
+                    custodia_anterior=anterior,
+                    inventario_delta=(versao - 1) % completa_a_cada != 0,
+                )
+                hash_comum = gravar(versao, anterior.inventario_delta)
+                if hash_comum:
+                    Arquivo.objects.create(
+                        custodia=anterior,
+                        nome_arquivo="comum.txt",
+                        caminho_completo="/evidencias/comum.txt",
+                        caminho_relativo="comum.txt",
+                        hash_arquivo=hash_comum,
+                    )
+                IndiceHash.objects.encerrar_substituidas(anterior)
+
+        cadeia("INQ-OUTRO", 10, 1, lambda versao, delta: h_comum)
+        # Gravado só nas versões completas (1, 11, 21) e alterado na 15
+        cadeia(
+            "INQ-LONGO",
+            30,
+            10,
+            lambda versao, delta: (
+                h_comum if not delta else hashlib.sha256(b"alterado").hexdigest() if versao == 15 else None
+            ),
+        )
+
+        with self.assertNumQueries(5):
+            pagina = _buscar_por_hash_no_banco(h_comum)
+            resultados = list(pagina.object_list)
+        # Paginação pelas 13 versões que gravaram o hash; a página só expande as suas
+        self.assertEqual(pagina.paginator.count, 13)
+        self.assertEqual(
+            [r["custodia"].versao for r in resultados],
+            list(range(30, 20, -1)) + list(range(14, 0, -1)),
+        )
+        self.assertEqual({r["custodia"].caso.numero_procedimento for r in resultados}, {"INQ-LONGO"})
+        for r in resultados:
+            self.assertEqual(r["motivos"], ["Hash do arquivo no inventário: comum.txt"])
+        self.assertEqual(resultados[0]["proxima"], None)
+        self.assertEqual(resultados[1]["proxima"].versao, 30)
+        self.assertEqual(resultados[-1]["proxima"].versao, 2)
+
+        with self.assertNumQueries(5):
+            segunda = _buscar_por_hash_no_banco(h_comum, 2)
+        self.assertEqual(
+            [(r["custodia"].caso.numero_procedimento, r["custodia"].versao) for r in segunda.object_list],
+            [("INQ-OUTRO", 10), ("INQ-OUTRO", 9), ("INQ-OUTRO", 8)],
+        )
+
+    def test_hash_da_custodia(self):
+        pagina = _buscar_por_hash_no_banco(f"{3:064x}")
+        self.assertEqual(len(pagina.object_list), 1)
+        self.assertEqual(pagina.object_list[0]["motivos"], [
+            "Hash final da cadeia (esta versão)",
+            "Hash agregado (novos ou alterados nesta versão)",
+        ])
+        self.assertEqual(pagina.object_list[0]["arquivos_omitidos"], 0)
+
+
+@override_settings(CUSTODIA_LISTA_POR_PAGINA=3)
+class ListaCustodiasTests(TestCase):
+    """Listagem paginada por cursor (data_criacao, id) e filtros."""
+
+    def setUp(self):
+        self.client = Client()
+        policiais = [
+            Policial.objects.create(nome_completo="Fulano", matricula="MAT1", delegacia="1ª DP Centro"),
+            Policial.objects.create(nome_completo="Beltrano", matricula="MAT2", delegacia="2ª DP Norte"),
+        ]
+        casos = [
+            Caso.objects.create(numero_procedimento=f"INQ-{i}", local_crime="-", data_coleta=timezone.now())
+            for i in range(2)
+        ]
+        base = timezone.now() - timedelta(days=10)
+        self.custodias = []
+        for i in range(8):
+            self.custodias.append(Custodia.objects.create(
+                numero_documento=f"CUST-LISTA-{i}",
+                hash_pasta=f"{i:064x}",
+                caminho_pasta="/evidencias",
+                policial=policiais[i % 2],
+                caso=casos[i % 2],
+                # Duas custódias por instante: o id desempata o cursor
+                data_criacao=base + timedelta(days=i // 2),
+                ativo=i < 6,
+            ))
+
+    def _paginas(self, **filtros):
+        url = reverse("custodia:lista")
+        vistos, parametros = [], dict(filtros)
+        while True:
+            r = self.client.get(url, parametros)
+            self.assertEqual(r.status_code, 200)
+            vistos.append([c.numero_documento for c in r.context["custodias"]])
+            pagina = r.context["pagina"]
+            if not pagina.tem_proxima:
+                return vistos, r
+            parametros = dict(filtros, apos=pagina.cursor_proxima)
+
+    def test_percorre_todas_as_paginas_em_ordem(self):
+        paginas, _ = self._paginas(situacao="todas")
+        esperado = [
+            c.numero_documento
+            for c in sorted(self.custodias, key=lambda c: (c.data_criacao, c.pk), reverse=True)
+        ]
+        self.assertEqual([len(p) for p in paginas], [3, 3, 2])
+        self.assertEqual(sum(paginas, []), esperado)
+
+    def test_volta_uma_pagina(self):
+        url = reverse("custodia:lista")
+        primeira = self.client.get(url, {"historico": "1"}).context["pagina"]
+        self.assertFalse(primeira.tem_anterior)
+        segunda = self.client.get(url, {"historico": "1", "apos": primeira.cursor_proxima}).context["pagina"]
+        self.assertTrue(segunda.tem_anterior)
+        de_volta = self.client.get(url, {"historico": "1", "antes": segunda.cursor_anterior}).context["pagina"]
+        self.assertEqual(
+            [c.pk for c in de_volta.itens], [c.pk for c in primeira.itens]
+        )
+        self.assertFalse(de_volta.tem_anterior)
+        self.assertTrue(de_volta.tem_proxima)
+
+    def test_cursor_invalido_volta_a_primeira_pagina(self):
+        r = self.client.get(reverse("custodia:lista"), {"apos": "nao-e-um-cursor"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context["custodias"][0].numero_documento, "CUST-LISTA-5")
+
+    def test_filtros(self):
+        paginas, _ = self._paginas(situacao="todas", procedimento="INQ-1")
+        self.assertEqual(sum(paginas, []), ["CUST-LISTA-7", "CUST-LISTA-5", "CUST-LISTA-3", "CUST-LISTA-1"])
+        paginas, _ = self._paginas(matricula="MAT1")
+        self.assertEqual(sum(paginas, []), ["CUST-LISTA-4", "CUST-LISTA-2", "CUST-LISTA-0"])
+        paginas, _ = self._paginas(situacao="anteriores", delegacia="norte")
+        self.assertEqual(sum(paginas, []), ["CUST-LISTA-7"])
+
+        inicio = timezone.localtime(self.custodias[2].data_criacao).date()
+        fim = timezone.localtime(self.custodias[5].data_criacao).date()
+        paginas, r = self._paginas(data_inicio=inicio.isoformat(), data_fim=fim.isoformat())
+        self.assertEqual(sum(paginas, []), ["CUST-LISTA-5", "CUST-LISTA-4", "CUST-LISTA-3", "CUST-LISTA-2"])
+        self.assertTrue(r.context["filtros_ativos"])
+        # Os links de navegação repetem os filtros
+        self.assertIn("data_inicio=", r.context["parametros_filtro"])
+
+        r = self.client.get(reverse("custodia:lista"), {"data_inicio": fim, "data_fim": inicio})
+        self.assertTrue(r.context["filtro"].non_field_errors())
+
+    def test_paginas_profundas_com_consultas_constantes(self):
+        url = reverse("custodia:lista")
+        with self.assertNumQueries(1):
+            primeira = self.client.get(url, {"situacao": "todas"}).context["pagina"]
+        with self.assertNumQueries(1):
+            self.client.get(url, {"situacao": "todas", "apos": primeira.cursor_proxima})
+
+
+class CalculoHashPastaTests(TestCase):
+    """Valida que o cálculo paralelo reproduz exatamente o cálculo em série."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        base = Path(self.tmp.name)
+        (base / "sub" / "interna").mkdir(parents=True)
+        for i in range(30):
+            (base / f"arq{i:02d}.bin").write_bytes(bytes([i]) * (i * 1000 + 1))
+        (base / "sub" / "video.mp4").write_bytes(b"v" * 5000)
+        (base / "sub" / "interna" / "doc.txt").write_bytes(b"doc")
+
+    def test_paralelo_igual_ao_serial(self):
+        hash_serial, lista_serial = calcular_hash_pasta(self.tmp.name)
+        for usar_processos in (False, True):
+            hash_par, lista_par = calcular_hash_pasta(
+                self.tmp.name, max_workers=4, usar_processos=usar_processos
+            )
+            self.assertEqual(hash_par, hash_serial)
+            self.assertEqual(
+                [x["caminho_relativo"] for x in lista_par],
+                [x["caminho_relativo"] for x in lista_serial],
+            )
+            self.assertEqual(
+                [x["hash"] for x in lista_par],
+                [x["hash"] for x in lista_serial],
+            )
+
+    def test_backends_de_leitura_produzem_mesmo_hash(self):
+        base = Path(self.tmp.name)
+        (base / "vazio.bin").write_bytes(b"")
+        (base / "grande.bin").write_bytes(bytes(range(256)) * 4099)
+        for nome in ("vazio.bin", "grande.bin", "arq07.bin"):
+            caminho = base / nome
+            esperado = hashlib.sha256(caminho.read_bytes()).hexdigest()
+            for backend in BACKENDS_LEITURA:
+                for bloco in (None, 1000):
+                    self.assertEqual(
+                        calcular_hash_arquivo(caminho, backend, bloco), esperado
+                    )
+            self.assertEqual(calcular_hash_arquivo(caminho), esperado)
+
+    def test_varredura_scandir_mesma_ordem_que_rglob(self):
+        base = Path(self.tmp.name)
+        for rel in ("a/b", "a-c", "a0", "a/x/y", "B", ".oculto", "a.txt"):
+            caminho = base / rel
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            caminho.write_bytes(b"x")
+        (base / "vazia").mkdir()
+        esperado = [a for a in sorted(base.rglob("*")) if a.is_file()]
+        self.assertEqual([c for c, _ in percorrer_arquivos(base)], esperado)
+
+    def test_validar_pasta_sem_arquivos(self):
+        with tempfile.TemporaryDirectory() as vazia:
+            (Path(vazia) / "sub" / "sub2").mkdir(parents=True)
+            self.assertEqual(
+                validar_pasta_arquivos(vazia), (False, "Nenhum arquivo encontrado na pasta")
+            )
+        self.assertEqual(validar_pasta_arquivos(self.tmp.name), (True, ""))
+
+    def test_manifesto_canonico_reproduz_agregado_ordenado(self):
+        base = Path(self.tmp.name)
+        nomes = ["a/b", "a-c", "a0", "a.txt", "a", "Z", "x/y/z"]
+        if os.sep == "/":
+            # ':' no nome: a ordem entre 'c' e 'c:...' depende do hash de 'c'
+            nomes += ["c", "c:0", "c:f", "c:9/d"]
+        for rel in nomes:
+            if rel == "a":
+                continue
+            caminho = base / rel
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            caminho.write_bytes(rel.encode())
+        _, lista = calcular_hash_pasta(self.tmp.name)
+
+        agregador = AgregadorHash()
+        canonico = list(gerar_manifesto_pasta(self.tmp.name, max_workers=3))
+        for info in canonico:
+            agregador.adicionar(info["caminho_relativo"], info["hash"])
+
+        entradas = [f"{x['caminho_relativo']}:{x['hash']}" for x in canonico]
+        self.assertEqual(entradas, sorted(entradas))
+        self.assertEqual(agregador.total, len(lista))
+        self.assertEqual(agregador.hexdigest(), combinar_hashes_lista_arquivos(lista))
+
+    def test_digests_em_uma_leitura(self):
+        caminho = Path(self.tmp.name) / "arq20.bin"
+        conteudo = caminho.read_bytes()
+        digests = calcular_digests_arquivo(caminho, ("sha256", "md5", "sha512"), tamanho_bloco=4096)
+        self.assertEqual(digests["sha256"], hashlib.sha256(conteudo).hexdigest())
+        self.assertEqual(digests["md5"], hashlib.md5(conteudo).hexdigest())
+        self.assertEqual(digests["sha512"], hashlib.sha512(conteudo).hexdigest())
+
+    def test_arvore_de_chunks(self):
+        caminho = Path(self.tmp.name) / "arq29.bin"
+        conteudo = caminho.read_bytes()
+        tamanho_chunk = 4096
+        digests, arvore = calcular_arvore_hash_arquivo(
+            caminho, tamanho_chunk, max_workers=3, algoritmos=("sha256", "md5")
+        )
+        self.assertEqual(digests["sha256"], calcular_hash_arquivo(caminho))
+        self.assertEqual(digests["md5"], hashlib.md5(conteudo).hexdigest())
+        esperados = [
+            hashlib.sha256(conteudo[i:i + tamanho_chunk]).hexdigest()
+            for i in range(0, len(conteudo), tamanho_chunk)
+        ]
+        self.assertEqual(arvore["hashes"], esperados)
+        self.assertEqual(
+            arvore["raiz"],
+            hashlib.sha256(("4096:" + "".join(esperados)).encode()).hexdigest(),
+        )
+
+        verificacao = verificar_chunks_arquivo(caminho, arvore, len(conteudo), max_workers=3)
+        self.assertEqual(verificacao["divergentes"], [])
+        self.assertEqual(len(verificacao["verificados"]), len(esperados))
+
+        alterado = bytearray(conteudo)
+        alterado[2 * tamanho_chunk + 10] ^= 0xFF
+        caminho.write_bytes(alterado)
+        self.assertEqual(verificar_chunks_arquivo(caminho, arvore, indices=[0, 2, 5])["divergentes"], [2])
+
+        amostra = amostrar_chunks(len(esperados), 3, semente=7)
+        self.assertEqual(amostra, sorted(set(amostra)))
+        self.assertEqual(len(amostra), 3)
+        self.assertEqual(amostrar_chunks(2, 10), [0, 1])
+
+    def test_arvore_de_chunks_arquivo_vazio(self):
+        caminho = Path(self.tmp.name) / "vazio.bin"
+        caminho.write_bytes(b"")
+        digests, arvore = calcular_arvore_hash_arquivo(caminho, 1024)
+        self.assertEqual(digests["sha256"], hashlib.sha256(b"").hexdigest())
+        self.assertEqual(arvore["hashes"], [])
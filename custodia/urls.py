@@ -6,8 +6,16 @@ app_name = 'custodia'
 urlpatterns = [
     path('', views.index, name='index'),
     path('processar/', views.processar_custodia, name='processar'),
+    path('tarefa/<int:tarefa_id>/', views.status_tarefa, name='tarefa'),
+    path('tarefa/<int:tarefa_id>/progresso/', views.progresso_tarefa, name='tarefa_progresso'),
+    path('tarefa/<int:tarefa_id>/eventos/', views.eventos_tarefa, name='tarefa_eventos'),
     path('resultado/<int:custodia_id>/', views.resultado, name='resultado'),
     path('pdf/<int:custodia_id>/', views.download_pdf, name='download_pdf'),
+    path('pdf/<int:custodia_id>/estado/', views.estado_pdf, name='estado_pdf'),
+    path('pdf/<int:custodia_id>/gerar/', views.gerar_pdf_novamente, name='gerar_pdf'),
     path('lista/', views.lista_custodias, name='lista'),
     path('detalhes/<int:custodia_id>/', views.detalhes_custodia, name='detalhes'),
+    path('detalhes/<int:custodia_id>/arquivos/', views.inventario_custodia, name='inventario'),
+    path('caso/<int:caso_id>/linha-do-tempo/', views.linha_do_tempo_caso, name='linha_do_tempo'),
+    path('verificar/<int:custodia_id>/', views.verificar_integridade, name='verificar'),
 ]
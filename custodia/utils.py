@@ -1,7 +1,14 @@
 import hashlib
 import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import mmap
 from pathlib import Path
-from typing import List, Dict, Tuple
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 import mimetypes
 from datetime import datetime
 
@@ -16,27 +23,665 @@ def validar_arquivo_video(caminho_arquivo: str) -> bool:
     return extensao in EXTENSOES_VIDEO
 
 
-def calcular_hash_arquivo(caminho_arquivo: Path) -> str:
-    """Calcula o hash SHA-256 de um arquivo individual"""
-    hash_sha256 = hashlib.sha256()
+# ---------------------------------------------------------------------------
+# Backends de leitura para o cálculo de hash
+#
+# Todos entregam exatamente a mesma sequência de bytes ao hash; mudam apenas a
+# forma de ler (syscalls maiores, mapeamento em memória, dicas ao kernel).
+# ---------------------------------------------------------------------------
+
+BACKEND_READINTO = 'readinto'
+BACKEND_MMAP = 'mmap'
+BACKEND_FADVISE = 'fadvise'
+
+# Tamanho do bloco de leitura por backend (bytes)
+TAMANHO_BLOCO_BACKEND = {
+    BACKEND_READINTO: 1024 * 1024,
+    BACKEND_MMAP: 8 * 1024 * 1024,
+    BACKEND_FADVISE: 4 * 1024 * 1024,
+}
+
+# A partir deste tamanho, arquivos em disco local são lidos via mmap
+LIMITE_MMAP_BYTES = 64 * 1024 * 1024
+
+# Tipos de sistema de arquivos tratados como compartilhamento de rede
+SISTEMAS_ARQUIVOS_REDE = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', '9p', 'afs'}
+
+_buffers_thread = threading.local()
+
+
+def _buffer_reutilizavel(tamanho: int) -> memoryview:
+    """Buffer de leitura reaproveitado entre arquivos (um por thread)."""
+    buf = getattr(_buffers_thread, 'buf', None)
+    if buf is None or len(buf) != tamanho:
+        buf = memoryview(bytearray(tamanho))
+        _buffers_thread.buf = buf
+    return buf
+
+
+def _ler_readinto(caminho: Path, atualizar: Callable, tamanho_bloco: int) -> None:
+    buf = _buffer_reutilizavel(tamanho_bloco)
+    with open(caminho, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            atualizar(buf[:n])
+
+
+def _ler_mmap(caminho: Path, atualizar: Callable, tamanho_bloco: int) -> None:
+    with open(caminho, 'rb') as f:
+        tamanho = os.fstat(f.fileno()).st_size
+        if tamanho == 0:
+            # mmap não aceita arquivos vazios
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mv = memoryview(mm)
+            try:
+                for inicio in range(0, tamanho, tamanho_bloco):
+                    atualizar(mv[inicio:inicio + tamanho_bloco])
+            finally:
+                mv.release()
+
+
+def _ler_fadvise(caminho: Path, atualizar: Callable, tamanho_bloco: int) -> None:
+    buf = _buffer_reutilizavel(tamanho_bloco)
+    with open(caminho, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        # Leitura sequencial: kernel amplia o read-ahead do compartilhamento
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            atualizar(buf[:n])
+        # Evidência é lida uma única vez: não vale a pena manter no page cache
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+BACKENDS_LEITURA = {
+    BACKEND_READINTO: _ler_readinto,
+    BACKEND_MMAP: _ler_mmap,
+}
+if hasattr(os, 'posix_fadvise'):
+    BACKENDS_LEITURA[BACKEND_FADVISE] = _ler_fadvise
+
+
+@lru_cache(maxsize=1)
+def _pontos_montagem() -> Tuple[Tuple[str, str], ...]:
+    """Lê /proc/mounts (Linux) -> ((ponto_montagem, tipo_fs), ...), do mais longo ao mais curto."""
+    try:
+        with open('/proc/mounts', 'r', encoding='utf-8', errors='replace') as f:
+            montagens = []
+            for linha in f:
+                partes = linha.split()
+                if len(partes) >= 3:
+                    ponto = partes[1].replace('\\040', ' ')
+                    montagens.append((ponto, partes[2]))
+    except OSError:
+        return ()
+    return tuple(sorted(montagens, key=lambda m: len(m[0]), reverse=True))
+
+
+@lru_cache(maxsize=1024)
+def _pasta_em_rede(pasta: str) -> bool:
+    """Indica se a pasta está em um compartilhamento de rede (SMB/NFS/UNC)."""
+    if pasta.startswith('\\\\') or pasta.startswith('//'):
+        return True
+    pasta_abs = os.path.abspath(pasta)
+    for ponto, tipo_fs in _pontos_montagem():
+        if pasta_abs == ponto or pasta_abs.startswith(ponto.rstrip('/') + '/'):
+            return tipo_fs in SISTEMAS_ARQUIVOS_REDE
+    return False
+
+
+def escolher_backend_leitura(caminho_arquivo: Path, tamanho_bytes: Optional[int] = None) -> str:
+    """
+    Escolhe o backend de leitura pelo sistema de arquivos e pelo tamanho:
+    - compartilhamento de rede: fadvise (leitura sequencial), se disponível
+    - arquivo local grande: mmap
+    - demais casos: readinto com buffer grande reaproveitado
+    """
+    if _pasta_em_rede(str(Path(caminho_arquivo).parent)):
+        if BACKEND_FADVISE in BACKENDS_LEITURA:
+            return BACKEND_FADVISE
+        return BACKEND_READINTO
+    if tamanho_bytes is None:
+        tamanho_bytes = os.stat(caminho_arquivo).st_size
+    if tamanho_bytes >= LIMITE_MMAP_BYTES:
+        return BACKEND_MMAP
+    return BACKEND_READINTO
+
+
+# Algoritmo da cadeia (hash_pasta, hash_arquivo); os demais são só informativos
+ALGORITMO_CANONICO = 'sha256'
+ALGORITMOS_ADICIONAIS = ('md5', 'sha1', 'sha512')
+
+
+def calcular_digests_arquivo(
+    caminho_arquivo: Path,
+    algoritmos: Iterable[str] = (ALGORITMO_CANONICO,),
+    backend: Optional[str] = None,
+    tamanho_bloco: Optional[int] = None,
+    tamanho_bytes: Optional[int] = None,
+) -> Dict[str, str]:
+    """
+    Calcula vários digests de um arquivo com uma única leitura: cada bloco lido
+    atualiza todos os algoritmos pedidos (nomes do hashlib, ex.: 'sha256', 'md5').
+
+    Retorna {algoritmo: hexdigest}. Os demais parâmetros são os de calcular_hash_arquivo.
+    """
     try:
-        with open(caminho_arquivo, 'rb') as f:
-            # Lê em chunks de 4KB para arquivos grandes
-            for chunk in iter(lambda: f.read(4096), b''):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
+        digests = {nome: hashlib.new(nome) for nome in dict.fromkeys(algoritmos)}
+        if backend is None:
+            backend = escolher_backend_leitura(caminho_arquivo, tamanho_bytes)
+        if backend not in BACKENDS_LEITURA:
+            raise ValueError(f"Backend de leitura indisponível: {backend}")
+
+        if len(digests) == 1:
+            atualizar = next(iter(digests.values())).update
+        else:
+            atualizacoes = [d.update for d in digests.values()]
+
+            def atualizar(bloco):
+                for atualizar_digest in atualizacoes:
+                    atualizar_digest(bloco)
+
+        ler = BACKENDS_LEITURA[backend]
+        ler(caminho_arquivo, atualizar, tamanho_bloco or TAMANHO_BLOCO_BACKEND[backend])
+        return {nome: d.hexdigest() for nome, d in digests.items()}
     except Exception as e:
         raise Exception(f"Erro ao calcular hash do arquivo {caminho_arquivo}: {str(e)}")
 
 
-def calcular_hash_pasta(caminho_pasta: str) -> Tuple[str, List[Dict]]:
+def calcular_hash_arquivo(
+    caminho_arquivo: Path,
+    backend: Optional[str] = None,
+    tamanho_bloco: Optional[int] = None,
+    tamanho_bytes: Optional[int] = None,
+) -> str:
     """
-    Calcula o hash SHA-256 de uma pasta completa (recursivo)
-    
-    Retorna:
-        - hash_final: Hash SHA-256 da pasta
-        - lista_arquivos: Lista com informações de todos os arquivos
+    Calcula o hash SHA-256 de um arquivo individual
+
+    backend: 'readinto', 'mmap' ou 'fadvise'; None escolhe automaticamente
+    (ver escolher_backend_leitura). tamanho_bloco: None usa o padrão do backend.
+    tamanho_bytes: tamanho já conhecido (evita um stat na escolha automática).
+    O resultado é idêntico para qualquer backend.
+    """
+    return calcular_digests_arquivo(
+        caminho_arquivo, (ALGORITMO_CANONICO,), backend, tamanho_bloco, tamanho_bytes
+    )[ALGORITMO_CANONICO]
+
+
+# Modo de hash por chunks (arquivos muito grandes): além do SHA-256 do arquivo
+# inteiro, guarda o SHA-256 de cada bloco fixo de tamanho_chunk bytes e uma raiz
+# que resume a lista. Os chunks podem ser conferidos isoladamente e em paralelo.
+TAMANHO_CHUNK_PADRAO = 32 * 1024 * 1024
+
+
+def _ler_chunk(arquivo_aberto, tamanho_chunk: int) -> Optional[memoryview]:
+    """Lê até tamanho_chunk bytes (num buffer novo) ou None no fim do arquivo"""
+    buffer = memoryview(bytearray(tamanho_chunk))
+    lido = 0
+    while lido < tamanho_chunk:
+        n = arquivo_aberto.readinto(buffer[lido:])
+        if not n:
+            break
+        lido += n
+    return buffer[:lido] if lido else None
+
+
+def _hash_chunk(dados) -> str:
+    return hashlib.sha256(dados).hexdigest()
+
+
+def _atualizar_digests(digests: Iterable, dados) -> None:
+    for digest in digests:
+        digest.update(dados)
+
+
+def calcular_raiz_chunks(hashes_chunks: List[str], tamanho_chunk: int) -> str:
+    """
+    Digest raiz da árvore de chunks (um nível): SHA-256 de
+    '<tamanho_chunk>:' seguido dos hashes hexadecimais dos chunks, em ordem.
+    """
+    raiz = hashlib.sha256(f"{tamanho_chunk}:".encode('utf-8'))
+    for hash_chunk in hashes_chunks:
+        raiz.update(hash_chunk.encode('utf-8'))
+    return raiz.hexdigest()
+
+
+def calcular_arvore_hash_arquivo(
+    caminho_arquivo: Path,
+    tamanho_chunk: int = TAMANHO_CHUNK_PADRAO,
+    max_workers: int = 1,
+    algoritmos: Iterable[str] = (ALGORITMO_CANONICO,),
+) -> Tuple[Dict[str, str], Dict]:
+    """
+    Calcula, numa única leitura sequencial, os digests do arquivo inteiro
+    (idênticos aos de calcular_digests_arquivo) e a árvore de chunks.
+
+    Cada chunk lido é entregue a um pool de max_workers threads para o hash do
+    chunk, enquanto uma thread dedicada atualiza os digests do arquivo inteiro
+    (que, por definição, precisam ver os bytes em ordem). O hashlib libera o GIL,
+    então leitura, digest inteiro e hashes dos chunks andam em paralelo. No
+    máximo max_workers + 2 chunks ficam em memória.
+
+    Retorna ({algoritmo: hex}, {'tamanho_chunk', 'hashes', 'raiz'}).
+    """
+    try:
+        digests = {nome: hashlib.new(nome) for nome in dict.fromkeys(algoritmos)}
+        max_workers = max(1, max_workers)
+        hashes_chunks = []
+        pendentes = deque()
+
+        def concluir_mais_antigo():
+            atualizacao, hash_chunk = pendentes.popleft()
+            atualizacao.result()
+            hashes_chunks.append(hash_chunk.result())
+
+        with ThreadPoolExecutor(max_workers=1) as sequencial, \
+                ThreadPoolExecutor(max_workers=max_workers) as pool, \
+                open(caminho_arquivo, 'rb', buffering=0) as f:
+            while True:
+                chunk = _ler_chunk(f, tamanho_chunk)
+                if chunk is None:
+                    break
+                pendentes.append((
+                    sequencial.submit(_atualizar_digests, list(digests.values()), chunk),
+                    pool.submit(_hash_chunk, chunk),
+                ))
+                if len(pendentes) > max_workers + 1:
+                    concluir_mais_antigo()
+            while pendentes:
+                concluir_mais_antigo()
+
+        arvore = {
+            'tamanho_chunk': tamanho_chunk,
+            'hashes': hashes_chunks,
+            'raiz': calcular_raiz_chunks(hashes_chunks, tamanho_chunk),
+        }
+        return {nome: d.hexdigest() for nome, d in digests.items()}, arvore
+    except Exception as e:
+        raise Exception(f"Erro ao calcular hash do arquivo {caminho_arquivo}: {str(e)}")
+
+
+def _hash_chunk_na_posicao(indice: int, caminho_arquivo: Path, tamanho_chunk: int) -> str:
+    """Relê apenas o chunk `indice` do arquivo e devolve seu SHA-256"""
+    with open(caminho_arquivo, 'rb', buffering=0) as f:
+        f.seek(indice * tamanho_chunk)
+        return _hash_chunk(_ler_chunk(f, tamanho_chunk) or b'')
+
+
+def amostrar_chunks(total_chunks: int, quantidade: int, semente=None) -> List[int]:
+    """Índices (ordenados) de uma amostra aleatória de chunks, sem repetição"""
+    quantidade = max(0, min(quantidade, total_chunks))
+    return sorted(random.Random(semente).sample(range(total_chunks), quantidade))
+
+
+def verificar_chunks_arquivo(
+    caminho_arquivo: Path,
+    arvore: Dict,
+    tamanho_esperado: Optional[int] = None,
+    indices: Optional[Iterable[int]] = None,
+    max_workers: int = 1,
+) -> Dict:
+    """
+    Confere chunks do arquivo contra uma árvore gravada, relendo só os chunks
+    pedidos (indices=None confere todos). Os chunks são independentes, então a
+    releitura é distribuída entre max_workers threads.
+
+    Retorna {'tamanho_confere', 'verificados', 'divergentes'}; tamanho_confere é
+    None se tamanho_esperado não foi informado.
+    """
+    tamanho_chunk = arvore['tamanho_chunk']
+    hashes_esperados = arvore['hashes']
+    if indices is None:
+        indices = range(len(hashes_esperados))
+    indices = list(indices)
+
+    tamanho_confere = None
+    if tamanho_esperado is not None:
+        tamanho_confere = os.stat(caminho_arquivo).st_size == tamanho_esperado
+
+    calculados = mapear_em_ordem(
+        _hash_chunk_na_posicao, indices, caminho_arquivo, tamanho_chunk,
+        max_workers=max_workers,
+    )
+    divergentes = [
+        indice for indice, hash_chunk in zip(indices, calculados)
+        if hash_chunk != hashes_esperados[indice]
+    ]
+    return {
+        'tamanho_confere': tamanho_confere,
+        'verificados': indices,
+        'divergentes': divergentes,
+    }
+
+
+def chave_cache_hash(arquivo: Path, stat_info: os.stat_result) -> str:
+    """
+    Chave do cache de hashes: (dispositivo, inode, tamanho, mtime_ns, caminho).
+    Qualquer alteração de conteúdo via escrita normal muda tamanho e/ou mtime_ns.
+    """
+    bruto = (
+        f"{stat_info.st_dev}:{stat_info.st_ino}:{stat_info.st_size}:"
+        f"{stat_info.st_mtime_ns}:{os.path.abspath(arquivo)}"
+    )
+    return hashlib.sha256(bruto.encode('utf-8', errors='surrogateescape')).hexdigest()
+
+
+def _usa_chunks(tamanho_bytes: int, tamanho_chunk: Optional[int], chunk_minimo_bytes: int) -> bool:
+    return bool(tamanho_chunk) and tamanho_bytes >= chunk_minimo_bytes
+
+
+def _hash_e_info_arquivo(
+    item: Tuple[Path, os.stat_result, Optional[Tuple[Dict[str, str], Optional[Dict]]]],
+    pasta_base: Path,
+    backend_leitura: Optional[str] = None,
+    tamanho_bloco: Optional[int] = None,
+    algoritmos_adicionais: Tuple[str, ...] = (),
+    tamanho_chunk: Optional[int] = None,
+    chunk_minimo_bytes: int = 0,
+    workers_chunk: int = 1,
+) -> Optional[Dict]:
+    """
+    Calcula o hash e coleta as informações de um arquivo da pasta.
+
+    item: (arquivo, stat do arquivo, (digests, árvore de chunks) do cache). Se
+    o registro veio do cache, o arquivo não é lido.
+    tamanho_chunk: se informado, arquivos com pelo menos chunk_minimo_bytes
+    também recebem a árvore de chunks (ver calcular_arvore_hash_arquivo), com
+    workers_chunk threads por arquivo.
+    Função de nível de módulo para poder ser enviada a um pool de processos.
+    Retorna None se o arquivo não puder ser processado.
+    """
+    arquivo, stat_info, registro_cache = item
+    try:
+        algoritmos = (ALGORITMO_CANONICO,) + tuple(algoritmos_adicionais)
+        if registro_cache:
+            digests, arvore = registro_cache
+        elif _usa_chunks(stat_info.st_size, tamanho_chunk, chunk_minimo_bytes):
+            digests, arvore = calcular_arvore_hash_arquivo(
+                arquivo, tamanho_chunk, workers_chunk, algoritmos
+            )
+        else:
+            digests = calcular_digests_arquivo(
+                arquivo,
+                algoritmos,
+                backend_leitura,
+                tamanho_bloco,
+                tamanho_bytes=stat_info.st_size,
+            )
+            arvore = None
+        info_arquivo = coletar_info_arquivo(arquivo, pasta_base, stat_info)
+        info_arquivo['hash'] = digests[ALGORITMO_CANONICO]
+        info_arquivo['hashes_adicionais'] = {
+            nome: digests[nome] for nome in algoritmos_adicionais if nome in digests
+        }
+        info_arquivo['arvore_chunks'] = arvore
+        info_arquivo['hash_do_cache'] = bool(registro_cache)
+        return info_arquivo
+    except Exception as e:
+        # Continua processando outros arquivos mesmo se um falhar
+        print(f"Erro ao processar arquivo {arquivo}: {str(e)}")
+        return None
+
+
+def _chaves_ordem_canonica(entradas: List[os.DirEntry]) -> Dict[str, str]:
+    """
+    Chave de ordenação de cada entrada para a ordem canônica, isto é, a ordem das
+    strings 'caminho_relativo:hash' usada em combinar_hashes_entradas_rel_hash.
+
+    Pastas: nome + separador (todo o conteúdo começa com esse prefixo);
+    arquivos: nome + ':'. Se um nome com ':' (possível fora do Windows) tiver
+    como prefixo a chave de um arquivo irmão, a ordem depende do hash desse
+    arquivo, que então é calculado aqui para desempatar.
+    """
+    chaves = {}
+    for entrada in entradas:
+        if entrada.is_dir() and not entrada.is_symlink():
+            chaves[entrada.name] = entrada.name + os.sep
+        else:
+            chaves[entrada.name] = entrada.name + ':'
+
+    if any(':' in nome for nome in chaves):
+        valores = list(chaves.values())
+        for entrada in entradas:
+            chave = chaves[entrada.name]
+            if not chave.endswith(':') or not entrada.is_file():
+                continue
+            if any(outra != chave and outra.startswith(chave) for outra in valores):
+                try:
+                    chaves[entrada.name] = chave + calcular_hash_arquivo(Path(entrada.path))
+                except Exception:
+                    pass
+    return chaves
+
+
+def _listar_pasta_ordenada(pasta, ordem_canonica: bool = False) -> List[os.DirEntry]:
+    """Entradas da pasta ordenadas (ordem de Path ou ordem canônica)."""
+    try:
+        with os.scandir(pasta) as it:
+            entradas = list(it)
+    except PermissionError:
+        return []
+    if ordem_canonica:
+        chaves = _chaves_ordem_canonica(entradas)
+        return sorted(entradas, key=lambda entrada: chaves[entrada.name])
+    # normcase: no Windows, Path compara sem diferenciar maiúsculas
+    return sorted(entradas, key=lambda entrada: os.path.normcase(entrada.name))
+
+
+def percorrer_arquivos(
+    pasta_base: Path,
+    ordem_canonica: bool = False,
+) -> Iterator[Tuple[Path, os.stat_result]]:
+    """
+    Percorre a pasta recursivamente com os.scandir, em uma única passada,
+    e produz (caminho, stat) de cada arquivo.
+
+    Por padrão a ordem é a mesma de sorted(pasta_base.rglob('*')) filtrado por
+    is_file(): entradas ordenadas por nome em cada pasta, descendo em cada
+    subpasta no ponto em que ela aparece. Com ordem_canonica=True a ordem é a das
+    strings 'caminho_relativo:hash' (a de combinar_hashes_entradas_rel_hash), o
+    que permite agregar o hash da pasta sem ordenar a lista inteira.
+    Como em rglob, links simbólicos para pastas não são seguidos e pastas sem
+    permissão de leitura são ignoradas.
+    O stat vem do DirEntry (no Windows, já obtido na própria listagem).
+    """
+    pilha = [iter(_listar_pasta_ordenada(pasta_base, ordem_canonica))]
+    while pilha:
+        entrada = next(pilha[-1], None)
+        if entrada is None:
+            pilha.pop()
+        elif entrada.is_dir() and not entrada.is_symlink():
+            pilha.append(iter(_listar_pasta_ordenada(entrada.path, ordem_canonica)))
+        elif entrada.is_file():
+            try:
+                yield Path(entrada.path), entrada.stat()
+            except OSError as e:
+                print(f"Erro ao processar arquivo {entrada.path}: {str(e)}")
+
+
+def mapear_em_ordem(
+    funcao: Callable,
+    itens: Iterable,
+    *args,
+    max_workers: int = 1,
+    usar_processos: bool = False,
+    contexto_processos=None,
+    inicializador: Optional[Callable] = None,
+) -> Iterator:
+    """
+    Aplica funcao(item, *args) a cada item usando um pool de threads ou processos,
+    devolvendo os resultados na MESMA ordem de entrada.
+
+    Mantém no máximo ~2 tarefas por worker em andamento, para não enfileirar
+    a pasta inteira de uma vez. Com max_workers <= 1 executa em série.
+    contexto_processos/inicializador: mp_context e initializer do pool de
+    processos (ex.: 'spawn' e django.setup para workers que usam o banco).
+    """
+    if max_workers <= 1:
+        for item in itens:
+            yield funcao(item, *args)
+        return
+
+    janela = max_workers * 2
+    if usar_processos:
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=contexto_processos, initializer=inicializador
+        )
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    with executor:
+        pendentes = deque()
+        for item in itens:
+            pendentes.append(executor.submit(funcao, item, *args))
+            if len(pendentes) >= janela:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+class AgregadorHash:
+    """
+    Agregado SHA-256 de entradas 'caminho_relativo:hash', atualizado entrada a
+    entrada (sem montar a string concatenada). Recebendo as entradas na ordem
+    canônica, o resultado é o mesmo de combinar_hashes_entradas_rel_hash.
+    """
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.total = 0
+
+    def adicionar(self, caminho_relativo: str, hash_arquivo: str) -> None:
+        self._hash.update(f"{caminho_relativo}:{hash_arquivo}".encode('utf-8'))
+        self.total += 1
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class ProgressoHash:
+    """
+    Progresso e vazão de uma execução do cálculo de hashes.
+
+    O pipeline chama iniciar(), definir_totais() (quando a contagem prévia da
+    pasta termina), arquivo_concluido() e finalizar(). A cada `intervalo`
+    segundos (e ao final), ao_atualizar recebe instantaneo(), por exemplo para
+    gravar o progresso da tarefa no banco. A granularidade é por arquivo.
     """
+
+    def __init__(self, ao_atualizar: Optional[Callable[[Dict], None]] = None, intervalo: float = 1.0):
+        self.ao_atualizar = ao_atualizar
+        self.intervalo = intervalo
+        self._trava = threading.Lock()
+        self._inicio = None
+        self._fim = None
+        self._ultima_publicacao = 0.0
+        self.arquivos_total = None
+        self.bytes_total = None
+        self.arquivos_processados = 0
+        self.bytes_processados = 0
+        self.bytes_lidos = 0
+        self.arquivos_do_cache = 0
+        self.arquivo_atual = ''
+
+    def iniciar(self) -> None:
+        self._inicio = time.monotonic()
+        self._publicar(forcar=True)
+
+    def definir_totais(self, arquivos: int, bytes_total: int) -> None:
+        with self._trava:
+            self.arquivos_total = arquivos
+            self.bytes_total = bytes_total
+
+    def arquivo_concluido(self, info_arquivo: Dict, proximo: str = '') -> None:
+        tamanho = info_arquivo.get('tamanho_bytes') or 0
+        with self._trava:
+            self.arquivos_processados += 1
+            self.bytes_processados += tamanho
+            if info_arquivo.get('hash_do_cache'):
+                self.arquivos_do_cache += 1
+            else:
+                self.bytes_lidos += tamanho
+            self.arquivo_atual = proximo
+        self._publicar()
+
+    def finalizar(self) -> None:
+        self._fim = time.monotonic()
+        self.arquivo_atual = ''
+        self._publicar(forcar=True)
+
+    def duracao_segundos(self) -> float:
+        if self._inicio is None:
+            return 0.0
+        return (self._fim or time.monotonic()) - self._inicio
+
+    def instantaneo(self) -> Dict:
+        with self._trava:
+            duracao = self.duracao_segundos()
+            mb_por_segundo = (self.bytes_lidos / (1024 * 1024) / duracao) if duracao > 0 else 0.0
+            eta = None
+            if self.bytes_total is not None and self.bytes_processados and self._fim is None:
+                # Ritmo efetivo (inclui arquivos vindos do cache, que não são lidos)
+                ritmo = self.bytes_processados / duracao if duracao > 0 else 0
+                if ritmo > 0:
+                    eta = max(0.0, (self.bytes_total - self.bytes_processados) / ritmo)
+            return {
+                'arquivos_processados': self.arquivos_processados,
+                'arquivos_total': self.arquivos_total,
+                'bytes_processados': self.bytes_processados,
+                'bytes_total': self.bytes_total,
+                'bytes_lidos': self.bytes_lidos,
+                'arquivos_do_cache': self.arquivos_do_cache,
+                'arquivo_atual': self.arquivo_atual,
+                'mb_por_segundo': round(mb_por_segundo, 2),
+                'eta_segundos': round(eta, 1) if eta is not None else None,
+                'duracao_segundos': round(duracao, 3),
+                'concluido': self._fim is not None,
+            }
+
+    def _publicar(self, forcar: bool = False) -> None:
+        if self.ao_atualizar is None:
+            return
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_publicacao < self.intervalo:
+            return
+        self._ultima_publicacao = agora
+        self.ao_atualizar(self.instantaneo())
+
+
+def _contar_arquivos(pasta_base: Path, progresso: ProgressoHash, parar: threading.Event) -> None:
+    """Contagem prévia (só varredura, sem leitura) para os totais do progresso."""
+    arquivos = 0
+    total_bytes = 0
+    for _, st in percorrer_arquivos(pasta_base):
+        if parar.is_set():
+            return
+        arquivos += 1
+        total_bytes += st.st_size
+    progresso.definir_totais(arquivos, total_bytes)
+
+
+# Arquivos por lote nas consultas/gravações do cache durante o streaming
+TAMANHO_LOTE_MANIFESTO = 500
+
+
+def em_lotes(itens: Iterable, tamanho: int) -> Iterator[list]:
+    """Agrupa qualquer iterável (inclusive geradores) em listas de até `tamanho` itens"""
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _validar_pasta_base(caminho_pasta: str) -> Path:
     pasta_base = Path(caminho_pasta)
     
     if not pasta_base.exists():
@@ -44,42 +689,201 @@ def calcular_hash_pasta(caminho_pasta: str) -> Tuple[str, List[Dict]]:
     
     if not pasta_base.is_dir():
         raise ValueError(f"Caminho não é uma pasta: {caminho_pasta}")
-    
-    hashes_arquivos = []
-    lista_arquivos = []
-    
-    # Listar e ordenar arquivos recursivamente (inclui todas as subpastas)
-    arquivos = sorted(pasta_base.rglob('*'))
-    
-    for arquivo in arquivos:
-        if arquivo.is_file():
-            try:
-                # Calcular hash do conteúdo do arquivo
-                hash_arquivo = calcular_hash_arquivo(arquivo)
-                
-                # Usar caminho relativo para preservar estrutura de pastas
-                caminho_relativo = str(arquivo.relative_to(pasta_base))
-                
-                # Coletar informações do arquivo
-                info_arquivo = coletar_info_arquivo(arquivo, pasta_base)
-                info_arquivo['hash'] = hash_arquivo
-                
-                # Adicionar ao hash combinado
-                hashes_arquivos.append(f"{caminho_relativo}:{hash_arquivo}")
-                lista_arquivos.append(info_arquivo)
-                
-            except Exception as e:
-                # Continua processando outros arquivos mesmo se um falhar
-                print(f"Erro ao processar arquivo {arquivo}: {str(e)}")
+
+    return pasta_base
+
+
+def gerar_manifesto_pasta(
+    caminho_pasta: str,
+    ordem_canonica: bool = True,
+    max_workers: int = 1,
+    usar_processos: bool = False,
+    backend_leitura: Optional[str] = None,
+    tamanho_bloco: Optional[int] = None,
+    cache=None,
+    confiar_cache: bool = False,
+    progresso: Optional[ProgressoHash] = None,
+    algoritmos_adicionais: Iterable[str] = (),
+    tamanho_chunk: Optional[int] = None,
+    chunk_minimo_bytes: int = 0,
+    workers_chunk: int = 1,
+) -> Iterator[Dict]:
+    """
+    Pipeline em streaming da pasta: varredura -> hash -> registro.
+
+    Produz, um a um, os dicionários de coletar_info_arquivo (com 'hash' e
+    'hash_do_cache'), sem montar a lista de arquivos: a memória usada não
+    depende do tamanho da pasta. Por padrão os registros saem na ordem canônica
+    (ver percorrer_arquivos), prontos para AgregadorHash.
+
+    max_workers/usar_processos: pool de hash (ver mapear_em_ordem).
+    backend_leitura/tamanho_bloco: repassados a calcular_hash_arquivo.
+    cache: objeto com obter(chaves) -> {chave: ({algoritmo: hex}, árvore)},
+    registrar({chave: (caminho, {algoritmo: hex}, árvore)}) e expurgar() (ver
+    custodia.cache_hash). Com confiar_cache=True, arquivos cuja chave de stat
+    está no cache (com todos os algoritmos pedidos e, no modo chunks, a árvore
+    com o mesmo tamanho de chunk) não são relidos; em qualquer
+    modo os digests calculados são gravados no cache, se o arquivo não mudou
+    durante a leitura.
+    progresso: ProgressoHash a atualizar; os totais vêm de uma contagem da pasta
+    feita em paralelo ao cálculo.
+    algoritmos_adicionais: digests extras (ex.: 'md5', 'sha512') calculados na
+    mesma leitura, em info['hashes_adicionais']. O SHA-256 é sempre calculado.
+    tamanho_chunk/chunk_minimo_bytes/workers_chunk: modo de hash por chunks para
+    arquivos grandes (árvore em info['arvore_chunks']; None nos demais).
+    """
+    pasta_base = _validar_pasta_base(caminho_pasta)
+    algoritmos_adicionais = tuple(
+        nome for nome in dict.fromkeys(algoritmos_adicionais) if nome != ALGORITMO_CANONICO
+    )
+    return _gerar_manifesto(
+        pasta_base, ordem_canonica, max_workers, usar_processos,
+        backend_leitura, tamanho_bloco, cache, confiar_cache, progresso,
+        algoritmos_adicionais, tamanho_chunk, chunk_minimo_bytes, workers_chunk,
+    )
+
+
+def _gerar_manifesto(
+    pasta_base, ordem_canonica, max_workers, usar_processos,
+    backend_leitura, tamanho_bloco, cache, confiar_cache, progresso,
+    algoritmos_adicionais, tamanho_chunk, chunk_minimo_bytes, workers_chunk,
+) -> Iterator[Dict]:
+    algoritmos = (ALGORITMO_CANONICO,) + algoritmos_adicionais
+    chaves = {}
+    em_andamento = deque()
+    parar_contagem = threading.Event()
+    if progresso is not None:
+        progresso.iniciar()
+        threading.Thread(
+            target=_contar_arquivos,
+            args=(pasta_base, progresso, parar_contagem),
+            daemon=True,
+        ).start()
+
+    def registro_aproveitavel(registro, tamanho_bytes):
+        digests, arvore = registro
+        # Entrada sem algum dos algoritmos pedidos (ou sem a árvore de chunks
+        # pedida) exige releitura
+        if not all(nome in digests for nome in algoritmos):
+            return False
+        if _usa_chunks(tamanho_bytes, tamanho_chunk, chunk_minimo_bytes):
+            return bool(arvore) and arvore['tamanho_chunk'] == tamanho_chunk
+        return True
+
+    def itens():
+        for lote in em_lotes(percorrer_arquivos(pasta_base, ordem_canonica), TAMANHO_LOTE_MANIFESTO):
+            registros_cache = {}
+            if cache is not None:
+                for arquivo, st in lote:
+                    chaves[arquivo] = chave_cache_hash(arquivo, st)
+                if confiar_cache:
+                    registros_cache = cache.obter([chaves[a] for a, _ in lote])
+            for arquivo, st in lote:
+                em_andamento.append(arquivo)
+                registro = registros_cache.get(chaves.get(arquivo))
+                if registro and not registro_aproveitavel(registro, st.st_size):
+                    registro = None
+                yield arquivo, st, registro
+
+    resultados = mapear_em_ordem(
+        _hash_e_info_arquivo,
+        itens(),
+        pasta_base,
+        backend_leitura,
+        tamanho_bloco,
+        algoritmos_adicionais,
+        tamanho_chunk,
+        chunk_minimo_bytes,
+        workers_chunk,
+        max_workers=max_workers,
+        usar_processos=usar_processos,
+    )
+    novos_cache = {}
+    try:
+        for info_arquivo in resultados:
+            arquivo = em_andamento.popleft()
+            chave = chaves.pop(arquivo, None)
+            if info_arquivo is None:
                 continue
+            if progresso is not None:
+                progresso.arquivo_concluido(
+                    info_arquivo, str(em_andamento[0]) if em_andamento else ''
+                )
+            if chave and not info_arquivo['hash_do_cache']:
+                # Só grava no cache se o arquivo não mudou durante a leitura
+                try:
+                    if chave_cache_hash(arquivo, os.stat(arquivo)) == chave:
+                        digests = dict(info_arquivo['hashes_adicionais'])
+                        digests[ALGORITMO_CANONICO] = info_arquivo['hash']
+                        novos_cache[chave] = (
+                            info_arquivo['caminho_completo'], digests, info_arquivo['arvore_chunks']
+                        )
+                except OSError:
+                    pass
+                if len(novos_cache) >= TAMANHO_LOTE_MANIFESTO:
+                    cache.registrar(novos_cache)
+                    novos_cache = {}
+            yield info_arquivo
+    finally:
+        resultados.close()
+        parar_contagem.set()
+        if cache is not None:
+            cache.registrar(novos_cache)
+            cache.expurgar()
+        if progresso is not None:
+            progresso.finalizar()
+
+
+def calcular_hash_pasta(
+    caminho_pasta: str,
+    max_workers: int = 1,
+    usar_processos: bool = False,
+    backend_leitura: Optional[str] = None,
+    tamanho_bloco: Optional[int] = None,
+    cache=None,
+    confiar_cache: bool = False,
+    progresso: Optional[ProgressoHash] = None,
+    algoritmos_adicionais: Iterable[str] = (),
+    tamanho_chunk: Optional[int] = None,
+    chunk_minimo_bytes: int = 0,
+    workers_chunk: int = 1,
+) -> Tuple[str, List[Dict]]:
+    """
+    Calcula o hash SHA-256 de uma pasta completa (recursivo)
+
+    Os arquivos são varridos e combinados na ordem de sorted(rglob('*')), então
+    o hash final e a lista de arquivos são sempre os mesmos, com ou sem
+    paralelismo. Os demais parâmetros são os de gerar_manifesto_pasta; para
+    processar pastas muito grandes sem montar a lista, use-o diretamente.
     
-    # Combinar todos os hashes
-    hash_combinado = hashlib.sha256()
-    hash_combinado.update(''.join(hashes_arquivos).encode('utf-8'))
-    
-    hash_final = hash_combinado.hexdigest()
-    
-    return hash_final, lista_arquivos
+    Retorna:
+        - hash_final: Hash SHA-256 da pasta
+        - lista_arquivos: Lista com informações de todos os arquivos
+    """
+    agregador = AgregadorHash()
+    lista_arquivos = []
+
+    manifesto = gerar_manifesto_pasta(
+        caminho_pasta,
+        ordem_canonica=False,
+        max_workers=max_workers,
+        usar_processos=usar_processos,
+        backend_leitura=backend_leitura,
+        tamanho_bloco=tamanho_bloco,
+        cache=cache,
+        confiar_cache=confiar_cache,
+        progresso=progresso,
+        algoritmos_adicionais=algoritmos_adicionais,
+        tamanho_chunk=tamanho_chunk,
+        chunk_minimo_bytes=chunk_minimo_bytes,
+        workers_chunk=workers_chunk,
+    )
+    for info_arquivo in manifesto:
+        # Caminho relativo no hash combinado preserva a estrutura de pastas
+        agregador.adicionar(info_arquivo['caminho_relativo'], info_arquivo['hash'])
+        lista_arquivos.append(info_arquivo)
+
+    return agregador.hexdigest(), lista_arquivos
 
 
 def combinar_hashes_entradas_rel_hash(entradas: List[str]) -> str:
@@ -87,11 +891,9 @@ def combinar_hashes_entradas_rel_hash(entradas: List[str]) -> str:
     Combina entradas 'caminho_relativo:hash' (lista já ordenada ou será ordenada aqui)
     no mesmo formato de calcular_hash_pasta.
     """
-    if not entradas:
-        return hashlib.sha256(b'').hexdigest()
-    ordenado = sorted(entradas)
     h = hashlib.sha256()
-    h.update(''.join(ordenado).encode('utf-8'))
+    for entrada in sorted(entradas):
+        h.update(entrada.encode('utf-8'))
     return h.hexdigest()
 
 
@@ -130,9 +932,104 @@ def particionar_novos_ou_alterados(
     return novos, inalterados
 
 
-def coletar_info_arquivo(arquivo: Path, pasta_base: Path) -> Dict:
+class ResumoInventario:
+    """
+    Agregados de uma versão acumulados registro a registro do manifesto, na
+    mesma passada que grava o inventário: agregado de todos os arquivos, agregado
+    dos novos ou alterados (hash_conteudo_novos), tamanho total e estatísticas.
+
+    mapa_anterior: caminho_relativo -> hash_arquivo da versão anterior (None na
+    primeira versão: tudo conta como novo). Recebendo os registros na ordem
+    canônica, os agregados são os de combinar_hashes_entradas_rel_hash.
+    """
+
+    def __init__(self, mapa_anterior: Optional[Dict[str, str]] = None):
+        self.mapa_anterior = mapa_anterior or {}
+        self.agregado_todos = AgregadorHash()
+        self.agregado_novos = AgregadorHash()
+        self.tamanho_total = 0
+        self.por_extensao: Dict[str, Dict[str, int]] = {}
+        self.por_tipo_mime: Dict[str, Dict[str, int]] = {}
+        self.contagem = {'novos': 0, 'alterados': 0, 'inalterados': 0, 'hashes_do_cache': 0}
+        self._vistos_anteriores = 0
+
+    @property
+    def total_arquivos(self) -> int:
+        return self.agregado_todos.total
+
+    @property
+    def novos_ou_alterados(self) -> int:
+        return self.agregado_novos.total
+
+    def adicionar(self, info: Dict) -> bool:
+        """Acumula um registro; retorna se ele é novo ou alterado em relação à versão anterior"""
+        rel = info['caminho_relativo']
+        hash_arquivo = info['hash']
+        tamanho = info.get('tamanho_bytes') or 0
+        self.agregado_todos.adicionar(rel, hash_arquivo)
+        self.tamanho_total += tamanho
+
+        extensao = Path(info['nome_arquivo']).suffix.lower()
+        tipo_mime = info.get('tipo_mime') or 'application/octet-stream'
+        for grupo, chave in ((self.por_extensao, extensao), (self.por_tipo_mime, tipo_mime)):
+            agregado = grupo.setdefault(chave, {'arquivos': 0, 'bytes': 0})
+            agregado['arquivos'] += 1
+            agregado['bytes'] += tamanho
+        if info.get('hash_do_cache'):
+            self.contagem['hashes_do_cache'] += 1
+
+        anterior = self.mapa_anterior.get(rel)
+        if anterior is None:
+            self.contagem['novos'] += 1
+        else:
+            self._vistos_anteriores += 1
+            self.contagem['inalterados' if anterior == hash_arquivo else 'alterados'] += 1
+        novo = anterior != hash_arquivo
+        if novo:
+            self.agregado_novos.adicionar(rel, hash_arquivo)
+        return novo
+
+    def estatisticas(self) -> Dict:
+        """Formato de calcular_estatisticas_inventario"""
+        return {
+            'por_extensao': self.por_extensao,
+            'por_tipo_mime': self.por_tipo_mime,
+            **self.contagem,
+            'removidos': len(self.mapa_anterior) - self._vistos_anteriores,
+        }
+
+
+def calcular_estatisticas_inventario(
+    lista_atual: Iterable[Dict],
+    mapa_anterior: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """
+    Agregados do inventário de uma versão, numa passada pelos registros do
+    manifesto (caminho_relativo, nome_arquivo, tamanho_bytes, tipo_mime, hash,
+    hash_do_cache).
+
+    mapa_anterior: caminho_relativo -> hash_arquivo da versão anterior (None na
+    primeira versão: tudo conta como novo).
+
+    Retorna {'por_extensao': {ext: {'arquivos', 'bytes'}}, 'por_tipo_mime': {...},
+    'novos', 'alterados', 'inalterados', 'removidos', 'hashes_do_cache'}; a
+    extensão vem em minúsculas com o ponto ('' para arquivos sem extensão).
+    """
+    resumo = ResumoInventario(mapa_anterior)
+    for info in lista_atual:
+        resumo.adicionar(info)
+    return resumo.estatisticas()
+
+
+def coletar_info_arquivo(
+    arquivo: Path,
+    pasta_base: Path,
+    stat_info: Optional[os.stat_result] = None,
+) -> Dict:
     """
     Coleta informações detalhadas de um arquivo
+
+    stat_info: resultado de stat já obtido na varredura (evita nova consulta ao disco)
     
     Retorna dicionário com:
     - nome_arquivo
@@ -145,7 +1042,8 @@ def coletar_info_arquivo(arquivo: Path, pasta_base: Path) -> Dict:
     - eh_video
     """
     try:
-        stat_info = arquivo.stat()
+        if stat_info is None:
+            stat_info = arquivo.stat()
         
         caminho_relativo = str(arquivo.relative_to(pasta_base))
         extensao = arquivo.suffix.lower()
@@ -214,11 +1112,8 @@ def validar_pasta_arquivos(caminho_pasta: str) -> Tuple[bool, str]:
         if not pasta.is_dir():
             return False, "Caminho não é uma pasta"
         
-        # Verificar se há pelo menos um arquivo (qualquer tipo)
-        arquivos = list(pasta.rglob('*'))
-        arquivos_encontrados = [f for f in arquivos if f.is_file()]
-        
-        if not arquivos_encontrados:
+        # Verificar se há pelo menos um arquivo (qualquer tipo); para no primeiro
+        if next(percorrer_arquivos(pasta), None) is None:
             return False, "Nenhum arquivo encontrado na pasta"
         
         return True, ""
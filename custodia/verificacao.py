@@ -0,0 +1,247 @@
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Custodia
+from .utils import (
+    AgregadorHash,
+    ProgressoHash,
+    _validar_pasta_base,
+    calcular_hash_arquivo,
+    combinar_hashes_entradas_rel_hash,
+    mapear_em_ordem,
+    percorrer_arquivos,
+)
+
+MODO_COMPLETO = 'completo'
+MODO_RAPIDO = 'rapido'
+MODOS_VERIFICACAO = (MODO_COMPLETO, MODO_RAPIDO)
+
+# Diferença tolerada entre a data de modificação gravada e a do disco
+TOLERANCIA_MTIME = timedelta(milliseconds=1)
+
+
+class ResultadoVerificacao:
+    """
+    Diferença entre o inventário gravado de uma custódia e a pasta no disco.
+
+    Cada lista guarda caminhos relativos:
+    - ausentes: registrados na custódia e não encontrados no disco
+    - extras: presentes no disco e não registrados
+    - modificados: tamanho ou hash diferente do registrado
+    - inalterados: hash conferido ou, no modo rápido, tamanho e data iguais
+    - ilegiveis: presentes mas não puderam ser lidos ({caminho: erro})
+    """
+
+    def __init__(self, custodia: Custodia, modo: str, amostra: float):
+        self.custodia = custodia
+        self.modo = modo
+        self.amostra = amostra
+        self.ausentes: List[str] = []
+        self.extras: List[str] = []
+        self.modificados: List[str] = []
+        self.inalterados: List[str] = []
+        self.ilegiveis: Dict[str, str] = {}
+        self.arquivos_rehasheados = 0
+        self.bytes_rehasheados = 0
+        self.confirmados_por_metadados = 0
+        # Agregado 'caminho:hash' do inventário gravado (na versão 1 é o
+        # próprio hash_pasta; nas seguintes hash_pasta é o hash de cadeia)
+        self.hash_inventario_registrado: Optional[str] = None
+        # Só é calculado quando todos os arquivos do disco foram relidos
+        self.hash_pasta_atual: Optional[str] = None
+        self.duracao_segundos = 0.0
+        self.data_verificacao = timezone.now()
+
+    @property
+    def integro(self) -> bool:
+        return not (self.ausentes or self.extras or self.modificados or self.ilegiveis)
+
+    @property
+    def hash_pasta_confere(self) -> Optional[bool]:
+        if self.hash_pasta_atual is None:
+            return None
+        return self.hash_pasta_atual == self.hash_inventario_registrado
+
+    def como_dict(self) -> Dict:
+        """Relatório serializável em JSON"""
+        return {
+            'custodia_id': self.custodia.pk,
+            'numero_documento': self.custodia.numero_documento,
+            'caminho_pasta': self.custodia.caminho_pasta,
+            'modo': self.modo,
+            'amostra': self.amostra,
+            'data_verificacao': self.data_verificacao.isoformat(),
+            'duracao_segundos': round(self.duracao_segundos, 3),
+            'integro': self.integro,
+            'hash_pasta_registrado': self.custodia.hash_pasta,
+            'hash_inventario_registrado': self.hash_inventario_registrado,
+            'hash_pasta_atual': self.hash_pasta_atual,
+            'hash_pasta_confere': self.hash_pasta_confere,
+            'arquivos_rehasheados': self.arquivos_rehasheados,
+            'bytes_rehasheados': self.bytes_rehasheados,
+            'confirmados_por_metadados': self.confirmados_por_metadados,
+            'ausentes': self.ausentes,
+            'extras': self.extras,
+            'modificados': self.modificados,
+            'inalterados': len(self.inalterados),
+            'ilegiveis': self.ilegiveis,
+        }
+
+
+def _mtime_como_gravado(st_mtime: float) -> datetime:
+    """Data de modificação convertida como coletar_info_arquivo + ORM a gravam"""
+    data = datetime.fromtimestamp(st_mtime)
+    if settings.USE_TZ:
+        data = timezone.make_aware(data)
+    return data
+
+
+def _metadados_conferem(stat_info, tamanho_registrado, mtime_registrado) -> bool:
+    if tamanho_registrado != stat_info.st_size or mtime_registrado is None:
+        return False
+    return abs(_mtime_como_gravado(stat_info.st_mtime) - mtime_registrado) <= TOLERANCIA_MTIME
+
+
+def _rehash_verificacao(
+    item: Tuple[Path, str],
+    backend_leitura: Optional[str],
+    tamanho_bloco: Optional[int],
+) -> Tuple[Optional[str], Optional[str]]:
+    """Recalcula o SHA-256 de um arquivo; retorna (hash, erro). Nível de módulo para pools."""
+    arquivo, _ = item
+    try:
+        return calcular_hash_arquivo(arquivo, backend_leitura, tamanho_bloco), None
+    except Exception as e:
+        return None, str(e)
+
+
+def verificar_custodia(
+    custodia: Custodia,
+    modo: str = MODO_COMPLETO,
+    amostra: Optional[float] = None,
+    semente=None,
+    max_workers: Optional[int] = None,
+    usar_processos: Optional[bool] = None,
+    progresso: Optional[ProgressoHash] = None,
+) -> ResultadoVerificacao:
+    """
+    Confere a pasta da custódia (caminho_pasta) contra os registros de Arquivo.
+
+    modo 'completo': todos os arquivos do disco são relidos e comparados pelo
+    SHA-256; o hash da pasta é recalculado e comparado com o agregado do
+    inventário gravado.
+    modo 'rapido': tamanho diferente já indica modificação sem releitura;
+    tamanho e data de modificação iguais confirmam o arquivo sem releitura,
+    exceto para uma amostra aleatória (fração `amostra`, padrão
+    CUSTODIA_VERIFICACAO_AMOSTRA) que é relida mesmo assim; os demais
+    (data diferente) são relidos.
+
+    A releitura usa o pool de CUSTODIA_HASH_WORKERS (ver mapear_em_ordem).
+    Se `progresso` for informado, recebe os totais do inventário gravado e
+    cada arquivo do disco conferido (os confirmados sem releitura contam
+    como não lidos). Lança ValueError se a pasta não existir mais.
+    """
+    if modo not in MODOS_VERIFICACAO:
+        raise ValueError(f"Modo de verificação inválido: {modo}")
+    if amostra is None:
+        amostra = getattr(settings, 'CUSTODIA_VERIFICACAO_AMOSTRA', 0.05) if modo == MODO_RAPIDO else 1.0
+    if max_workers is None:
+        max_workers = getattr(settings, 'CUSTODIA_HASH_WORKERS', 1)
+    if usar_processos is None:
+        usar_processos = getattr(settings, 'CUSTODIA_HASH_USAR_PROCESSOS', False)
+
+    inicio = time.monotonic()
+    resultado = ResultadoVerificacao(custodia, modo, amostra)
+    pasta_base = _validar_pasta_base(custodia.caminho_pasta)
+    sorteio = random.Random(semente)
+
+    registrados = {
+        rel: (tamanho, mtime, hash_arquivo)
+        for rel, tamanho, mtime, hash_arquivo in custodia.inventario().values_list(
+            'caminho_relativo', 'tamanho_bytes', 'data_modificacao', 'hash_arquivo'
+        ).iterator(chunk_size=2000)
+    }
+    resultado.hash_inventario_registrado = combinar_hashes_entradas_rel_hash(
+        [f"{rel}:{registro[2]}" for rel, registro in registrados.items()]
+    )
+    if progresso is not None:
+        progresso.iniciar()
+        progresso.definir_totais(len(registrados), sum(registro[0] or 0 for registro in registrados.values()))
+
+    def sem_releitura(rel: str, tamanho: int) -> None:
+        if progresso is not None:
+            progresso.arquivo_concluido({'tamanho_bytes': tamanho, 'hash_do_cache': True}, rel)
+
+    # Ordem canônica: no modo completo o agregado da pasta sai na mesma passada
+    agregador = AgregadorHash() if modo == MODO_COMPLETO else None
+    a_reler = deque()
+
+    def itens() -> Iterator[Tuple[Path, str]]:
+        for arquivo, st in percorrer_arquivos(pasta_base, ordem_canonica=True):
+            rel = str(arquivo.relative_to(pasta_base))
+            registro = registrados.pop(rel, None)
+            if registro is None:
+                resultado.extras.append(rel)
+                if agregador is None:
+                    sem_releitura(rel, st.st_size)
+                    continue
+            elif modo == MODO_RAPIDO:
+                tamanho, mtime, _ = registro
+                if tamanho != st.st_size:
+                    resultado.modificados.append(rel)
+                    sem_releitura(rel, st.st_size)
+                    continue
+                if _metadados_conferem(st, tamanho, mtime) and sorteio.random() >= amostra:
+                    resultado.confirmados_por_metadados += 1
+                    resultado.inalterados.append(rel)
+                    sem_releitura(rel, st.st_size)
+                    continue
+            a_reler.append((rel, registro, st.st_size))
+            yield arquivo, rel
+
+    backend_leitura = getattr(settings, 'CUSTODIA_HASH_BACKEND', None)
+    tamanho_bloco = getattr(settings, 'CUSTODIA_HASH_TAMANHO_BLOCO', None)
+    calculados = mapear_em_ordem(
+        _rehash_verificacao,
+        itens(),
+        backend_leitura,
+        tamanho_bloco,
+        max_workers=max_workers,
+        usar_processos=usar_processos,
+    )
+    for hash_atual, erro in calculados:
+        rel, registro, tamanho = a_reler.popleft()
+        if progresso is not None:
+            progresso.arquivo_concluido({'tamanho_bytes': tamanho}, rel)
+        if erro is not None:
+            if registro is not None:
+                resultado.ilegiveis[rel] = erro
+            agregador = None
+            continue
+        resultado.arquivos_rehasheados += 1
+        resultado.bytes_rehasheados += tamanho
+        if agregador is not None:
+            agregador.adicionar(rel, hash_atual)
+        if registro is None:
+            continue
+        if hash_atual == registro[2]:
+            resultado.inalterados.append(rel)
+        else:
+            resultado.modificados.append(rel)
+
+    resultado.ausentes = sorted(registrados)
+    if agregador is not None:
+        resultado.hash_pasta_atual = agregador.hexdigest()
+    resultado.extras.sort()
+    resultado.modificados.sort()
+    resultado.duracao_segundos = time.monotonic() - inicio
+    if progresso is not None:
+        progresso.finalizar()
+    return resultado
@@ -1,13 +1,22 @@
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.core.exceptions import ValidationError
-from django.db.models import Q
-from django.http import FileResponse, Http404
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Exists, F, OuterRef, Q, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from pathlib import Path
-from typing import List, Optional
-from .forms import CustodiaForm
-from .models import Arquivo, Custodia
-from .pdf_generator import gerar_pdf_custodia
+from .forms import CustodiaForm, FiltroCustodiasForm
+from .models import Caso, Custodia, IndiceHash, TarefaCustodia
+from .paginacao import paginar_keyset
+from .tarefas import enfileirar_custodia, enfileirar_verificacao, reenfileirar_pdf
+from .verificacao import MODO_COMPLETO, MODO_RAPIDO, MODOS_VERIFICACAO
 
 
 def _normalizar_hash_busca(texto: str) -> str:
@@ -16,82 +25,111 @@ def _normalizar_hash_busca(texto: str) -> str:
     return ''.join(texto.split()).lower()
 
 
-def _campo_hash_coincide(valor: Optional[str], h_busca: str) -> bool:
-    if not valor:
-        return False
-    v = valor.lower()
-    h = h_busca.lower()
-    if len(h) == 64:
-        return v == h
-    return h in v
+# Arquivos coincidentes listados por custódia no resultado da busca por hash
+ARQUIVOS_POR_RESULTADO_BUSCA = 10
 
+MOTIVOS_BUSCA_HASH = {
+    IndiceHash.ORIGEM_HASH_PASTA: 'Hash final da cadeia (esta versão)',
+    IndiceHash.ORIGEM_HASH_CADEIA_ANTERIOR: 'Hash final da versão anterior (referência explícita)',
+    IndiceHash.ORIGEM_HASH_CONTEUDO_NOVOS: 'Hash agregado (novos ou alterados nesta versão)',
+}
 
-def _buscar_por_hash_no_banco(h_normalizado: str) -> List[dict]:
+
+def _buscar_por_hash_no_banco(h_normalizado: str, pagina=1) -> Page:
     """
-    Retorna lista de dicts: custodia, motivos (onde o hash apareceu),
-    tem_posterior, proxima (próxima versão na cadeia, se existir).
+    Busca exata (64 caracteres) ou por prefixo, pelo IndiceHash, paginada pelas
+    versões que gravaram o hash (CUSTODIA_BUSCA_HASH_POR_PAGINA). Hashes de
+    arquivo valem em todas as versões cujo inventário contém o registro: as que
+    o herdaram sem alteração (inventário em delta; ver
+    IndiceHashQuerySet.de_arquivos_por_versao) entram na página da versão que o
+    gravou, e só as entradas da página são expandidas.
+
+    Retorna a página; cada item é um dict com custodia, motivos (onde o hash
+    apareceu; até ARQUIVOS_POR_RESULTADO_BUSCA arquivos), arquivos_omitidos,
+    tem_posterior e proxima (próxima versão na cadeia, se existir).
+
+    O número de consultas e de linhas lidas não depende de quantas vezes o hash
+    aparece: contagem e página de versões, hashes da própria custódia, arquivos
+    das cadeias da página (com limite e total por versão) e versões herdeiras e
+    posteriores.
     """
-    hl = h_normalizado
-    is_full = len(hl) == 64
-
-    if is_full:
-        q_cust = (
-            Q(hash_pasta__iexact=hl)
-            | Q(hash_cadeia_anterior__iexact=hl)
-            | Q(hash_conteudo_novos__iexact=hl)
+    entradas = IndiceHash.objects.com_prefixo(h_normalizado).filter(custodia__publicada=True)
+    de_custodia = entradas.filter(origem__in=IndiceHash.ORIGENS_CUSTODIA)
+    gravadas = (
+        Custodia.objects.filter(pk__in=entradas.values('custodia_id'))
+        .select_related('caso', 'policial')
+        .order_by('-data_criacao', '-id')
+    )
+    pagina = Paginator(gravadas, getattr(settings, 'CUSTODIA_BUSCA_HASH_POR_PAGINA', 20)).get_page(pagina)
+    custodias = {c.pk: c for c in pagina.object_list}
+    ids = list(custodias)
+    if not ids:
+        pagina.object_list = []
+        return pagina
+
+    motivos = defaultdict(list)
+    for custodia_id, origem in (
+        de_custodia.filter(custodia_id__in=ids).order_by('-origem').values_list('custodia_id', 'origem')
+    ):
+        motivos[custodia_id].append(MOTIVOS_BUSCA_HASH[origem])
+
+    # Registros visíveis nas versões da página: gravados nelas ou nas anteriores
+    # da mesma cadeia de inventário. Versões fora da página só entram como
+    # herdeiras de uma versão da página e se não gravaram o hash (senão têm a
+    # própria página).
+    cadeias = Q()
+    for c in pagina.object_list:
+        cadeias |= Q(
+            caso_id=c.caso_id,
+            versao_inventario_completo=c.versao_inventario_completo,
+            versao__lte=c.versao,
         )
-        q_arq = Q(hash_arquivo__iexact=hl)
-    else:
-        q_cust = (
-            Q(hash_pasta__icontains=hl)
-            | Q(hash_cadeia_anterior__icontains=hl)
-            | Q(hash_conteudo_novos__icontains=hl)
+    por_custodia = [F('custodia_visivel_id')]
+    coincidencias = (
+        entradas.filter(custodia__in=Custodia.objects.filter(cadeias))
+        .de_arquivos_por_versao()
+        .annotate(gravou_o_hash=Exists(entradas.filter(custodia_id=OuterRef('custodia_visivel_id'))))
+        .filter(Q(custodia_visivel_id__in=ids) | Q(custodia_id__in=ids, gravou_o_hash=False))
+        .annotate(
+            posicao=Window(RowNumber(), partition_by=por_custodia, order_by=[F('arquivo__caminho_relativo').asc()]),
+            total=Window(Count('id'), partition_by=por_custodia),
         )
-        q_arq = Q(hash_arquivo__icontains=hl)
-
-    ids = set(Custodia.objects.filter(q_cust).values_list('id', flat=True))
-    ids |= set(Arquivo.objects.filter(q_arq).values_list('custodia_id', flat=True))
-
-    if not ids:
-        return []
-
-    custodias = (
-        Custodia.objects.filter(pk__in=ids)
-        .select_related('caso', 'policial', 'custodia_anterior')
-        .prefetch_related('arquivos')
-        .order_by('-data_criacao', '-id')
+        .filter(posicao__lte=ARQUIVOS_POR_RESULTADO_BUSCA)
+        .order_by('custodia_visivel_id', 'posicao')
+        .values_list('custodia_visivel_id', 'arquivo__caminho_relativo', 'total')
     )
+    arquivos_omitidos = defaultdict(int)
+    for custodia_id, caminho_relativo, total in coincidencias:
+        motivos[custodia_id].append(f'Hash do arquivo no inventário: {caminho_relativo}')
+        arquivos_omitidos[custodia_id] = total - ARQUIVOS_POR_RESULTADO_BUSCA
+
+    herdeiras = set(motivos) - set(ids)
+    visiveis = set(ids) | herdeiras
+    proximas = {}
+    for c in (
+        Custodia.objects.filter(Q(pk__in=herdeiras) | Q(custodia_anterior_id__in=visiveis))
+        .select_related('caso', 'policial')
+        .order_by('versao', 'id')
+    ):
+        if c.pk in herdeiras:
+            custodias[c.pk] = c
+        if c.custodia_anterior_id in visiveis:
+            proximas.setdefault(c.custodia_anterior_id, c)
 
     resultados = []
-    for c in custodias:
-        motivos: list[str] = []
-        if _campo_hash_coincide(c.hash_pasta, hl):
-            motivos.append('Hash final da cadeia (esta versão)')
-        if _campo_hash_coincide(c.hash_cadeia_anterior, hl):
-            motivos.append('Hash final da versão anterior (referência explícita)')
-        if _campo_hash_coincide(c.hash_conteudo_novos, hl):
-            motivos.append('Hash agregado (novos ou alterados nesta versão)')
-        for arq in c.arquivos.all():
-            if _campo_hash_coincide(arq.hash_arquivo, hl):
-                motivos.append(f'Hash do arquivo no inventário: {arq.caminho_relativo}')
-
-        if not motivos:
-            continue
-
-        proxima = (
-            Custodia.objects.filter(custodia_anterior_id=c.id)
-            .order_by('versao', 'id')
-            .first()
-        )
+    for c in sorted(custodias.values(), key=lambda c: (c.data_criacao, c.pk), reverse=True):
+        proxima = proximas.get(c.pk)
         resultados.append(
             {
                 'custodia': c,
-                'motivos': motivos,
+                'motivos': motivos[c.pk],
+                'arquivos_omitidos': max(0, arquivos_omitidos[c.pk]),
                 'tem_posterior': proxima is not None,
                 'proxima': proxima,
             }
         )
-    return resultados
+    pagina.object_list = resultados
+    return pagina
 
 
 def index(request):
@@ -99,30 +137,9 @@ def index(request):
     if request.method == 'POST':
         form = CustodiaForm(request.POST)
         if form.is_valid():
-            try:
-                # Salvar dados e processar
-                custodia = form.save()
-                
-                # Gerar PDF
-                try:
-                    caminho_pdf = gerar_pdf_custodia(custodia)
-                    custodia.pdf_gerado = True
-                    custodia.caminho_pdf = caminho_pdf
-                    custodia.save()
-                except Exception as e:
-                    messages.warning(
-                        request,
-                        f'Custódia criada com sucesso, mas houve erro ao gerar PDF: {str(e)}'
-                    )
-                
-                # Redirecionar para página de resultado
-                return redirect('custodia:resultado', custodia_id=custodia.id)
-                
-            except ValidationError as e:
-                for msg in e.messages:
-                    messages.error(request, msg)
-            except Exception as e:
-                messages.error(request, f'Erro ao processar custódia: {str(e)}')
+            # Hashes, versão e PDF são processados pelo worker (processar_tarefas)
+            tarefa = enfileirar_custodia(request.POST)
+            return redirect('custodia:tarefa', tarefa_id=tarefa.id)
         else:
             messages.error(request, 'Por favor, corrija os erros no formulário.')
     else:
@@ -136,24 +153,8 @@ def processar_custodia(request):
     if request.method == 'POST':
         form = CustodiaForm(request.POST)
         if form.is_valid():
-            try:
-                custodia = form.save()
-                
-                # Gerar PDF
-                caminho_pdf = gerar_pdf_custodia(custodia)
-                custodia.pdf_gerado = True
-                custodia.caminho_pdf = caminho_pdf
-                custodia.save()
-                
-                return redirect('custodia:resultado', custodia_id=custodia.id)
-                
-            except ValidationError as e:
-                for msg in e.messages:
-                    messages.error(request, msg)
-                return redirect('custodia:index')
-            except Exception as e:
-                messages.error(request, f'Erro ao processar: {str(e)}')
-                return redirect('custodia:index')
+            tarefa = enfileirar_custodia(request.POST)
+            return redirect('custodia:tarefa', tarefa_id=tarefa.id)
         else:
             messages.error(request, 'Formulário inválido.')
             return redirect('custodia:index')
@@ -161,6 +162,96 @@ def processar_custodia(request):
     return redirect('custodia:index')
 
 
+def status_tarefa(request, tarefa_id):
+    """View de acompanhamento da tarefa; redireciona ao resultado quando concluída"""
+    tarefa = get_object_or_404(TarefaCustodia, id=tarefa_id)
+
+    if tarefa.estado == TarefaCustodia.ESTADO_CONCLUIDA and tarefa.custodia_id:
+        if tarefa.mensagem:
+            messages.warning(request, tarefa.mensagem)
+        return redirect(_url_resultado_tarefa(tarefa))
+
+    context = {
+        'tarefa': tarefa,
+        'mensagens_erro': tarefa.mensagem.splitlines() if tarefa.estado == TarefaCustodia.ESTADO_ERRO else [],
+        'verificacao': tarefa.tipo == TarefaCustodia.TIPO_VERIFICACAO,
+    }
+    return render(request, 'custodia/tarefa.html', context)
+
+
+def _url_resultado_tarefa(tarefa: TarefaCustodia) -> str:
+    if tarefa.tipo == TarefaCustodia.TIPO_VERIFICACAO:
+        return f"{reverse('custodia:verificar', args=[tarefa.custodia_id])}?tarefa={tarefa.id}"
+    return reverse('custodia:resultado', args=[tarefa.custodia_id])
+
+
+def _estado_tarefa_json(tarefa: TarefaCustodia) -> dict:
+    dados = {
+        'id': tarefa.id,
+        'estado': tarefa.estado,
+        'estado_display': tarefa.get_estado_display(),
+        'finalizada': tarefa.finalizada,
+        'mensagem': tarefa.mensagem,
+        'progresso': tarefa.progresso or {},
+        'url_status': reverse('custodia:tarefa', args=[tarefa.id]),
+    }
+    if tarefa.custodia_id:
+        dados['url_resultado'] = _url_resultado_tarefa(tarefa)
+    if tarefa.resultado is not None:
+        dados['resultado'] = tarefa.resultado
+    return dados
+
+
+def progresso_tarefa(request, tarefa_id):
+    """Progresso da tarefa em JSON (consulta periódica)"""
+    tarefa = get_object_or_404(TarefaCustodia, id=tarefa_id)
+    return JsonResponse(_estado_tarefa_json(tarefa))
+
+
+def eventos_tarefa(request, tarefa_id):
+    """Progresso da tarefa como Server-Sent Events; encerra quando a tarefa finaliza
+
+    Cada conexão prende uma thread do servidor, então dura no máximo
+    CUSTODIA_EVENTOS_DURACAO_MAXIMA_SEGUNDOS: o campo retry faz o EventSource
+    reconectar e continuar acompanhando a tarefa.
+    """
+    get_object_or_404(TarefaCustodia, id=tarefa_id)
+    intervalo = getattr(settings, 'CUSTODIA_PROGRESSO_INTERVALO_SEGUNDOS', 1.0)
+    duracao_maxima = getattr(settings, 'CUSTODIA_EVENTOS_DURACAO_MAXIMA_SEGUNDOS', 60)
+
+    def eventos():
+        limite = time.monotonic() + duracao_maxima
+        anterior = None
+        yield f"retry: {max(1000, int(intervalo * 1000))}\n\n"
+        while True:
+            tarefa = TarefaCustodia.objects.filter(id=tarefa_id).first()
+            if tarefa is None:
+                return
+            atual = json.dumps(_estado_tarefa_json(tarefa))
+            if atual != anterior:
+                yield f"data: {atual}\n\n"
+                anterior = atual
+            else:
+                # Comentário SSE mantém a conexão viva em proxies
+                yield ": ping\n\n"
+            if tarefa.finalizada:
+                yield "event: fim\ndata: {}\n\n"
+                return
+            if time.monotonic() + intervalo >= limite:
+                # Fecha a conexão; o navegador reconecta após o retry
+                return
+            time.sleep(intervalo)
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _pdf_disponivel(custodia: Custodia) -> bool:
+    return custodia.pdf_gerado and bool(custodia.caminho_pdf) and Path(custodia.caminho_pdf).exists()
+
+
 def resultado(request, custodia_id):
     """View para exibir resultado da custódia criada"""
     custodia = get_object_or_404(
@@ -172,12 +263,34 @@ def resultado(request, custodia_id):
         'custodia': custodia,
         'hash_formatado': custodia.hash_pasta,
         'tamanho_formatado': custodia.tamanho_total_formatado(),
-        'pdf_disponivel': custodia.pdf_gerado and Path(custodia.caminho_pdf).exists() if custodia.caminho_pdf else False,
+        'pdf_disponivel': _pdf_disponivel(custodia),
     }
     
     return render(request, 'custodia/resultado.html', context)
 
 
+def estado_pdf(request, custodia_id):
+    """Estado da geração do PDF em JSON (consulta periódica na tela de resultado)"""
+    custodia = get_object_or_404(Custodia, id=custodia_id)
+    return JsonResponse({
+        'estado': custodia.estado_pdf,
+        'estado_display': custodia.get_estado_pdf_display(),
+        'em_andamento': custodia.pdf_em_andamento,
+        'mensagem': custodia.mensagem_pdf,
+        'tentativas': custodia.tentativas_pdf,
+        'url_download': reverse('custodia:download_pdf', args=[custodia.id]) if _pdf_disponivel(custodia) else None,
+    })
+
+
+def gerar_pdf_novamente(request, custodia_id):
+    """Devolve o PDF à fila (após erro definitivo ou arquivo apagado); só aceita POST"""
+    custodia = get_object_or_404(Custodia, id=custodia_id)
+    if request.method == 'POST':
+        reenfileirar_pdf(custodia)
+        messages.info(request, 'O PDF voltou para a fila de geração.')
+    return redirect('custodia:resultado', custodia_id=custodia.id)
+
+
 def download_pdf(request, custodia_id):
     """View para download do PDF gerado"""
     custodia = get_object_or_404(
@@ -186,40 +299,60 @@ def download_pdf(request, custodia_id):
     )
     
     if not custodia.pdf_gerado or not custodia.caminho_pdf:
-        raise Http404("PDF não foi gerado para esta custódia.")
+        raise Http404("O PDF desta custódia ainda não foi gerado.")
     
     caminho_pdf = Path(custodia.caminho_pdf)
     
     if not caminho_pdf.exists():
-        # Tentar gerar novamente
-        try:
-            caminho_pdf = Path(gerar_pdf_custodia(custodia))
-            custodia.caminho_pdf = str(caminho_pdf)
-            custodia.save()
-        except Exception as e:
-            raise Http404(f"Erro ao gerar PDF: {str(e)}")
+        # Gerado e depois apagado do disco: volta para a fila dos workers de PDF
+        reenfileirar_pdf(custodia)
+        messages.warning(request, 'O arquivo do PDF não foi encontrado; ele foi colocado na fila para ser gerado de novo.')
+        return redirect('custodia:resultado', custodia_id=custodia.id)
     
+    # Inventários grandes saem como pacote ZIP (resumo, anexos e manifesto)
+    pacote = caminho_pdf.suffix == '.zip'
     try:
         return FileResponse(
             open(caminho_pdf, 'rb'),
-            content_type='application/pdf',
-            filename=f"custodia_{custodia.numero_documento}.pdf"
+            content_type='application/zip' if pacote else 'application/pdf',
+            filename=f"custodia_{custodia.numero_documento}{caminho_pdf.suffix}"
         )
     except Exception as e:
         raise Http404(f"Erro ao abrir PDF: {str(e)}")
 
 
 def lista_custodias(request):
-    """View para listar custódias (por padrão só versões atuais; ?historico=1 lista tudo)."""
-    historico = request.GET.get('historico') in ('1', 'true', 'yes', 'on')
-    qs = Custodia.objects.select_related('policial', 'caso').order_by('-data_criacao')
-    if not historico:
-        qs = qs.filter(ativo=True)
-    custodias = qs[:50]
+    """
+    View para listar custódias (por padrão só versões atuais; ?historico=1 lista tudo).
+
+    Paginação por cursor em (data_criacao, id): ?apos=<cursor> avança e
+    ?antes=<cursor> volta, com custo constante em qualquer página. Filtros em
+    FiltroCustodiasForm.
+    """
+    dados_filtro = request.GET.copy()
+    if not dados_filtro.get('situacao') and request.GET.get('historico') in ('1', 'true', 'yes', 'on'):
+        dados_filtro['situacao'] = FiltroCustodiasForm.SITUACAO_TODAS
+    filtro = FiltroCustodiasForm(dados_filtro)
+    qs = filtro.filtrar(Custodia.objects.select_related('policial', 'caso'))
+    historico = filtro.is_valid() and filtro.cleaned_data.get('situacao') in (
+        FiltroCustodiasForm.SITUACAO_ANTERIORES, FiltroCustodiasForm.SITUACAO_TODAS,
+    )
+    pagina = paginar_keyset(
+        qs,
+        'data_criacao',
+        getattr(settings, 'CUSTODIA_LISTA_POR_PAGINA', 50),
+        cursor_apos=request.GET.get('apos'),
+        cursor_antes=request.GET.get('antes'),
+    )
+    # Filtros repetidos nos links de navegação (sem cursores nem busca por hash)
+    parametros_filtro = dados_filtro.copy()
+    for chave in ('apos', 'antes', 'hash', 'pagina_busca', 'historico'):
+        parametros_filtro.pop(chave, None)
 
     busca_hash_valor = request.GET.get('hash', '') or ''
     h_norm = _normalizar_hash_busca(busca_hash_valor)
     resultados_busca = None
+    pagina_busca = None
     busca_hash_erro = None
 
     if 'hash' in request.GET:
@@ -230,13 +363,19 @@ def lista_custodias(request):
             busca_hash_erro = 'Digite pelo menos 8 caracteres do hash (ou o hash completo de 64 caracteres).'
             resultados_busca = []
         else:
-            resultados_busca = _buscar_por_hash_no_banco(h_norm)
+            pagina_busca = _buscar_por_hash_no_banco(h_norm, request.GET.get('pagina_busca'))
+            resultados_busca = pagina_busca.object_list
 
     context = {
-        'custodias': custodias,
+        'custodias': pagina.itens,
+        'pagina': pagina,
+        'filtro': filtro,
+        'filtros_ativos': any(v for k, v in parametros_filtro.items() if k != 'situacao'),
+        'parametros_filtro': parametros_filtro.urlencode(),
         'historico': historico,
         'busca_hash_valor': busca_hash_valor,
         'resultados_busca': resultados_busca,
+        'pagina_busca': pagina_busca,
         'busca_hash_erro': busca_hash_erro,
         'busca_hash_executada': 'hash' in request.GET,
     }
@@ -251,23 +390,206 @@ def detalhes_custodia(request, custodia_id):
         id=custodia_id,
     )
 
-    # Obter arquivos paginados
-    arquivos = custodia.arquivos.all().order_by('caminho_relativo')
-
-    total_versoes_caso = Custodia.objects.filter(caso_id=custodia.caso_id).count()
-    proxima_versao = (
-        Custodia.objects.filter(custodia_anterior_id=custodia.id)
-        .order_by('-versao', '-data_criacao')
-        .first()
+    # O inventário é carregado em páginas por inventario_custodia (JSON)
+    # Versões do caso numa consulta: total e versão posterior sem percorrer a cadeia
+    versoes_caso = list(
+        Custodia.objects.filter(caso_id=custodia.caso_id)
+        .order_by('versao', 'id')
+        .values('id', 'numero_documento', 'versao', 'custodia_anterior_id')
+    )
+    total_versoes_caso = len(versoes_caso)
+    proxima_versao = next(
+        (v for v in reversed(versoes_caso) if v['custodia_anterior_id'] == custodia.id), None
     )
 
     context = {
         'custodia': custodia,
-        'arquivos': arquivos,
         'total_arquivos': custodia.total_arquivos,
-        'pdf_disponivel': custodia.pdf_gerado and Path(custodia.caminho_pdf).exists() if custodia.caminho_pdf else False,
+        'ordenacoes_inventario': ORDENACOES_INVENTARIO,
+        'estatisticas': custodia.estatisticas_inventario(),
+        'estatisticas_extensao': custodia.estatisticas_por_extensao(),
+        'estatisticas_tipo_mime': custodia.estatisticas_por_tipo_mime(),
+        'pdf_disponivel': _pdf_disponivel(custodia),
         'total_versoes_caso': total_versoes_caso,
         'proxima_versao': proxima_versao,
     }
 
     return render(request, 'custodia/detalhes.html', context)
+
+
+# Ordenações do inventário: parâmetro ?ordenar= (prefixo '-' inverte) -> campo
+# ou anotação sem NULL usada como chave da paginação por cursor
+ORDENACOES_INVENTARIO = {
+    'caminho': 'Caminho relativo',
+    'nome': 'Nome do arquivo',
+    'tamanho': 'Tamanho',
+    'data': 'Data de modificação',
+    'novo': 'Novo/alterado',
+}
+_DATA_NULA_INVENTARIO = datetime(1, 1, 2, tzinfo=dt_timezone.utc)
+
+
+def _inventario_ordenado(custodia: Custodia, ordenar: str):
+    """(queryset anotado, campo da chave, decrescente) para ?ordenar="""
+    decrescente = ordenar.startswith('-')
+    chave = ordenar.lstrip('-')
+    qs = custodia.inventario()
+    if chave == 'nome':
+        return qs, 'nome_arquivo', decrescente
+    if chave == 'tamanho':
+        return qs.annotate(ordem_tamanho=Coalesce('tamanho_bytes', Value(-1))), 'ordem_tamanho', decrescente
+    if chave == 'data':
+        return (
+            qs.annotate(ordem_data=Coalesce('data_modificacao', Value(_DATA_NULA_INVENTARIO))),
+            'ordem_data',
+            decrescente,
+        )
+    if chave == 'novo':
+        return qs, 'novo_nesta_versao', decrescente
+    return qs, 'caminho_relativo', decrescente
+
+
+def _arquivo_inventario_json(arquivo) -> dict:
+    data_modificacao = arquivo.data_modificacao
+    if data_modificacao is not None and timezone.is_aware(data_modificacao):
+        data_modificacao = timezone.localtime(data_modificacao)
+    return {
+        'id': arquivo.pk,
+        'caminho_relativo': arquivo.caminho_relativo,
+        'nome_arquivo': arquivo.nome_arquivo,
+        'novo_nesta_versao': arquivo.novo_nesta_versao,
+        'tamanho_bytes': arquivo.tamanho_bytes,
+        'tamanho_formatado': arquivo.tamanho_formatado(),
+        'hash_arquivo': arquivo.hash_arquivo,
+        'hashes_adicionais': arquivo.hashes_adicionais_ordenados(),
+        'tamanho_chunk': arquivo.tamanho_chunk,
+        'quantidade_chunks': len(arquivo.hashes_chunks or []),
+        'hash_raiz_chunks': arquivo.hash_raiz_chunks,
+        'hash_do_cache': arquivo.hash_do_cache,
+        'data_modificacao': data_modificacao.strftime('%d/%m/%Y %H:%M') if data_modificacao else None,
+    }
+
+
+def inventario_custodia(request, custodia_id):
+    """
+    Uma página do inventário da custódia em JSON, para a tabela de detalhes.
+
+    Parâmetros: ordenar (caminho, nome, tamanho, data ou novo; '-' inverte),
+    caminho (trecho do caminho relativo), extensao, novo (1/0) e apos (cursor
+    devolvido em 'proxima'). Paginação por cursor: o custo de cada página não
+    depende de quantas vieram antes.
+    """
+    custodia = get_object_or_404(Custodia, id=custodia_id)
+    ordenar = request.GET.get('ordenar') or 'caminho'
+    if ordenar.lstrip('-') not in ORDENACOES_INVENTARIO:
+        return JsonResponse({'erro': f'Ordenação inválida: {ordenar}'}, status=400)
+
+    qs, campo, decrescente = _inventario_ordenado(custodia, ordenar)
+    caminho = (request.GET.get('caminho') or '').strip()
+    if caminho:
+        qs = qs.filter(caminho_relativo__icontains=caminho)
+    extensao = (request.GET.get('extensao') or '').strip().lstrip('.')
+    if extensao:
+        qs = qs.filter(caminho_relativo__iendswith=f'.{extensao}')
+    novo = request.GET.get('novo')
+    if novo in ('0', '1'):
+        qs = qs.filter(novo_nesta_versao=(novo == '1'))
+
+    pagina = paginar_keyset(
+        qs,
+        campo,
+        getattr(settings, 'CUSTODIA_INVENTARIO_POR_PAGINA', 200),
+        cursor_apos=request.GET.get('apos'),
+        decrescente=decrescente,
+    )
+    return JsonResponse({
+        'arquivos': [_arquivo_inventario_json(arquivo) for arquivo in pagina],
+        'proxima': pagina.cursor_proxima,
+    })
+
+
+def linha_do_tempo_caso(request, caso_id):
+    """
+    Linha do tempo das versões de um caso (uma consulta), com o delta de cada
+    versão e a conferência dos elos da cadeia de hashes. ?formato=json devolve
+    os mesmos dados em JSON.
+    """
+    caso = get_object_or_404(Caso, id=caso_id)
+    versoes = caso.linha_do_tempo()
+    cadeia_integra = all(v['elo_valido'] for v in versoes)
+
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'caso_id': caso.id,
+            'numero_procedimento': caso.numero_procedimento,
+            'cadeia_integra': cadeia_integra,
+            'versoes': [
+                {
+                    **versao,
+                    'data_criacao': versao['data_criacao'].isoformat(),
+                    'url_detalhes': reverse('custodia:detalhes', args=[versao['id']]),
+                }
+                for versao in versoes
+            ],
+        })
+
+    context = {
+        'caso': caso,
+        'versoes': versoes,
+        'cadeia_integra': cadeia_integra,
+    }
+    return render(request, 'custodia/linha_do_tempo.html', context)
+
+
+def verificar_integridade(request, custodia_id):
+    """
+    Verificação de integridade: confere a pasta da custódia contra o inventário
+    gravado (modo 'rapido' ou 'completo'). O POST enfileira a releitura como
+    tarefa e redireciona ao acompanhamento (com formato=json, devolve o estado
+    da tarefa); ?tarefa=<id> mostra o relatório de uma verificação concluída.
+    """
+    custodia = get_object_or_404(
+        Custodia.objects.select_related('policial', 'caso'),
+        id=custodia_id,
+    )
+    resultado = None
+    erro = None
+    modo = request.POST.get('modo', MODO_RAPIDO)
+
+    if request.method == 'POST':
+        if modo in MODOS_VERIFICACAO:
+            tarefa = enfileirar_verificacao(custodia, modo)
+            if request.POST.get('formato') == 'json':
+                return JsonResponse(_estado_tarefa_json(tarefa), status=202)
+            return redirect('custodia:tarefa', tarefa_id=tarefa.id)
+        erro = f"Modo de verificação inválido: {modo}"
+        if request.POST.get('formato') == 'json':
+            return JsonResponse({'erro': erro}, status=400)
+    elif request.GET.get('tarefa'):
+        tarefa = get_object_or_404(
+            TarefaCustodia,
+            id=request.GET['tarefa'],
+            tipo=TarefaCustodia.TIPO_VERIFICACAO,
+            custodia=custodia,
+        )
+        if not tarefa.finalizada:
+            return redirect('custodia:tarefa', tarefa_id=tarefa.id)
+        modo = tarefa.dados.get('modo', MODO_RAPIDO)
+        if tarefa.estado == TarefaCustodia.ESTADO_ERRO:
+            erro = tarefa.mensagem
+        elif tarefa.resultado is not None:
+            resultado = dict(
+                tarefa.resultado,
+                data_verificacao=datetime.fromisoformat(tarefa.resultado['data_verificacao']),
+            )
+
+    context = {
+        'custodia': custodia,
+        'resultado': resultado,
+        'erro': erro,
+        'modo': modo,
+        'modo_rapido': MODO_RAPIDO,
+        'modo_completo': MODO_COMPLETO,
+        'amostra_percentual': getattr(settings, 'CUSTODIA_VERIFICACAO_AMOSTRA', 0.05) * 100,
+    }
+    return render(request, 'custodia/verificacao.html', context)
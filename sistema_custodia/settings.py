@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -79,6 +80,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transações pegam o lock de escrita no início (IMMEDIATE) e esperam por
+        # ele até o timeout, em vez de falhar com "database is locked" quando
+        # vários workers gravam versões ao mesmo tempo
+        'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -128,5 +133,70 @@ PDFS_DIR = BASE_DIR / 'pdfs'
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 PDFS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Cálculo de hash das pastas: número de workers e tipo de pool
+# (threads atendem bem leituras em disco/rede; processos ajudam quando a CPU é o gargalo)
+CUSTODIA_HASH_WORKERS = min(8, os.cpu_count() or 1)
+CUSTODIA_HASH_USAR_PROCESSOS = False
+# Backend de leitura: None (automático), 'readinto', 'mmap' ou 'fadvise';
+# tamanho do bloco em bytes (None usa o padrão de cada backend)
+CUSTODIA_HASH_BACKEND = None
+CUSTODIA_HASH_TAMANHO_BLOCO = None
+# Hashes adicionais marcados por padrão no formulário (ex.: ['md5', 'sha512'])
+CUSTODIA_HASHES_ADICIONAIS = []
+# Hash por chunks para arquivos grandes (ex.: vídeos): None desativa; arquivos com
+# pelo menos CUSTODIA_HASH_CHUNK_MINIMO_BYTES recebem também os hashes de cada
+# chunk e uma raiz, calculados com CUSTODIA_HASH_WORKERS_CHUNK threads por arquivo
+CUSTODIA_HASH_TAMANHO_CHUNK = None
+CUSTODIA_HASH_CHUNK_MINIMO_BYTES = 1024 * 1024 * 1024
+CUSTODIA_HASH_WORKERS_CHUNK = 4
+# Verificação rápida de integridade: fração dos arquivos com tamanho e data
+# iguais aos registrados que é relida mesmo assim (amostragem)
+CUSTODIA_VERIFICACAO_AMOSTRA = 0.05
+# Linhas por INSERT em lote ao gravar o inventário (Arquivo) de uma custódia
+CUSTODIA_ARQUIVO_LOTE = 1000
+# Inventário em delta: a partir da v2 cada versão grava só arquivos novos,
+# alterados ou removidos e herda o resto da anterior; a cada N versões da
+# cadeia delta grava de novo o inventário completo
+CUSTODIA_INVENTARIO_DELTA = True
+CUSTODIA_INVENTARIO_COMPLETO_A_CADA = 20
+# Custódias por página no resultado da busca por hash
+CUSTODIA_BUSCA_HASH_POR_PAGINA = 20
+# Custódias por página na listagem (paginação por cursor em data_criacao, id)
+CUSTODIA_LISTA_POR_PAGINA = 50
+# Arquivos por página do inventário na tela de detalhes (carregado ao rolar)
+CUSTODIA_INVENTARIO_POR_PAGINA = 200
+# Cache persistente de hashes (chave: dispositivo, inode, tamanho, mtime, caminho)
+CUSTODIA_HASH_CACHE_MAX_ENTRADAS = 1_000_000
+CUSTODIA_HASH_CACHE_DIAS = 180
+
+# Fila de tarefas de custódia (worker: python manage.py processar_tarefas)
+# Tarefa em execução sem sinal do worker por mais que o lease volta para a fila
+CUSTODIA_TAREFA_LEASE_SEGUNDOS = 300
+CUSTODIA_TAREFA_MAX_TENTATIVAS = 3
+# Frequência de publicação do progresso (arquivos, bytes, MB/s, ETA) da tarefa
+CUSTODIA_PROGRESSO_INTERVALO_SEGUNDOS = 1.0
+# Duração máxima de cada conexão de eventos (SSE) do progresso; o navegador
+# reconecta sozinho, e a thread do servidor não fica presa indefinidamente
+CUSTODIA_EVENTOS_DURACAO_MAXIMA_SEGUNDOS = 60
+# Fila de PDFs (worker: python manage.py processar_pdfs); o lease é o das tarefas.
+# Após uma falha o PDF volta à fila depois de ESPERA * 2^(tentativas - 1) segundos
+CUSTODIA_PDF_MAX_TENTATIVAS = 5
+CUSTODIA_PDF_ESPERA_TENTATIVA_SEGUNDOS = 30
+# Inventários acima deste número de arquivos saem do PDF principal: o resultado é
+# um pacote ZIP com o resumo, anexos de até N arquivos (faixas de caminho) e um
+# manifesto com o SHA-256 de cada anexo; None mantém tudo num PDF só
+CUSTODIA_PDF_ARQUIVOS_POR_ANEXO = 10000
+# Processos gerando anexos em paralelo (por PDF em geração). Cada worker de
+# processar_pdfs tem seu pool: None divide os núcleos pelos workers
+# (núcleos // --workers, até 16); um número fixo vale para cada worker
+CUSTODIA_PDF_WORKERS_ANEXOS = None
+# Entrada em duas fases: o inventário da versão é gravado sem lock e publicado
+# numa transação curta; se outra versão do caso foi publicada no meio, a
+# preparação é refeita sobre ela até N vezes
+CUSTODIA_PUBLICACAO_TENTATIVAS = 5
+# Versões preparadas e nunca publicadas (worker interrompido) são apagadas
+# depois deste tempo
+CUSTODIA_PREPARO_ABANDONADO_SEGUNDOS = 24 * 3600
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'